@@ -0,0 +1,70 @@
+"""
+Бенчмарк проверки ответов: 100k присланных ответов против банка из 10k загадок.
+
+Запуск: python -m benchmarks.answer_matching --riddles 10000 --answers 100000
+"""
+import argparse
+import random
+import time
+
+from src.answers import AnswerIndex
+
+ALPHABET = "абвгдежзийклмнопрстуфхцчшщыэюя"
+
+
+def make_word(rng: random.Random) -> str:
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(4, 12)))
+
+
+def make_typo(rng: random.Random, word: str) -> str:
+    position = rng.randrange(len(word))
+    return word[:position] + rng.choice(ALPHABET) + word[position + 1:]
+
+
+def run(riddles_count: int, answers_count: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    riddles = [
+        {"number": number, "answer": [make_word(rng) for _ in range(rng.randint(1, 5))]}
+        for number in range(1, riddles_count + 1)
+    ]
+
+    started = time.perf_counter()
+    index = AnswerIndex.from_riddles(riddles)
+    build_seconds = time.perf_counter() - started
+
+    # Смесь: точные ответы с "шумом", ответы с опечаткой и неверные ответы
+    submissions = []
+    for _ in range(answers_count):
+        riddle = rng.choice(riddles)
+        answer = rng.choice(riddle["answer"])
+        kind = rng.random()
+        if kind < 0.5:
+            text = f"На {answer.upper()}!"
+        elif kind < 0.75:
+            text = make_typo(rng, answer)
+        else:
+            text = make_word(rng)
+        submissions.append((riddle["number"], text))
+
+    accepted = 0
+    started = time.perf_counter()
+    for number, text in submissions:
+        accepted += index.check(number, text)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "riddles": riddles_count,
+        "answers": answers_count,
+        "accepted": accepted,
+        "build_seconds": round(build_seconds, 4),
+        "check_seconds": round(elapsed, 4),
+        "us_per_answer": round(elapsed / answers_count * 1e6, 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--riddles", type=int, default=10000)
+    parser.add_argument("--answers", type=int, default=100000)
+    args = parser.parse_args()
+    print(run(args.riddles, args.answers))
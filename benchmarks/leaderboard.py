@@ -0,0 +1,87 @@
+"""
+Микробенчмарк таблицы лидеров: начисление очков, место игрока и первые места
+при сотнях тысяч игроков. Для сравнения — один отсортированный список с insort.
+
+Запуск: python -m benchmarks.leaderboard --players 300000 --updates 200000
+"""
+import argparse
+import json
+import random
+import time
+from bisect import bisect_left, insort
+from itertools import count
+
+from src.leaderboard import Leaderboard
+
+
+class FlatBoard:
+    """ Один отсортированный список: место за O(log n), но вставка сдвигает весь список """
+
+    def __init__(self):
+        self.keys = {}
+        self.order = []
+        self.counter = count()
+
+    def add(self, name, points):
+        key = self.keys.get(name)
+        score = 0
+        if key is not None:
+            score = -key[0]
+            del self.order[bisect_left(self.order, key)]
+        key = self.keys[name] = (-(score + points), next(self.counter), name)
+        insort(self.order, key)
+
+    def rank(self, name):
+        return bisect_left(self.order, self.keys[name]) + 1
+
+    def top(self, limit):
+        return self.order[:limit]
+
+
+def measure(board, names, updates, rng) -> dict:
+    started = time.perf_counter()
+    for name in names:
+        board.add(name, rng.randrange(100))
+    filled = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(updates):
+        board.add(names[rng.randrange(len(names))], 1)
+    updated = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(updates):
+        board.rank(names[rng.randrange(len(names))])
+    ranked = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(1000):
+        board.top(10)
+    topped = time.perf_counter() - started
+
+    return {
+        "fill_s": round(filled, 3),
+        "updates_per_s": round(updates / updated),
+        "ranks_per_s": round(updates / ranked),
+        "top10_us": round(topped / 1000 * 1e6, 2),
+    }
+
+
+def run(players: int, updates: int, seed: int = 0) -> dict:
+    names = [f"Игрок {i}" for i in range(players)]
+    return {
+        "config": {"players": players, "updates": updates},
+        "results": {
+            "leaderboard": measure(Leaderboard("global"), names, updates, random.Random(seed)),
+            "flat_list": measure(FlatBoard(), names, updates, random.Random(seed)),
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", type=int, default=300_000)
+    parser.add_argument("--updates", type=int, default=200_000)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.players, args.updates), ensure_ascii=False, indent=2))
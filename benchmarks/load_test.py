@@ -0,0 +1,315 @@
+"""
+Нагрузочный тест Socket.IO-сервера.
+
+ASGI-приложение main.socket_app запускается в том же процессе, а клиенты
+подключаются к нему напрямую по ASGI-протоколу websocket (Engine.IO v4),
+без сети и внешних зависимостей. Сценарий: подключение игроков, создание
+комнат и вход в них, чат с заданной частотой, выход и переподключение части
+игроков, затем отключение всех.
+
+Результат — JSON с перцентилями задержки (p50/p95/p99, мс) для каждого события,
+числом событий в секунду и RSS процесса, чтобы сравнивать прогоны в CI.
+
+Запуск: python -m benchmarks.load_test --rooms 50 --players 10 --rate 0.5 --duration 10
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import resource
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+def rss_mb() -> float:
+    """ Текущий RSS процесса (Linux), иначе пиковый по getrusage """
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(q / 100 * len(values) + 0.5) - 1))
+    return values[index]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.counts: Dict[str, int] = {}
+
+    def record(self, event: str, seconds: Optional[float] = None):
+        self.counts[event] = self.counts.get(event, 0) + 1
+        if seconds is not None:
+            self.latencies.setdefault(event, []).append(seconds * 1000)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        result = {}
+        for event, count in sorted(self.counts.items()):
+            values = sorted(self.latencies.get(event, []))
+            result[event] = {"count": count}
+            if values:
+                result[event].update(
+                    p50=round(percentile(values, 50), 3),
+                    p95=round(percentile(values, 95), 3),
+                    p99=round(percentile(values, 99), 3),
+                    max=round(values[-1], 3),
+                )
+        return result
+
+
+class AsgiSocketClient:
+    """ Минимальный клиент Socket.IO поверх ASGI websocket без сети """
+
+    _ports = itertools.count(40000)
+
+    def __init__(self, app: Callable):
+        self.app = app
+        self._waiters: List[tuple] = []
+        self._acks: Dict[int, asyncio.Future] = {}
+        self._ack_ids = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+        self.received = 0
+
+    async def connect(self, timeout: float = 5.0):
+        # Каждое подключение — новая ASGI-сессия со своей очередью
+        self._inbox: asyncio.Queue = asyncio.Queue()
+        self._connected = asyncio.Event()
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": "/socket.io/",
+            "raw_path": b"/socket.io/",
+            "query_string": b"EIO=4&transport=websocket",
+            "headers": [(b"host", b"loadtest"), (b"upgrade", b"websocket"), (b"connection", b"Upgrade")],
+            "client": ("127.0.0.1", next(self._ports)),
+            "server": ("127.0.0.1", 8000),
+            "subprotocols": [],
+        }
+        await self._inbox.put({"type": "websocket.connect"})
+        self._task = asyncio.create_task(self.app(scope, self._inbox.get, self._send))
+        await asyncio.wait_for(self._connected.wait(), timeout)
+
+    async def _send(self, message: Dict):
+        if message["type"] == "websocket.send":
+            await self._on_packet(message.get("text") or message.get("bytes"))
+
+    async def _write(self, text: str):
+        await self._inbox.put({"type": "websocket.receive", "text": text})
+
+    async def _on_packet(self, packet: str):
+        if packet.startswith("0"):          # Engine.IO open
+            await self._write("40")
+        elif packet == "2":                 # Engine.IO ping
+            await self._write("3")
+        elif packet.startswith("40"):       # Socket.IO connect
+            self._connected.set()
+        elif packet.startswith("42"):       # Socket.IO event
+            event, *args = json.loads(packet[2:])
+            self._dispatch(event, args[0] if args else None)
+        elif packet.startswith("43"):       # Socket.IO ack
+            body = packet[2:]
+            split = body.index("[")
+            future = self._acks.pop(int(body[:split]), None)
+            if future is not None and not future.done():
+                future.set_result(json.loads(body[split:]))
+
+    def _dispatch(self, event: str, data: Any):
+        if event == "batch":
+            for inner_event, inner_data in data.get("events", []):
+                self._dispatch(inner_event, inner_data)
+            return
+        self.received += 1
+        for waiter in list(self._waiters):
+            expected, match, future = waiter
+            if expected == event and not future.done() and (match is None or match(data)):
+                future.set_result(data)
+                self._waiters.remove(waiter)
+
+    async def emit(self, event: str, data: Any = None):
+        await self._write("42" + json.dumps([event, data] if data is not None else [event], ensure_ascii=False))
+
+    async def ack(self, event: str, data: Any, timeout: float = 10.0):
+        """ Отправляет событие с подтверждением; возвращает (ответ обработчика, задержка) """
+        ack_id = next(self._ack_ids)
+        future = self._acks[ack_id] = asyncio.get_running_loop().create_future()
+        started = time.perf_counter()
+        await self._write(f"42{ack_id}" + json.dumps([event, data], ensure_ascii=False))
+        try:
+            result = await asyncio.wait_for(future, timeout)
+        finally:
+            self._acks.pop(ack_id, None)
+        return result, time.perf_counter() - started
+
+    async def call(
+        self, event: str, data: Any, reply: str,
+        match: Optional[Callable[[Any], bool]] = None, timeout: float = 10.0,
+    ):
+        """ Отправляет событие и ждёт ответного; возвращает (данные, задержка в секундах) """
+        future = asyncio.get_running_loop().create_future()
+        waiter = (reply, match, future)
+        self._waiters.append(waiter)
+        started = time.perf_counter()
+        await self.emit(event, data)
+        try:
+            result = await asyncio.wait_for(future, timeout)
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        return result, time.perf_counter() - started
+
+    async def disconnect(self):
+        if self._task is None:
+            return
+        await self._inbox.put({"type": "websocket.disconnect", "code": 1000})
+        try:
+            await asyncio.wait_for(self._task, 5)
+        except (asyncio.TimeoutError, Exception):
+            self._task.cancel()
+        self._task = None
+
+
+async def run(
+    rooms: int = 10,
+    players: int = 5,
+    rate: float = 1.0,
+    duration: float = 5.0,
+    churn: float = 0.1,
+    seed: int = 0,
+) -> Dict:
+    import main
+
+    # Сервер без uvicorn: запуск и остановку приложения выполняем сами
+    async with main.lifespan(main.app):
+        return await scenario(main, rooms, players, rate, duration, churn, seed)
+
+
+async def scenario(
+    main, rooms: int, players: int, rate: float, duration: float, churn: float, seed: int
+) -> Dict:
+    rng = random.Random(seed)
+    stats = Stats()
+    app = main.socket_app
+    rss_start = rss_mb()
+
+    async def timed(event: str, coroutine):
+        try:
+            _, seconds = await coroutine
+            stats.record(event, seconds)
+        except asyncio.TimeoutError:
+            stats.record(f"{event}_timeout")
+
+    # Подключение
+    clients = [AsgiSocketClient(app) for _ in range(rooms * players)]
+    started = time.perf_counter()
+    for client in clients:
+        connect_started = time.perf_counter()
+        await client.connect()
+        stats.record("connect", time.perf_counter() - connect_started)
+
+    # Создание комнат и вход
+    groups = [clients[i * players:(i + 1) * players] for i in range(rooms)]
+    room_ids = []
+    for number, group in enumerate(groups):
+        creator = group[0]
+        data, seconds = await creator.call(
+            "create_room",
+            {"name": f"load {number}", "questions_count": 5, "context": "", "player_name": "p0"},
+            "room_created",
+        )
+        stats.record("create_room", seconds)
+        room_ids.append(data["room"]["id"])
+    await asyncio.gather(*(
+        timed("join_room", client.call(
+            "join_room", {"room_id": room_id, "player_name": f"p{i}"}, "room_joined"
+        ))
+        for room_id, group in zip(room_ids, groups)
+        for i, client in enumerate(group[1:], start=1)
+    ))
+
+    # Чат с частотой rate сообщений в секунду на игрока и churn-выходы
+    tokens = itertools.count()
+    deadline = time.perf_counter() + duration
+
+    async def player_loop(client: AsgiSocketClient, room_id: str, is_creator: bool):
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(rng.expovariate(rate) if rate > 0 else duration)
+            if time.perf_counter() >= deadline:
+                break
+            token = f"load-{next(tokens)}"
+            await timed("send_message", client.call(
+                "send_message", {"text": token}, "new_message",
+                match=lambda data, token=token: data.get("text") == token,
+            ))
+            if is_creator or rng.random() >= churn:
+                continue
+            # Выход и повторный вход в комнату либо переподключение
+            if rng.random() < 0.5:
+                await timed("leave_room", client.ack("leave_room", {"room_id": room_id}))
+            else:
+                await client.disconnect()
+                stats.record("disconnect")
+                await client.connect()
+            await timed("rejoin_room", client.call(
+                "join_room", {"room_id": room_id, "player_name": "again"}, "room_joined"
+            ))
+            await timed("get_rooms", client.call("get_rooms", {}, "rooms_list"))
+
+    await asyncio.gather(*(
+        player_loop(client, room_id, i == 0)
+        for room_id, group in zip(room_ids, groups)
+        for i, client in enumerate(group)
+    ))
+    rss_peak = rss_mb()
+
+    # Отключение
+    for client in clients:
+        await client.disconnect()
+    elapsed = time.perf_counter() - started
+
+    events = sum(stats.counts.values())
+    received = sum(client.received for client in clients)
+    return {
+        "config": {"rooms": rooms, "players": players, "rate": rate, "duration": duration, "churn": churn},
+        "elapsed_seconds": round(elapsed, 3),
+        "events_sent": events,
+        "events_received": received,
+        "events_per_sec": round((events + received) / elapsed, 1),
+        "rss_mb": {"start": rss_start, "peak": rss_peak, "end": rss_mb()},
+        "live_rooms_after": len(main.rooms),
+        "latency_ms": stats.summary(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--players", type=int, default=5, help="игроков в комнате")
+    parser.add_argument("--rate", type=float, default=1.0, help="сообщений в секунду на игрока")
+    parser.add_argument("--duration", type=float, default=5.0, help="длительность фазы чата, с")
+    parser.add_argument("--churn", type=float, default=0.1, help="доля сообщений, после которых игрок выходит")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="файл для JSON-отчёта (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.rooms, args.players, args.rate, args.duration, args.churn, args.seed))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text)
+    else:
+        print(text)
@@ -0,0 +1,114 @@
+"""
+Бенчмарк сохранения: скорость записи журнала с group commit и время восстановления.
+
+Заполняет хранилище сообщениями чата в нескольких комнатах через Journal,
+затем восстанавливает реестр с нуля: один раз только из журнала, другой —
+из снимка. Хранилища во временном каталоге: файлы и SQLite.
+
+Запуск: python -m benchmarks.persistence --messages 100000 --rooms 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from src.chat_history import ChatHistory
+from src.persistence import FileStore, Journal, SqliteStore
+from src.registry import PlayerRegistry, RoomRegistry
+from src.scheduler import Scheduler
+
+WORDS = "загадка ответ комната игрок привет кто первый отгадал время раунд вопрос очки".split()
+
+
+def make_registry(history_size: int) -> RoomRegistry:
+    return RoomRegistry(history=lambda name: ChatHistory(name, max_messages=history_size, max_bytes=1 << 30))
+
+
+async def fill(store, rooms_count: int, players: int, messages: int, history_size: int, commit_ms: float) -> dict:
+    rooms = make_registry(history_size)
+    journal = Journal(store, rooms, Scheduler(), commit_interval=commit_ms / 1000, snapshot_every=1 << 62)
+    await journal.recover()
+
+    registry = PlayerRegistry()
+    created = []
+    for number in range(rooms_count):
+        members = [registry.connect(f"sid{number}x{i}") for i in range(players)]
+        for i, player in enumerate(members):
+            player.name = f"Игрок {i}"
+        room = rooms.create(f"Комната {number}", 5, "общие", members[0])
+        for player in members[1:]:
+            rooms.join(room, player)
+        created.append(room)
+
+    started = time.perf_counter()
+    for number in range(messages):
+        room = created[number % rooms_count]
+        rooms.post(room, {
+            "sender": f"Игрок {number % players}",
+            "text": " ".join(WORDS[(number + i) % len(WORDS)] for i in range(8)),
+            "timestamp": "2024-01-01T12:00:00",
+        })
+        # Отдаём управление, как между событиями разных клиентов
+        if number % 500 == 0:
+            await asyncio.sleep(0)
+    await journal.flush()
+    written = time.perf_counter() - started
+
+    result = {"write_s": round(written, 3), "commits": journal.commits, "records": journal.seq}
+    await journal.close()
+    return result
+
+
+async def recover(store, history_size: int) -> dict:
+    rooms = make_registry(history_size)
+    journal = Journal(store, rooms, Scheduler())
+    started = time.perf_counter()
+    await journal.recover()
+    elapsed = time.perf_counter() - started
+    messages = sum(len(room.history) for room in rooms)
+    await journal.close()
+    return {"recover_s": round(elapsed, 3), "rooms": len(rooms), "messages": messages}
+
+
+async def snapshot(store, history_size: int) -> dict:
+    """ Восстановление, снимок и обрезка журнала """
+    rooms = make_registry(history_size)
+    journal = Journal(store, rooms, Scheduler())
+    await journal.recover()
+    started = time.perf_counter()
+    await journal.checkpoint()
+    elapsed = time.perf_counter() - started
+    await journal.close()
+    return {"snapshot_s": round(elapsed, 3)}
+
+
+def run(messages: int, rooms: int, players: int, commit_ms: float) -> dict:
+    # История каждой комнаты вмещает все её сообщения, чтобы снимок был того же объёма
+    history_size = messages // rooms + 1
+    report = {}
+    with tempfile.TemporaryDirectory() as directory:
+        stores = {
+            "file": lambda: FileStore(os.path.join(directory, "file")),
+            "sqlite": lambda: SqliteStore(os.path.join(directory, "state.db")),
+        }
+        for name, make_store in stores.items():
+            result = asyncio.run(fill(make_store(), rooms, players, messages, history_size, commit_ms))
+            result["from_log"] = asyncio.run(recover(make_store(), history_size))
+            result.update(asyncio.run(snapshot(make_store(), history_size)))
+            result["from_snapshot"] = asyncio.run(recover(make_store(), history_size))
+            report[name] = result
+    return {"config": {"messages": messages, "rooms": rooms, "players": players, "commit_ms": commit_ms},
+            "results": report}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--rooms", type=int, default=100)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--commit-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.messages, args.rooms, args.players, args.commit_ms), ensure_ascii=False, indent=2))
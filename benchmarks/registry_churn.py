@@ -0,0 +1,54 @@
+"""
+Микробенчмарк реестра комнат: вход и выход игроков при 10k+ подключённых.
+
+Запуск: python -m benchmarks.registry_churn --players 20000 --rooms 500 --rounds 5
+"""
+import argparse
+import random
+import time
+
+from src.registry import PlayerRegistry, RoomRegistry
+
+
+def run(players_count: int, rooms_count: int, rounds: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    players, rooms = PlayerRegistry(), RoomRegistry()
+
+    sids = [f"sid_{i}" for i in range(players_count)]
+    for sid in sids:
+        players.connect(sid)
+    room_list = [
+        rooms.create(f"room {i}", 5, "", players.get(sids[i])) for i in range(rooms_count)
+    ]
+
+    operations = 0
+    started = time.perf_counter()
+    for _ in range(rounds):
+        rng.shuffle(sids)
+        for sid in sids:
+            player = players.get(sid)
+            room = rooms.room_of(sid)
+            if room is not None and room.creator_sid != sid:
+                rooms.leave(player)
+            else:
+                rooms.join(rng.choice(room_list), player)
+            operations += 1
+    elapsed = time.perf_counter() - started
+
+    return {
+        "players": players_count,
+        "rooms": rooms_count,
+        "operations": operations,
+        "seconds": round(elapsed, 4),
+        "ops_per_sec": round(operations / elapsed),
+        "us_per_op": round(elapsed / operations * 1e6, 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--players", type=int, default=20000)
+    parser.add_argument("--rooms", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    print(run(args.players, args.rooms, args.rounds))
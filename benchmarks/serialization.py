@@ -0,0 +1,136 @@
+"""
+Бенчмарк сериализации пакетов: время кодирования и размер типичных сообщений.
+
+Сравниваются стандартный пакет python-socketio (json с \\uXXXX), FastPacket со
+стандартным json и с orjson, склейка уже закодированных данных (RawJSON) и
+MessagePack. MessagePack замеряется так, как его получает клиент сервера:
+эмит кодируется в JSON (его ждут остальные адресаты), затем MsgpackClients
+пакует данные пакета. Нагрузка: снимок лобби, страница истории чата и одно
+сообщение.
+
+Запуск: python -m benchmarks.serialization --rooms 200 --players 8 --messages 50
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime
+
+import socketio
+from socketio import packet
+
+from src.chat_history import ChatHistory
+from src.serialization import (
+    EncodeOnce, MsgpackClients, OrJson, StdlibJson, msgpack, orjson, packet_class, raw_array, raw_object,
+)
+
+WORDS = "загадка ответ комната игрок привет кто первый отгадал время раунд вопрос очки".split()
+
+
+def make_text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def make_lobby(rng: random.Random, rooms: int, players: int) -> dict:
+    """ Страница списка комнат в формате LobbyFeed.page """
+    return {
+        "epoch": "0a1b2c3d",
+        "version": rooms,
+        "cursor": None,
+        "rooms": [
+            {
+                "id": f"room_{number}",
+                "name": make_text(rng, 2),
+                "context": "общие",
+                "player_count": players,
+                "created_at": datetime.now().isoformat(),
+                "worker": None,
+            }
+            for number in range(rooms)
+        ],
+    }
+
+
+def make_history(rng: random.Random, messages: int) -> ChatHistory:
+    history = ChatHistory(max_messages=messages)
+    for _ in range(messages):
+        history.append({
+            "sender": f"Игрок {rng.randint(1, 8)}",
+            "text": make_text(rng, rng.randint(3, 15)),
+            "timestamp": datetime.now().isoformat(),
+        })
+    return history
+
+
+def measure(encode, repeat: int) -> dict:
+    encoded = encode()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        encode()
+    elapsed = time.perf_counter() - started
+    size = len(encoded) if isinstance(encoded, bytes) else len(encoded.encode())
+    return {"us": round(elapsed / repeat * 1e6, 2), "bytes": size}
+
+
+def run(rooms: int, players: int, messages: int, repeat: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    lobby = make_lobby(rng, rooms, players)
+    history = make_history(rng, messages)
+    page, has_more = history.page(None, messages)
+    message = page[-1]
+
+    classes = {"socketio": packet.Packet, "json": packet_class(StdlibJson)}
+    if orjson is not None:
+        classes["orjson"] = packet_class(OrJson)
+    encoders = {
+        name: lambda event, data, cls=cls: cls(packet.EVENT, data=[event, data]).encode()
+        for name, cls in classes.items()
+    }
+    fast = packet_class(OrJson if orjson is not None else StdlibJson)
+    if msgpack is not None:
+        # Тот же путь, что у эмита сервера клиенту с MessagePack
+        server = socketio.AsyncServer(async_mode="asgi", serializer=fast)
+        msgpack_clients = MsgpackClients(server)
+        server.packet_class.keep_packet = True
+
+        def encode_msgpack(event, data):
+            frame = server.packet_class(packet.EVENT, namespace="/", data=[event, data]).encode()
+            return msgpack_clients.encode(frame.packet)
+
+        encoders["msgpack"] = encode_msgpack
+
+    payloads = {
+        "rooms_list": ("rooms_list", lobby),
+        "chat_history": ("chat_history", {"messages": page, "has_more": has_more}),
+        "new_message": ("new_message", message),
+    }
+    report = {
+        name: {encoder: measure(lambda: encode(event, data), repeat) for encoder, encode in encoders.items()}
+        for name, (event, data) in payloads.items()
+    }
+
+    # Уже закодированные данные: снимок кодируется один раз, история берётся из буфера
+    snapshot_json = EncodeOnce(fast.json)
+
+    def history_data():
+        encoded, more = history.page_encoded(None, messages)
+        return raw_object({"messages": raw_array(encoded), "has_more": more}, fast.json)
+
+    raw = {"rooms_list": lambda: snapshot_json(lobby), "chat_history": history_data}
+    for name, data in raw.items():
+        report[name]["raw"] = measure(lambda: fast(packet.EVENT, data=[name, data()]).encode(), repeat)
+        if msgpack is not None:
+            # Снимок лобби разбирается для MessagePack один раз, страница истории — на каждый эмит
+            report[name]["raw_msgpack"] = measure(lambda: encode_msgpack(name, data()), repeat)
+    return {"config": {"rooms": rooms, "players": players, "messages": messages}, "results": report}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=200)
+    parser.add_argument("--players", type=int, default=8)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.rooms, args.players, args.messages, args.repeat), ensure_ascii=False, indent=2))
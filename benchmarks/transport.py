@@ -0,0 +1,196 @@
+"""
+Бенчмарк профилей транспорта: время установки соединения и память на соединение.
+
+Для каждого профиля (см. src/transport.py) сервер запускается отдельным
+процессом через python main.py --profile ..., затем клиенты подключаются
+так же, как браузерный клиент: сразу websocket с предложением
+permessage-deflate, открытие Engine.IO и подключение Socket.IO. Клиенты —
+минимальная реализация поверх asyncio и wsproto, без потоков на соединение.
+
+Время установки — от TCP-подключения до ответа Socket.IO "40".
+Память — прирост RSS сервера после того, как все соединения открыты и
+простояли --hold секунд, делённый на число соединений.
+
+Запуск: python -m benchmarks.transport --connections 1000 --profiles compat,fast,websocket
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Dict, List, Optional
+
+from wsproto import ConnectionType, WSConnection
+from wsproto.events import AcceptConnection, CloseConnection, Ping, RejectConnection, Request, TextMessage
+from wsproto.extensions import PerMessageDeflate
+
+from benchmarks.load_test import percentile
+from src.transport import transport_settings
+
+
+class WsClient:
+    """ Соединение Socket.IO поверх websocket: подключение, ответы на ping и закрытие """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.ws = WSConnection(ConnectionType.CLIENT)
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._texts: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self.deflate = False
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        self._writer.write(self.ws.send(Request(
+            host=f"{self.host}:{self.port}",
+            target="/socket.io/?EIO=4&transport=websocket",
+            extensions=[PerMessageDeflate()],
+        )))
+        self._task = asyncio.create_task(self._read())
+        opened = await self._texts.get()
+        if not opened.startswith("0"):
+            raise ConnectionError(f"Ожидался пакет open, получено {opened!r}")
+        self._send("40")
+        connected = await self._texts.get()
+        if not connected.startswith("40"):
+            raise ConnectionError(f"Ожидалось подключение Socket.IO, получено {connected!r}")
+
+    def _send(self, text: str):
+        self._writer.write(self.ws.send(TextMessage(data=text)))
+
+    async def _read(self):
+        parts = []
+        while True:
+            data = await self._reader.read(65536)
+            if not data:
+                await self._texts.put("")
+                return
+            self.ws.receive_data(data)
+            for event in self.ws.events():
+                if isinstance(event, AcceptConnection):
+                    self.deflate = any(isinstance(extension, PerMessageDeflate) for extension in event.extensions)
+                elif isinstance(event, RejectConnection):
+                    await self._texts.put("")
+                    return
+                elif isinstance(event, Ping):
+                    self._writer.write(self.ws.send(event.response()))
+                elif isinstance(event, CloseConnection):
+                    await self._texts.put("")
+                    return
+                elif isinstance(event, TextMessage):
+                    parts.append(event.data)
+                    if event.message_finished:
+                        text, parts = "".join(parts), []
+                        # Ping Engine.IO: отвечаем сами, чтобы соединение не закрылось по таймауту
+                        if text == "2":
+                            self._send("3")
+                        else:
+                            await self._texts.put(text)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+
+
+def server_rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def start_server(profile: str, port: int) -> subprocess.Popen:
+    env = dict(os.environ, LOG_LEVEL="WARNING")
+    process = subprocess.Popen(
+        [sys.executable, "main.py", "--profile", profile, "--host", "127.0.0.1", "--port", str(port)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/serializers", timeout=1).read()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"Сервер с профилем {profile} не запустился")
+
+
+async def open_connections(port: int, count: int, concurrency: int) -> tuple:
+    clients: List[WsClient] = []
+    setup: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            client = WsClient("127.0.0.1", port)
+            started = time.perf_counter()
+            await client.connect()
+            setup.append((time.perf_counter() - started) * 1000)
+            clients.append(client)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(count)))
+    return clients, sorted(setup), time.perf_counter() - started
+
+
+async def measure(profile: str, port: int, connections: int, concurrency: int, hold: float) -> Dict:
+    process = start_server(profile, port)
+    try:
+        # Прогрев: ленивые импорты и первые аллокации не должны попасть в расчёт на соединение
+        warmup, _, _ = await open_connections(port, 20, concurrency)
+        await asyncio.sleep(0.5)
+        before = server_rss_mb(process.pid)
+
+        clients, setup, elapsed = await open_connections(port, connections, concurrency)
+        await asyncio.sleep(hold)
+        after = server_rss_mb(process.pid)
+
+        for client in clients + warmup:
+            await client.close()
+        return {
+            "deflate": clients[0].deflate,
+            "connect_ms": {
+                "p50": round(percentile(setup, 50), 3),
+                "p95": round(percentile(setup, 95), 3),
+                "p99": round(percentile(setup, 99), 3),
+            },
+            "connections_per_s": round(connections / elapsed),
+            "server_rss_mb": round(after, 1),
+            "kb_per_connection": round((after - before) * 1024 / connections, 1),
+        }
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def run(profiles: List[str], connections: int, concurrency: int, hold: float, port: int) -> Dict:
+    results = {}
+    for profile in profiles:
+        settings = transport_settings(["--profile", profile])
+        result = asyncio.run(measure(profile, port, connections, concurrency, hold))
+        # Что реально выбрано: без uvloop и httptools fast работает на asyncio и h11
+        result["settings"] = {name: settings[name] for name in ("loop", "http", "transports", "ws_per_message_deflate")}
+        results[profile] = result
+    return {"config": {"connections": connections, "concurrency": concurrency, "hold": hold}, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", default="compat,fast,websocket")
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--hold", type=float, default=2.0, help="сколько секунд соединения стоят до замера памяти")
+    parser.add_argument("--port", type=int, default=8090)
+    args = parser.parse_args()
+
+    report = run(args.profiles.split(","), args.connections, args.concurrency, args.hold, args.port)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
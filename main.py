@@ -1,174 +1,531 @@
+import asyncio
+import os
+import sys
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Dict, List, Optional
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+from time import monotonic
+from functools import partial
+from typing import Dict, Optional, Tuple
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 import socketio
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, ValidationError
 import uvicorn
 
+from src.all_riddles import riddles
+from src.batching import RoomOutbox
+from src.chat_history import ChatHistory
+from src.cluster import backend_from_url
+from src.leaderboard import GLOBAL, LEADERBOARD_ROOM, Leaderboards
+from src.lobby import LOBBY_ROOM, LobbyFeed, room_summary
+from src.log import LOG_STATE_DUMPS, get_logger, sampled, setup_logging
+from src.metrics import Metrics
+from src.persistence import Journal, freeze_on_exit, store_from_url
+from src.quiz import ASKING, QuizGame
+from src.registry import PlayerRecord, PlayerRegistry, RoomRecord, RoomRegistry
+from src.riddle_bank import RiddleBank
+from src.scheduler import Scheduler
+from src.serialization import (
+    EncodeOnce, MsgpackClients, available_serializers, json_module, packet_class, raw_array, raw_object,
+)
+from src.sweeper import Sweeper
+from src.throttle import DEFAULT_RATE_LIMITS, OutboundGuard, RateLimiter, parse_budgets
+from src.transport import engineio_options, transport_settings, uvicorn_options
+from src.web import SecurityHeaders, StaticAssets
+
 # Настройка сервера
-app = FastAPI()
-
-# Middleware для добавления CSP заголовков
-@app.middleware("http")
-async def add_csp_headers(request: Request, call_next):
-    response = await call_next(request)
-    response.headers["Content-Security-Policy"] = (
-        "default-src 'self'; "
-        "script-src 'self' 'unsafe-inline' 'unsafe-eval' 'nonce-handlebars-check' https://cdn.socket.io https://cdn.jsdelivr.net https://cdnjs.cloudflare.com; "
-        "style-src 'self' 'unsafe-inline'; "
-        "img-src 'self' data: https:; "
-        "font-src 'self' https:; "
-        "connect-src 'self' ws: wss:; "
-        "frame-src 'self';"
-    )
-    return response
+setup_logging()
+log_rooms = get_logger("rooms")
+log_chat = get_logger("send_message")
+log_state = get_logger("state")
+
+metrics = Metrics()
+LAG_PROBE_INTERVAL = float(os.getenv("LAG_PROBE_INTERVAL", 1.0))
+
+# Многопроцессный режим (см. src/cluster.py)
+CLUSTER_URL = os.getenv("CLUSTER_URL", "")
+WORKER_ID = os.getenv("WORKER_ID", "")
+WORKER_URL = os.getenv("WORKER_URL") or None
+cluster = backend_from_url(CLUSTER_URL)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if journal is not None:
+        await journal.recover()
+        freeze_on_exit(journal)
+    await cluster.start(apply_lobby)
+    # Комнаты других воркеров, созданные до нашего запуска
+    for summary in await cluster.rooms():
+        lobby.apply({"type": "room_added", "room": summary})
+    # Восстановленные комнаты ждут своих игроков PERSIST_GRACE секунд
+    for room in rooms:
+        await publish_lobby("room_added", room)
+    if len(rooms):
+        scheduler.call_later(PERSIST_GRACE, expire_stale_players)
+    start_lag_probe()
+    sweeper.start()
+    yield
+    # Комнаты этого воркера становятся недоступны остальным
+    for room in list(rooms):
+        await publish_lobby("room_removed", room)
+    await cluster.close()
+    if journal is not None:
+        await journal.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Политика безопасности; заголовки добавляет SecurityHeaders (см. src/web.py)
+CONTENT_SECURITY_POLICY = (
+    "default-src 'self'; "
+    "script-src 'self' 'unsafe-inline' 'unsafe-eval' 'nonce-handlebars-check' https://cdn.socket.io https://cdn.jsdelivr.net https://cdnjs.cloudflare.com; "
+    "style-src 'self' 'unsafe-inline'; "
+    "img-src 'self' data: https:; "
+    "font-src 'self' https:; "
+    "connect-src 'self' ws: wss:; "
+    "frame-src 'self';"
+)
 
-sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins="*")
+# Кодировщик JSON для пакетов: orjson или json (см. src/serialization.py)
+SERIALIZER = os.getenv("SERIALIZER", "orjson")
+codec = json_module(SERIALIZER)
+
+# Транспорт: профиль, переменные окружения и ключи python main.py (см. src/transport.py)
+transport = transport_settings(sys.argv[1:] if __name__ == "__main__" else None)
+
+sio = socketio.AsyncServer(
+    async_mode="asgi",
+    cors_allowed_origins="*",
+    serializer=metrics.packet_class(base=packet_class(codec)),
+    **engineio_options(transport),
+)
+msgpack_clients = MsgpackClients(sio)
+# Статика из памяти со сжатием и ETag, затем FastAPI; Socket.IO — на /socket.io/
+static_assets = StaticAssets(app, "static")
 socket_app = socketio.ASGIApp(
-    sio, app, static_files={"/": "static/index.html", "/static": "./static"}
+    sio, SecurityHeaders(static_assets, {"Content-Security-Policy": CONTENT_SECURITY_POLICY})
 )
 
-# Хранилище данных
-rooms: Dict[str, Dict] = {}
-players: Dict[str, Dict] = {}
+# Настройки истории чата
+CHAT_HISTORY_SIZE = int(os.getenv("CHAT_HISTORY_SIZE", 200))
+CHAT_HISTORY_BYTES = int(os.getenv("CHAT_HISTORY_BYTES", 256 * 1024))
+CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", 50))
+CHAT_SPILL_DIR = os.getenv("CHAT_SPILL_DIR") or None
 
+# Банк загадок: файл из RIDDLE_BANK (см. src/riddle_bank.py) или встроенный список
+RIDDLE_BANK = os.getenv("RIDDLE_BANK")
+riddle_bank = RiddleBank.open(RIDDLE_BANK) if RIDDLE_BANK else RiddleBank.from_riddles(riddles)
 
-class Player(BaseModel):
-    sid: str
-    name: str
-    room_id: str
+# Настройки викторины
+QUIZ_ROUND_SECONDS = float(os.getenv("QUIZ_ROUND_SECONDS", 30))
+SOLO_QUESTIONS_COUNT = int(os.getenv("SOLO_QUESTIONS_COUNT", 5))
+
+# Таблицы лидеров (см. src/leaderboard.py)
+LEADERBOARD_TOP = int(os.getenv("LEADERBOARD_TOP", 10))
+LEADERBOARD_THROTTLE_MS = float(os.getenv("LEADERBOARD_THROTTLE_MS", 1000))
+
+# Размер страницы списка комнат
+ROOMS_PAGE_SIZE = int(os.getenv("ROOMS_PAGE_SIZE", 50))
+
+# Склейка исходящих событий комнаты: окно в мс (0 — выключено) и размер пакета
+BATCH_WINDOW_MS = float(os.getenv("BATCH_WINDOW_MS", 0))
+BATCH_MAX_EVENTS = int(os.getenv("BATCH_MAX_EVENTS", 32))
+
+# Бюджеты входящих событий и порог очереди исходящих на клиента (см. src/throttle.py)
+RATE_LIMITS = os.getenv("RATE_LIMITS", DEFAULT_RATE_LIMITS)
+OUTBOUND_HIGH_WATER = int(os.getenv("OUTBOUND_HIGH_WATER", 256))
+
+# Сохранение комнат и чата между перезапусками (см. src/persistence.py)
+PERSIST_URL = os.getenv("PERSIST_URL", "")
+PERSIST_COMMIT_MS = float(os.getenv("PERSIST_COMMIT_MS", 50))
+PERSIST_SNAPSHOT_EVERY = int(os.getenv("PERSIST_SNAPSHOT_EVERY", 50_000))
+PERSIST_GRACE = float(os.getenv("PERSIST_GRACE", 60))
+
+# Фоновая уборка (см. src/sweeper.py)
+SWEEP_INTERVAL = float(os.getenv("SWEEP_INTERVAL", 5))
+SWEEP_BATCH = int(os.getenv("SWEEP_BATCH", 500))
+ROOM_IDLE_TTL = float(os.getenv("ROOM_IDLE_TTL", 6 * 3600))
+HISTORY_TTL = float(os.getenv("HISTORY_TTL", 7 * 24 * 3600))
 
-class Room(BaseModel):
-    id: str
+# Хранилище данных
+rooms = RoomRegistry(
+    prefix=f"room_{WORKER_ID}_" if WORKER_ID else "room_",
+    history=partial(
+        ChatHistory,
+        max_messages=CHAT_HISTORY_SIZE,
+        max_bytes=CHAT_HISTORY_BYTES,
+        spill_dir=CHAT_SPILL_DIR,
+    )
+)
+players = PlayerRegistry()
+lobby = LobbyFeed()
+games: Dict[str, QuizGame] = {}
+leaderboards = Leaderboards()
+scheduler = Scheduler()
+outbox = RoomOutbox(sio.emit, scheduler, window=BATCH_WINDOW_MS / 1000, max_events=BATCH_MAX_EVENTS)
+limiter = RateLimiter(parse_budgets(RATE_LIMITS))
+rooms_list_json = EncodeOnce(codec)
+sweeper = Sweeper(scheduler, interval=SWEEP_INTERVAL, batch=SWEEP_BATCH)
+persist_store = store_from_url(PERSIST_URL)
+journal = Journal(
+    persist_store, rooms, scheduler,
+    commit_interval=PERSIST_COMMIT_MS / 1000, snapshot_every=PERSIST_SNAPSHOT_EVERY, leaderboards=leaderboards,
+) if persist_store is not None else None
+
+
+class CreateRoomData(BaseModel):
     name: str
     questions_count: int
     context: str
-    players: List[Player]
-    messages: List[Dict] = []
-    created_at: str = datetime.now().isoformat()
+    player_name: str
+
+class JoinRoomData(BaseModel):
+    room_id: str
+    player_name: str
+    token: Optional[str] = Field(None, max_length=64)
+
+class RoomsQuery(BaseModel):
+    context: Optional[str] = None
+    prefix: str = Field("", max_length=64)
+    min_players: int = Field(0, ge=0)
+    max_players: Optional[int] = Field(None, ge=0)
+    cursor: Optional[Tuple[str, str]] = None
+    limit: int = Field(ROOMS_PAGE_SIZE, ge=1, le=ROOMS_PAGE_SIZE)
+
+
+async def publish_lobby(kind: str, room: RoomRecord):
+    """ Отправляет изменение списка комнат в общее хранилище и шину кластера """
+    if kind == "room_removed":
+        await cluster.remove_room(room.id)
+        await cluster.publish({"type": kind, "room_id": room.id})
+    else:
+        summary = room_summary(room, WORKER_URL)
+        await cluster.put_room(summary)
+        await cluster.publish({"type": kind, "room": summary})
+
+
+async def apply_lobby(change: Dict):
+    """
+    Изменение из шины: применяем к своей ленте и рассылаем своим подписчикам лобби.
+    Каждый воркер делает это сам (см. src/cluster.py).
+    """
+    delta = lobby.apply(change)
+    if delta is not None:
+        await sio.emit(delta["type"], delta, room=LOBBY_ROOM)
+
+
+def history_page(room: RoomRecord, cursor: Optional[int], limit: int, **fields):
+    """ Страница истории собирается из уже закодированных сообщений, без повторной сериализации """
+    messages, has_more = room.history.page_encoded(cursor, limit)
+    return raw_object({"messages": raw_array(messages), **fields, "has_more": has_more}, codec)
+
+
+def room_handshake(room: RoomRecord, player: PlayerRecord):
+    """
+    Ответ на вход или создание: описание комнаты, состав, последняя страница истории
+    и token игрока для возвращения в комнату после перезапуска сервера
+    """
+    return raw_object({
+        "room": room.to_dict(),
+        "history": history_page(room, None, CHAT_PAGE_SIZE),
+        "token": player.token,
+    }, codec)
+
+
+async def send_player_joined(room: RoomRecord, player: PlayerRecord, replaces: Optional[str] = None):
+    """ Дельта состава вместо полного списка игроков: размер не зависит от числа игроков """
+    await outbox.send(room.id, "player_joined", {
+        "room_id": room.id,
+        "player": {"sid": player.sid, "name": player.name},
+        "replaces": replaces,
+        "creator": room.creator_sid,
+        "roster_version": room.roster_version,
+    })
+
+
+async def send_player_left(room: RoomRecord, sid: str):
+    await outbox.send(room.id, "player_left", {
+        "room_id": room.id,
+        "sid": sid,
+        "creator": room.creator_sid,
+        "roster_version": room.roster_version,
+    })
+
+
+async def resync_client(sid: str):
+    """ Актуальное состояние для клиента, которому отбрасывали события из-за переполненной очереди """
+    room = rooms.room_of(sid)
+    if room is not None:
+        await sio.emit("update_players", room.roster(), to=sid)
+        await sio.emit("chat_history", history_page(room, None, CHAT_PAGE_SIZE), to=sid)
+    elif LOBBY_ROOM in sio.rooms(sid):
+        await sio.emit("rooms_list", rooms_list_json(lobby.page(limit=ROOMS_PAGE_SIZE)), to=sid)
+
+    game = games.get(room.id if room is not None else sid)
+    if game is not None and game.state == ASKING:
+        await sio.emit("riddle", game.question(), to=sid)
+
+
+guard = OutboundGuard(sio, scheduler, OUTBOUND_HIGH_WATER, resync_client)
+
+
+async def expire_stale_players():
+    """ Игроки, не вернувшиеся в свои комнаты после перезапуска, из них выходят """
+    for room in rooms.expire_stale():
+        if not room.members:
+            rooms.remove(room.id)
+            outbox.drop(room.id)
+            await publish_lobby("room_removed", room)
+        else:
+            await publish_lobby("room_changed", room)
+            await outbox.send(room.id, "update_players", room.roster())
+
+
+# Метрики
+metrics.gauge("rooms", "Открытые комнаты", lambda: len(rooms))
+metrics.gauge("players", "Подключённые игроки", lambda: len(players))
+metrics.gauge("games", "Идущие викторины", lambda: len(games))
+metrics.gauge("leaderboard_players", "Игроки в общей таблице лидеров", lambda: len(leaderboards.everyone))
+metrics.gauge("rate_limiter_clients", "Клиенты с корзинами лимитера", lambda: len(limiter))
+metrics.gauge("outbound_lagging_clients", "Клиенты с переполненной очередью исходящих", lambda: len(guard.lagging))
+metrics.counter(
+    "rate_limited_total", "События, отклонённые лимитером", lambda: limiter.rejected, label="event"
+)
+metrics.counter(
+    "outbound_dropped_total", "Пакеты, отброшенные медленным клиентам", lambda: guard.dropped
+)
+if journal is not None:
+    metrics.counter("journal_commits_total", "Пачки журнала, записанные на диск", lambda: journal.commits)
+    metrics.counter("journal_snapshots_total", "Снимки состояния", lambda: journal.snapshots)
+metrics.counter(
+    "swept_total", "Записи, освобождённые фоновой уборкой", sweeper.reclaimed, label="kind"
+)
+metrics.gauge("scheduler_timers", "Активные таймеры планировщика", lambda: len(scheduler))
+metrics.gauge(
+    "chat_history_messages", "Сообщения в памяти всех комнат",
+    lambda: sum(len(room.history) for room in rooms),
+)
+metrics.gauge(
+    "chat_history_max_room_messages", "Сообщения в памяти самой большой комнаты",
+    lambda: max((len(room.history) for room in rooms), default=0),
+)
+
+
+def start_lag_probe():
+    """
+    Запускает замер задержки цикла событий. Таймер ставится прямо в цикл,
+    а не в общий планировщик: иначе в метрику попадала бы и очередь планировщика.
+    """
+    loop = asyncio.get_running_loop()
+    loop.call_later(LAG_PROBE_INTERVAL, probe_loop_lag, loop, loop.time() + LAG_PROBE_INTERVAL)
+
+
+def probe_loop_lag(loop: asyncio.AbstractEventLoop, expected: float):
+    metrics.loop_lag.observe(max(loop.time() - expected, 0.0))
+    loop.call_later(LAG_PROBE_INTERVAL, probe_loop_lag, loop, loop.time() + LAG_PROBE_INTERVAL)
+
+
+@app.get("/serializers")
+async def serializers_endpoint():
+    """ Параметры подключения: форматы пакетов на выбор и транспорты сервера """
+    return {"serializers": available_serializers(), "transports": transport["transports"]}
+
+
+@app.get("/stats")
+async def stats_endpoint():
+    """ Размеры реестров и то, что освободила фоновая уборка """
+    return {
+        "rooms": len(rooms),
+        "players": len(players),
+        "games": len(games),
+        "leaderboard_players": len(leaderboards.everyone),
+        "rate_limiter_clients": len(limiter),
+        "sweeper": sweeper.stats(),
+    }
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+def log_state_dump():
+    """ Полный дамп комнат и игроков; собирается только при LOG_STATE_DUMPS и уровне DEBUG """
+    if LOG_STATE_DUMPS:
+        log_state.opt(lazy=True).debug(
+            "Комнаты: {} Игроки: {}",
+            lambda: [room.to_dict() for room in rooms],
+            lambda: [player.to_dict() for player in players],
+        )
+
+
+def stop_game(room_id: str):
+    game = games.pop(room_id, None)
+    if game is not None:
+        game.stop()
 
 
 # Обработчики подключений
 @sio.event
+@metrics.instrument("connect")
 async def connect(sid, environ):
     await sio.save_session(sid, {"connected_at": datetime.now().isoformat()})
-    players[sid] = {"sid": sid, "name": None, "room_id": None}
+    msgpack_clients.register(sid, environ)
+    players.connect(sid)
 
 
 @sio.event
+@metrics.instrument("disconnect")
 async def disconnect(sid):
-    if sid in players:
-        player = players[sid]
-        if "room_id" in player and player["room_id"]:
-            room_id = player["room_id"]
-            if room_id in rooms:
-                # Удаляем игрока из комнаты
-                rooms[room_id]["players"] = [
-                    p for p in rooms[room_id]["players"] if p["sid"] != sid
-                ]
-                
-                # Отправляем уведомление в чат о выходе игрока
-                await sio.emit(
-                    "new_message",
-                    {
-                        "sender": "Система",
-                        "text": f"Игрок {player.get('name', 'Неизвестный')} покинул комнату",
-                        "timestamp": datetime.now().isoformat(),
-                    },
-                    room=room_id,
-                )
-                
-                # Если комната пуста, удаляем её
-                if len(rooms[room_id]["players"]) == 0:
-                    del rooms[room_id]
-                    await sio.emit(
-                        "rooms_list",
-                        {
-                            "rooms": [
-                                {
-                                    "id": r["id"],
-                                    "name": r["name"],
-                                    "context": r["context"],
-                                    "players": r["players"],
-                                    "created_at": r["created_at"],
-                                }
-                                for r in rooms.values()
-                            ]
-                        },
-                    )
-                else:
-                    # Обновляем список игроков для оставшихся
-                    await sio.emit(
-                        "update_players",
-                        {"players": rooms[room_id]["players"]},
-                        room=room_id,
-                    )
-        del players[sid]
+    await remove_player(sid)
+
+
+async def remove_player(sid) -> int:
+    """ Убирает все следы клиента; возвращает 1, если игрок был в реестре """
+    # Одиночная игра без комнаты привязана к sid
+    stop_game(sid)
+    limiter.forget(sid)
+    msgpack_clients.forget(sid)
+
+    player = players.remove(sid)
+    if player is None:
+        return 0
+    await exit_room(player)
+    return 1
+
+
+async def exit_room(player: PlayerRecord) -> Optional[RoomRecord]:
+    """
+    Выводит игрока из его комнаты: уведомляет оставшихся и лобби,
+    пустую комнату удаляет. Возвращает комнату, из которой игрок вышел.
+    """
+    room = rooms.leave(player)
+    if room is None:
+        return None
+    await sio.leave_room(player.sid, room.id)
+
+    # Отправляем уведомление в чат о выходе игрока
+    await outbox.send(
+        room.id,
+        "new_message",
+        {
+            "sender": "Система",
+            "text": f"Игрок {player.name or 'Неизвестный'} покинул комнату",
+            "timestamp": datetime.now().isoformat(),
+        },
+    )
+
+    # Если комната пуста, удаляем её
+    if not room.members:
+        rooms.remove(room.id)
+        stop_game(room.id)
+        outbox.drop(room.id)
+        await publish_lobby("room_removed", room)
+    else:
+        await publish_lobby("room_changed", room)
+        # Оставшимся — дельта состава
+        await send_player_left(room, player.sid)
+    return room
+
+
+# Фоновая уборка
+async def sweep_player(sid) -> int:
+    """ Игрок, чьё соединение пропало без disconnect """
+    if sio.manager.is_connected(sid, "/"):
+        return 0
+    return await remove_player(sid)
+
+
+async def sweep_room(room_id) -> int:
+    """ Комната без входов и сообщений дольше ROOM_IDLE_TTL закрывается """
+    room = rooms.get(room_id)
+    if room is None or room_id in games:
+        return 0
+    if room.members and (not ROOM_IDLE_TTL or monotonic() - room.last_active < ROOM_IDLE_TTL):
+        return 0
+    await outbox.flush(room.id)
+    await sio.emit(
+        "lobby_deleted", {"message": "Комната закрыта из-за неактивности."}, room=room.id
+    )
+    rooms.remove(room.id)
+    await sio.close_room(room.id)
+    await publish_lobby("room_removed", room)
+    return 1
+
+
+async def sweep_history(room_id) -> int:
+    room = rooms.get(room_id)
+    return room.history.expire(HISTORY_TTL) if room is not None else 0
+
+
+async def sweep_game(key) -> int:
+    """ Игра, у которой не осталось ни комнаты, ни одиночного игрока """
+    if key in rooms or key in players:
+        return 0
+    stop_game(key)
+    return 1
+
+
+async def sweep_leaderboard(board_id) -> int:
+    """ Таблица лидеров удалённой комнаты """
+    if board_id in rooms:
+        return 0
+    return 1 if leaderboards.drop(board_id) is not None else 0
+
+
+sweeper.add("players", lambda: [player.sid for player in players], sweep_player)
+sweeper.add("rooms", lambda: [room.id for room in rooms], sweep_room)
+if HISTORY_TTL:
+    sweeper.add("history", lambda: [room.id for room in rooms], sweep_history)
+sweeper.add("games", lambda: list(games), sweep_game)
+sweeper.add("leaderboards", leaderboards.rooms, sweep_leaderboard)
 
 
 # Обработчики комнат
 @sio.on("create_room")
+@limiter.limit("create_room")
+@metrics.instrument("create_room")
 async def handle_create_room(sid, data):
     try:
-        room_id = f"room_{len(rooms) + 1}"
-        player = Player(sid=sid, name=data["player_name"], room_id=room_id)
-
-        room = Room(
-            id=room_id,
-            name=data["name"],
-            questions_count=data["questions_count"],
-            context=data["context"],
-            players=[player],
-            messages=[],
+        request = CreateRoomData(**data)
+        player = players.get(sid) or players.connect(sid)
+        # Игрок может находиться только в одной комнате
+        await exit_room(player)
+        player.name = request.player_name
+
+        room = rooms.create(
+            name=request.name,
+            questions_count=request.questions_count,
+            context=request.context,
+            creator=player,
         )
+        room_id = room.id
+        if sampled("create_room"):
+            log_rooms.info("Комната {} '{}' создана игроком {}", room_id, request.name, request.player_name)
+        log_state_dump()
 
-        rooms[room_id] = room.model_dump()
-        print(rooms)
-        players[sid] = player.model_dump()
-        print(players)
-        
         # Входим в комнату Socket.IO
+        await sio.leave_room(sid, LOBBY_ROOM)
         await sio.enter_room(sid, room_id)
-        print(f"группы пользователя: {sio.rooms(sid)}")
-
-        await sio.save_session(
-            sid, {"room_id": room_id, "player_name": data["player_name"]}
-        )
 
         # Отправляем уведомление о создании комнаты
         system_message = {
             "sender": "Система",
-            "text": f"Комната '{data['name']}' создана игроком {data['player_name']}",
+            "text": f"Комната '{request.name}' создана игроком {request.player_name}",
             "timestamp": datetime.now().isoformat(),
         }
-        rooms[room_id]["messages"].append(system_message)
-        print(f"💬 Системное сообщение добавлено в историю: {system_message}")
-        
+        rooms.post(room, system_message)
+
         # Отправляем системное сообщение в комнату (теперь пользователь уже в комнате)
-        await sio.emit(
+        await outbox.send(
+            room_id,
             "new_message",
             system_message,
-            room=room_id,
         )
-        print(f"📤 Системное сообщение отправлено в комнату {room_id}")
 
-        await sio.emit("room_created", {"room": room.model_dump()}, to=sid)
-        await sio.emit(
-            "rooms_list",
-            {
-                "rooms": [
-                    {
-                        "id": r["id"],
-                        "name": r["name"],
-                        "context": r["context"],
-                        "players": r["players"],
-                        "created_at": r["created_at"],
-                    }
-                    for r in rooms.values()
-                ]
-            },
-        )
+        await sio.emit("room_created", room_handshake(room, player), to=sid)
+        await publish_lobby("room_added", room)
 
     except Exception as e:
         await sio.emit(
@@ -177,68 +534,80 @@ async def handle_create_room(sid, data):
 
 
 @sio.on("get_rooms")
-async def handle_get_rooms(sid, environ):
-    await sio.emit(
-        "rooms_list",
-        {
-            "rooms": [
-                {
-                    "id": r["id"],
-                    "name": r["name"],
-                    "context": r["context"],
-                    "players": r["players"],
-                    "created_at": r["created_at"],
-                }
-                for r in rooms.values()
-            ]
-        },
-        to=sid,
-    )
+@limiter.limit("get_rooms")
+@metrics.instrument("get_rooms")
+async def handle_get_rooms(sid, data=None):
+    # Клиент подписывается на дельты лобби
+    await sio.enter_room(sid, LOBBY_ROOM)
+
+    # Клиент со старой версией той же ленты получает только пропущенные изменения
+    data = data if isinstance(data, dict) else {}
+    version = data.get("version")
+    if data.get("cursor") is None and isinstance(version, int) and data.get("epoch") == lobby.epoch:
+        deltas = lobby.since(version)
+        if deltas is not None:
+            return await sio.emit(
+                "rooms_delta", {"version": lobby.version, "deltas": deltas}, to=sid
+            )
+
+    # Иначе — страница списка; некорректный запрос получает первую страницу без фильтров
+    try:
+        query = RoomsQuery(**data)
+    except ValidationError:
+        query = RoomsQuery()
+    await sio.emit("rooms_list", rooms_list_json(lobby.page(**query.model_dump())), to=sid)
 
 
 @sio.on("join_room")
+@limiter.limit("join_room")
+@metrics.instrument("join_room")
 async def handle_join_room(sid, data):
     try:
-        room = rooms.get(data["room_id"])
+        request = JoinRoomData(**data)
+        room = rooms.get(request.room_id)
         if not room:
+            # Комната другого воркера: клиент переподключается к нему
+            summary = lobby.get(request.room_id)
+            if summary is not None and summary["worker"] not in (None, WORKER_URL):
+                return await sio.emit(
+                    "join_redirect", {"room_id": request.room_id, "url": summary["worker"]}, to=sid
+                )
             return await sio.emit(
                 "join_error", {"message": "Комната не найдена"}, to=sid
             )
 
-        player = Player(sid=sid, name=data["player_name"], room_id=data["room_id"])
-        room["players"].append(player.model_dump())
-        players[sid]["name"] = data["player_name"]
-        players[sid]["room_id"] = data["room_id"]
+        player = players.get(sid) or players.connect(sid)
+        # Игрок может находиться только в одной комнате
+        if player.room_id is not None and player.room_id != room.id:
+            await exit_room(player)
+        player.name = request.player_name
+        replaces = rooms.join(room, player, request.token)
 
         # Входим в комнату Socket.IO
-        await sio.enter_room(sid, data["room_id"])
-
-        await sio.save_session(
-            sid, {"room_id": data["room_id"], "player_name": data["player_name"]}
-        )
+        await sio.leave_room(sid, LOBBY_ROOM)
+        await sio.enter_room(sid, room.id)
 
         # Отправляем уведомление о присоединении игрока
         system_message = {
             "sender": "Система",
-            "text": f"Игрок {data['player_name']} присоединился к комнате",
+            "text": f"Игрок {request.player_name} присоединился к комнате",
             "timestamp": datetime.now().isoformat(),
         }
-        room["messages"].append(system_message)
-        print(f"💬 Системное сообщение о присоединении добавлено в историю: {system_message}")
-        
+        rooms.post(room, system_message)
+        if sampled("join_room"):
+            log_rooms.info("Игрок {} присоединился к комнате {}", request.player_name, room.id)
+
         # Отправляем системное сообщение в комнату (теперь пользователь уже в комнате)
-        await sio.emit(
+        await outbox.send(
+            room.id,
             "new_message",
             system_message,
-            room=data["room_id"],
         )
-        print(f"📤 Системное сообщение о присоединении отправлено в комнату {data['room_id']}")
-
-        await sio.emit("update_players", {"players": room["players"]}, room=data["room_id"])
-        await sio.emit("room_joined", {"room": room}, to=sid)
 
-        # 👇 Отправляем историю сообщений новому игроку
-        await sio.emit("chat_history", {"messages": room["messages"]}, to=sid)
+        await send_player_joined(room, player, replaces)
+        await publish_lobby("room_changed", room)
+        # 👇 Новому игроку — комната, состав и последняя страница истории одним событием
+        await sio.emit("room_joined", room_handshake(room, player), to=sid)
 
     except Exception as e:
         await sio.emit(
@@ -248,118 +617,226 @@ async def handle_join_room(sid, data):
 
 # Чат
 @sio.on("send_message")
+@limiter.limit("send_message")
+@metrics.instrument("send_message")
 async def handle_send_message(sid, data):
-    print(f"📨 Получено сообщение от {sid}: {data}")
-    
-    session = await sio.get_session(sid)
-    print(f"📋 Сессия пользователя {sid}: {session}")
-    
-    if "room_id" not in session:
-        print(f"❌ У пользователя {sid} нет room_id в сессии")
+    # Комнату и имя берём из реестра: после выхода из комнаты сообщение никуда не уходит
+    room = rooms.room_of(sid)
+    if room is None:
+        log_chat.warning("Игрок {} не в комнате", sid)
         return
 
     message = {
-        "sender": session["player_name"],
+        "sender": players.get(sid).name,
         "text": data["text"],
         "timestamp": datetime.now().isoformat(),
     }
-    
-    print(f"💬 Создано сообщение: {message}")
 
     # 👇 сохраняем в истории комнаты
-    room_id = session["room_id"]
-    if room_id in rooms:
-        rooms[room_id]["messages"].append(message)
-        print(f"💾 Сообщение сохранено в истории комнаты {room_id}")
-        print(f"📚 Всего сообщений в комнате: {len(rooms[room_id]['messages'])}")
-    else:
-        print(f"❌ Комната {room_id} не найдена")
+    rooms.post(room, message)
+    if sampled("send_message"):
+        log_chat.debug("Сообщение {} от {} в комнате {}", message["id"], sid, room.id)
 
     # Отправляем сообщение в комнату
-    await sio.emit(
+    await outbox.send(
+        room.id,
         "new_message",
         message,
-        room=room_id,
     )
-    print(f"📤 Сообщение отправлено в комнату {room_id}")
+
+@sio.on("get_chat_history")
+@limiter.limit("get_chat_history")
+@metrics.instrument("get_chat_history")
+async def handle_get_chat_history(sid, data):
+    """ Отдаёт страницу сообщений старше курсора before (id сообщения) """
+    room = rooms.room_of(sid)
+    if room is None:
+        return
+
+    data = data if isinstance(data, dict) else {}
+    before = data.get("before")
+    limit = data.get("limit", CHAT_PAGE_SIZE)
+    if not isinstance(before, int):
+        before = None
+    if not isinstance(limit, int) or not 0 < limit <= CHAT_PAGE_SIZE:
+        limit = CHAT_PAGE_SIZE
+
+    await sio.emit("chat_history_page", history_page(room, before, limit, before=before), to=sid)
+
+@sio.on("get_players")
+@limiter.limit("get_players")
+@metrics.instrument("get_players")
+async def handle_get_players(sid, data=None):
+    """ Полный состав комнаты — для клиента, заметившего пропуск в версиях дельт """
+    room = rooms.room_of(sid)
+    if room is not None:
+        await sio.emit("update_players", room.roster(), to=sid)
 
 # Обработка выхода из комнаты
 @sio.on("leave_room")
+@limiter.limit("leave_room")
+@metrics.instrument("leave_room")
 async def handle_leave_room(sid, data):
     try:
-        room_id = data.get("room_id")
-        if room_id and room_id in rooms:
-            room = rooms[room_id]
-            player = players.get(sid, {})
-            player_name = player.get("name", "Неизвестный")
-            is_creator = False
-            
+        room = rooms.get(data.get("room_id"))
+        player = players.get(sid)
+        if room is not None and player is not None and player.sid in room.members:
+            player_name = player.name or "Неизвестный"
             # Проверяем, является ли игрок создателем комнаты
-            if room["players"] and room["players"][0]["sid"] == sid:
-                is_creator = True
-            
+            is_creator = room.creator_sid == sid
+
             # Удаляем игрока из комнаты
-            room["players"] = [
-                p for p in room["players"] if p["sid"] != sid
-            ]
-            
+            rooms.leave(player)
+            player.name = None
+
             # Если это создатель комнаты, удаляем всю комнату
             if is_creator:
                 # Уведомляем всех игроков о том, что лобби удалено
+                await outbox.flush(room.id)
                 await sio.emit(
                     "lobby_deleted",
                     {"message": "Создатель лобби покинул комнату. Лобби удалено."},
-                    room=room_id,
+                    room=room.id,
                 )
                 
                 # Удаляем комнату
-                del rooms[room_id]
+                rooms.remove(room.id)
+                stop_game(room.id)
+                await sio.close_room(room.id)
                 
                 # Обновляем общий список комнат
-                await sio.emit(
-                    "rooms_list",
-                    {
-                        "rooms": [
-                            {
-                                "id": r["id"],
-                                "name": r["name"],
-                                "context": r["context"],
-                                "players": r["players"],
-                                "created_at": r["created_at"],
-                            }
-                            for r in rooms.values()
-                        ]
-                    },
-                )
+                await publish_lobby("room_removed", room)
             else:
                 # Если это обычный игрок, отправляем уведомление о выходе
-                await sio.emit(
+                await outbox.send(
+                    room.id,
                     "new_message",
                     {
                         "sender": "Система",
                         "text": f"Игрок {player_name} покинул комнату",
                         "timestamp": datetime.now().isoformat(),
                     },
-                    room=room_id,
                 )
                 
-                # Обновляем список игроков для оставшихся
-                await sio.emit(
-                    "update_players",
-                    {"players": room["players"]},
-                    room=room_id,
-                )
-            
-            # Очищаем данные игрока
-            if sid in players:
-                players[sid]["room_id"] = None
-                players[sid]["name"] = None
+                # Оставшимся — дельта состава
+                await send_player_left(room, sid)
+                await publish_lobby("room_changed", room)
             
-            # Выходим из комнаты Socket.IO
-            await sio.leave_room(sid, room_id)
+                # Выходим из комнаты Socket.IO
+                await sio.leave_room(sid, room.id)
             
-    except Exception as e:
-        print(f"Ошибка при выходе из комнаты: {e}")
+    except Exception:
+        log_rooms.exception("Ошибка при выходе из комнаты")
+
+# Викторина
+def quiz_target(sid):
+    """ Комната игрока и число её участников; без комнаты игра идёт в комнате sid """
+    room = rooms.room_of(sid)
+    if room is None:
+        return sid, None, 1
+    return room.id, room, len(room.members)
+
+
+async def send_result(room_id: str, outcome: Dict):
+    """ Итог раунда уходит в комнату одним эмитом, победитель получает свой счёт """
+    winner = outcome["winner"]
+    player = players.get(winner) if winner else None
+    outcome["winner_name"] = player.name if player else None
+    # Очки в таблицах лидеров копятся по имени; игрок без имени в них не попадает
+    if player is not None and player.name:
+        for board_id in leaderboards.award(player.name, 1, room_id if room_id in rooms else None):
+            scheduler.call_later(LEADERBOARD_THROTTLE_MS / 1000, publish_leaderboard, board_id)
+    # Счёт приходит раньше итога, чтобы экран результата показал уже новое значение
+    if winner:
+        await sio.emit("score", {"value": outcome["scores"][winner]}, to=winner)
+    await sio.emit("result", outcome, room=room_id)
+
+
+async def publish_leaderboard(board_id: str):
+    """ Изменения первых мест, накопленные за окно LEADERBOARD_THROTTLE_MS, одной дельтой """
+    leaderboards.pending.discard(board_id)
+    board = leaderboards.get(board_id)
+    delta = board.delta(LEADERBOARD_TOP) if board is not None else None
+    if delta is None:
+        return
+    if board_id == GLOBAL:
+        await sio.emit("leaderboard_delta", delta, room=LEADERBOARD_ROOM)
+    else:
+        await outbox.send(board_id, "leaderboard_delta", delta)
+
+
+@sio.on("get_leaderboard")
+@limiter.limit("get_leaderboard")
+@metrics.instrument("get_leaderboard")
+async def handle_get_leaderboard(sid, data=None):
+    """ Первые места и место самого игрока; {"board": "room"} — таблица его комнаты """
+    data = data if isinstance(data, dict) else {}
+    player = players.get(sid)
+    room = rooms.room_of(sid)
+    if data.get("board") == "room":
+        if room is None:
+            return
+        board = leaderboards.board(room.id)
+    else:
+        # Изменения общей таблицы получают те, кто её запросил
+        await sio.enter_room(sid, LEADERBOARD_ROOM)
+        board = leaderboards.everyone
+    # Сначала рассылаем накопленные изменения: таблица и дальнейшие дельты начинаются с одной версии
+    await publish_leaderboard(board.board_id)
+    await sio.emit("leaderboard", board.table(player.name if player else None), to=sid)
+
+
+async def round_timeout(room_id: str, round_number: int):
+    game = games.get(room_id)
+    if game is None:
+        return
+    outcome = game.timeout(round_number)
+    if outcome is not None:
+        await send_result(room_id, outcome)
+
+
+@sio.on("next")
+@limiter.limit("next")
+@metrics.instrument("next")
+async def handle_next(sid, data=None):
+    room_id, room, _ = quiz_target(sid)
+    game = games.get(room_id)
+    if game is None:
+        count = room.questions_count if room else SOLO_QUESTIONS_COUNT
+        category = room.context if room else None
+        game = games[room_id] = QuizGame(room_id, riddle_bank.sample(category, count))
+    if game.state == ASKING:
+        return
+
+    riddle = game.next_riddle()
+    if riddle is None:
+        # Загадки закончились: итоги и сброс очков
+        stop_game(room_id)
+        await sio.emit("over", {"scores": game.scores}, room=room_id)
+        await sio.emit("score", {"value": 0}, room=room_id)
+        return
+
+    game.timer = scheduler.call_later(QUIZ_ROUND_SECONDS, round_timeout, room_id, game.round)
+    await sio.emit("riddle", riddle, room=room_id)
+
+
+@sio.on("answer")
+@limiter.limit("answer")
+@metrics.instrument("answer")
+async def handle_answer(sid, data):
+    room_id, _, players_count = quiz_target(sid)
+    game = games.get(room_id)
+    if game is None or not isinstance(data, dict):
+        return
+
+    outcome = game.answer(sid, data.get("text"), players_count)
+    if outcome is not None:
+        await send_result(room_id, outcome)
+
 
 if __name__ == '__main__':
-    uvicorn.run(socket_app, host='0.0.0.0', port=8001)
\ No newline at end of file
+    get_logger("transport").info(
+        "Профиль транспорта {}: {}, цикл {}, HTTP {}",
+        transport["profile"], ",".join(transport["transports"]), transport["loop"], transport["http"],
+    )
+    uvicorn.run(socket_app, **uvicorn_options(transport))
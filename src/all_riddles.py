@@ -21,12 +21,12 @@ riddles = [
     {
         "number": 4,
         "text": "На какое дерево садится ворона во время дождя?",
-        "answer": ["на мокрое", "мокрое", "промокшее", "влажное", "на влажное"],
+        "answer": ["мокрое", "промокшее", "влажное"],
     },
 
     {
         "number": 5,
         "text": "В каком месяце 28 дней?",
-        "answer": ["в любом", "любом", "каждом", "в каждом", "во всех"]
+        "answer": ["любом", "каждом", "всех"]
     },
 ]
@@ -0,0 +1,103 @@
+import re
+from typing import Dict, FrozenSet, Iterable
+
+# Предлоги, которые можно опустить в ответе: "на мокрое" == "мокрое"
+OPTIONAL_WORDS = frozenset({"в", "во", "на", "о", "об", "с", "со", "к", "ко", "у", "из", "по"})
+
+_PUNCTUATION = re.compile(r"[^\w\s]|_")
+
+
+def normalize(text: str) -> str:
+    """ Приводит ответ к каноническому виду для сравнения """
+    text = _PUNCTUATION.sub(" ", text.casefold().replace("ё", "е"))
+    words = [word for word in text.split() if word not in OPTIONAL_WORDS]
+    return " ".join(words)
+
+
+def max_distance(answer: str) -> int:
+    """ Допустимое число опечаток в зависимости от длины ответа """
+    if len(answer) <= 3:
+        return 0
+    if len(answer) <= 7:
+        return 1
+    return 2
+
+
+def within_distance(a: str, b: str, limit: int) -> bool:
+    """
+    Расстояние Левенштейна между a и b не больше limit.
+    Считается только полоса шириной 2 * limit + 1 вокруг диагонали,
+    расчёт прерывается, как только вся строка полосы превышает limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return False
+    if limit == 0:
+        return a == b
+    if len(a) > len(b):
+        a, b = b, a
+
+    overflow = limit + 1
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        low, high = max(1, i - limit), min(len(b), i + limit)
+        current = [overflow] * (len(b) + 1)
+        current[0] = i if i <= limit else overflow
+        char = a[i - 1]
+        best = current[0]
+        for j in range(low, high + 1):
+            cost = previous[j - 1] + (char != b[j - 1])
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            current[j] = cost
+            if cost < best:
+                best = cost
+        if best > limit:
+            return False
+        previous = current
+    return previous[len(b)] <= limit
+
+
+class AnswerIndex:
+    """
+    Индекс принятых ответов, собираемый один раз при загрузке загадок.
+
+    Точная проверка — поиск нормализованного ответа во множестве;
+    нечёткое сравнение выполняется, только если точной проверки не хватило.
+    """
+
+    def __init__(self, fuzzy: bool = True):
+        self.fuzzy = fuzzy
+        self._answers: Dict[int, FrozenSet[str]] = {}
+
+    @classmethod
+    def from_riddles(cls, riddles: Iterable[Dict], fuzzy: bool = True) -> "AnswerIndex":
+        index = cls(fuzzy=fuzzy)
+        for riddle in riddles:
+            index.add(riddle["number"], riddle["answer"])
+        return index
+
+    def add(self, number: int, answers: Iterable[str]):
+        normalized = {normalize(answer) for answer in answers}
+        normalized.discard("")
+        self._answers[number] = frozenset(normalized)
+
+    def answers(self, number: int) -> FrozenSet[str]:
+        return self._answers.get(number, frozenset())
+
+    def check(self, number: int, text: str) -> bool:
+        accepted = self._answers.get(number)
+        if not accepted or not isinstance(text, str):
+            return False
+        submitted = normalize(text)
+        if submitted in accepted:
+            return True
+        if not self.fuzzy or not submitted:
+            return False
+        return any(
+            within_distance(submitted, answer, max_distance(answer)) for answer in accepted
+        )
+
+    def __len__(self) -> int:
+        return len(self._answers)
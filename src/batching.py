@@ -0,0 +1,60 @@
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from src.scheduler import Scheduler, Timer
+
+
+class RoomOutbox:
+    """
+    Склейка исходящих событий комнаты в один пакет "batch".
+
+    Первое событие комнаты откладывает отправку на window секунд; всё, что
+    придёт за это время, уходит одним пакетом {"events": [[event, data], ...]}.
+    При max_events событий пакет отправляется сразу. window = 0 выключает склейку.
+    Таймеры окон обслуживает общий Scheduler.
+    """
+
+    def __init__(
+        self,
+        emit: Callable[..., Awaitable[Any]],
+        scheduler: Scheduler,
+        window: float = 0.0,
+        max_events: int = 32,
+    ):
+        self._emit = emit
+        self._scheduler = scheduler
+        self.window = window
+        self.max_events = max_events
+        self._pending: Dict[str, Tuple[List[list], Timer]] = {}
+
+    async def send(self, room_id: str, event: str, data: Any):
+        if self.window <= 0:
+            return await self._emit(event, data, room=room_id)
+
+        pending = self._pending.get(room_id)
+        if pending is None:
+            timer = self._scheduler.call_later(self.window, self.flush, room_id)
+            pending = self._pending[room_id] = ([], timer)
+        pending[0].append([event, data])
+        if len(pending[0]) >= self.max_events:
+            await self.flush(room_id)
+
+    async def flush(self, room_id: str):
+        pending = self._pending.pop(room_id, None)
+        if pending is None:
+            return
+        events, timer = pending
+        timer.cancel()
+        if len(events) == 1:
+            event, data = events[0]
+            await self._emit(event, data, room=room_id)
+        else:
+            await self._emit("batch", {"events": events}, room=room_id)
+
+    def drop(self, room_id: str):
+        """ Отбрасывает неотправленные события удалённой комнаты """
+        pending = self._pending.pop(room_id, None)
+        if pending is not None:
+            pending[1].cancel()
+
+    def __len__(self) -> int:
+        return len(self._pending)
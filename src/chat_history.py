@@ -0,0 +1,174 @@
+import json
+import os
+from array import array
+from bisect import bisect_left
+from collections import deque
+from time import monotonic
+from typing import Deque, Dict, List, Optional, Tuple
+
+from src.log import get_logger
+
+log = get_logger("chat_history")
+
+
+class ChatHistory:
+    """
+    Ограниченная история сообщений комнаты.
+
+    В памяти хранится кольцевой буфер из последних сообщений, ограниченный
+    по количеству и суммарному размеру. Вытесненные сообщения, если задан
+    spill_dir, дописываются в файл комнаты и читаются оттуда постранично.
+    Файл открывается только на время записи или чтения: тысячи комнат не
+    держат тысячи дескрипторов. Ошибка ввода-вывода не ломает чат — сброшенное
+    на диск отбрасывается, а история продолжается с того, что в памяти.
+    Каждое сообщение получает возрастающий id, который служит курсором.
+    expire удаляет сообщения старше заданного возраста вместе с файлом.
+    """
+
+    def __init__(
+        self,
+        name: str = "",
+        max_messages: int = 200,
+        max_bytes: int = 256 * 1024,
+        spill_dir: Optional[str] = None,
+    ):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        # (сообщение, его JSON, время добавления по monotonic)
+        self._buffer: Deque[Tuple[Dict, bytes, float]] = deque()
+        self._bytes = 0
+        self._next_id = 1
+
+        self._spill_path = os.path.join(spill_dir, f"{name}.jsonl") if spill_dir else None
+        # id первого сброшенного на диск сообщения, смещения строк в файле и его размер
+        self._spill_first_id = 0
+        self._spill_offsets = array("Q")
+        self._spill_size = 0
+
+    def append(self, message: Dict) -> Dict:
+        message["id"] = self._next_id
+        encoded = json.dumps(message, ensure_ascii=False, separators=(",", ":")).encode()
+        return self.restore(message, encoded)
+
+    def restore(self, message: Dict, encoded: bytes) -> Dict:
+        """ Добавляет сообщение с уже назначенным id и его JSON — при восстановлении из журнала """
+        self._next_id = message["id"] + 1
+        self._buffer.append((message, encoded, monotonic()))
+        self._bytes += len(encoded)
+
+        # Одно последнее сообщение остаётся в памяти даже сверх лимита байт
+        while len(self._buffer) > 1 and (
+            len(self._buffer) > self.max_messages or self._bytes > self.max_bytes
+        ):
+            evicted, evicted_encoded, _ = self._buffer.popleft()
+            self._bytes -= len(evicted_encoded)
+            self._spill(evicted["id"], evicted_encoded)
+        return message
+
+    def _spill(self, message_id: int, encoded: bytes):
+        if self._spill_path is None:
+            return
+        first = not self._spill_offsets
+        try:
+            if first:
+                os.makedirs(os.path.dirname(self._spill_path) or ".", exist_ok=True)
+            # Первое сообщение затирает файл, оставшийся от прошлого запуска
+            with open(self._spill_path, "wb" if first else "ab") as spill:
+                spill.write(encoded + b"\n")
+        except OSError as error:
+            log.warning("Не удалось сбросить сообщение {} на диск: {}", message_id, error)
+            self.close()
+            return
+        if first:
+            self._spill_first_id = message_id
+        self._spill_offsets.append(self._spill_size)
+        self._spill_size += len(encoded) + 1
+
+    def last_encoded(self) -> bytes:
+        """ JSON последнего добавленного сообщения """
+        return self._buffer[-1][1]
+
+    def latest(self, limit: int) -> List[Dict]:
+        """ Последние limit сообщений из памяти """
+        if limit <= 0:
+            return []
+        start = max(len(self._buffer) - limit, 0)
+        return [self._buffer[i][0] for i in range(start, len(self._buffer))]
+
+    def page(self, before: Optional[int], limit: int) -> Tuple[List[Dict], bool]:
+        """
+        Страница сообщений с id меньше before (или последние, если before не задан).
+        Возвращает сообщения по возрастанию id и признак наличия более старых.
+        """
+        return self._page(before, limit, encoded=False)
+
+    def page_encoded(self, before: Optional[int], limit: int) -> Tuple[List[bytes], bool]:
+        """ То же, что page, но сообщения в том виде, в каком хранятся: JSON в UTF-8 """
+        return self._page(before, limit, encoded=True)
+
+    def _page(self, before: Optional[int], limit: int, encoded: bool) -> Tuple[list, bool]:
+        column = 1 if encoded else 0
+        if before is None:
+            before = self._next_id
+        limit = max(limit, 0)
+
+        # Сначала берём сообщения из памяти
+        ids = [entry[0]["id"] for entry in self._buffer]
+        end = bisect_left(ids, before)
+        start = max(end - limit, 0)
+        result = [self._buffer[i][column] for i in range(start, end)]
+
+        # Недостающее дочитываем из файла
+        missing = limit - len(result)
+        spilled_end = min(before, ids[0] if ids else before) - self._spill_first_id
+        spilled_end = min(spilled_end, len(self._spill_offsets))
+        if missing > 0 and spilled_end > 0:
+            spilled_start = max(spilled_end - missing, 0)
+            lines = self._read_spilled(spilled_start, spilled_end)
+            result = (lines if encoded else [json.loads(line) for line in lines]) + result
+            has_more = spilled_start > 0
+        else:
+            has_more = start > 0 or spilled_end > 0
+        return result, has_more
+
+    def _read_spilled(self, start: int, end: int) -> List[bytes]:
+        stop = self._spill_offsets[end] if end < len(self._spill_offsets) else self._spill_size
+        try:
+            with open(self._spill_path, "rb") as spill:
+                spill.seek(self._spill_offsets[start])
+                data = spill.read(stop - self._spill_offsets[start])
+        except OSError as error:
+            log.warning("Не удалось прочитать сброшенные сообщения: {}", error)
+            return []
+        return data.splitlines()
+
+    def expire(self, max_age: float) -> int:
+        """ Удаляет сообщения старше max_age секунд (последнее остаётся); возвращает их число """
+        if not self._buffer:
+            return 0
+        deadline = monotonic() - max_age
+        removed = 0
+        while len(self._buffer) > 1 and self._buffer[0][2] < deadline:
+            _, encoded, _ = self._buffer.popleft()
+            self._bytes -= len(encoded)
+            removed += 1
+        # Сброшенное на диск старше всего, что в памяти
+        if self._spill_offsets and (removed or self._buffer[0][2] < deadline):
+            removed += len(self._spill_offsets)
+            self.close()
+        return removed
+
+    def close(self):
+        """ Удаляет файл со сброшенными сообщениями """
+        self._spill_offsets = array("Q")
+        self._spill_size = 0
+        if self._spill_path is not None:
+            try:
+                os.remove(self._spill_path)
+            except FileNotFoundError:
+                pass
+            except OSError as error:
+                log.warning("Не удалось удалить {}: {}", self._spill_path, error)
+
+    def __len__(self) -> int:
+        return len(self._buffer)
@@ -0,0 +1,330 @@
+"""
+Многопроцессный режим: общий список комнат и рассылка Socket.IO через внешний бэкенд.
+
+Комната живёт в воркере, который её создал (состав, чат, викторина). Остальные
+воркеры знают о ней по сводке из общего хранилища и отправляют желающих войти
+клиентов на её воркер (событие join_redirect с адресом). У каждого воркера свой
+адрес, поэтому все запросы сессии polling-транспорта попадают в один процесс
+и липкая балансировка не нужна.
+
+Изменения списка комнат идут через шину в едином порядке: каждый воркер, включая
+автора изменения, применяет их к своей копии LobbyFeed, когда они вернулись из шины,
+и сам рассылает их своим подписчикам лобби.
+
+Эмиты Socket.IO через шину не ходят: у комнаты и всех её сокетов один воркер,
+а у каждого воркера своя таблица лидеров, так что адресатов в других процессах
+ни у одного эмита нет. Поэтому менеджер клиентов Socket.IO — обычный, в памяти
+процесса. Событие, которому понадобятся клиенты другого воркера, нужно будет
+передать через publish явно.
+
+Настройка через переменные окружения:
+    CLUSTER_URL  — пусто: один процесс, всё в памяти;
+                   redis://host:6379/0: Redis (нужен пакет redis);
+                   unix:///tmp/alko.sock: локальный брокер из этого модуля
+    WORKER_ID    — номер воркера, входит в id комнат
+    WORKER_URL   — внешний адрес воркера для перенаправления клиентов
+
+Запуск брокера и N воркеров: python -m src.cluster --workers 4 --port 8000
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import pickle
+import signal
+import struct
+import subprocess
+import sys
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from src.log import get_logger
+
+try:
+    from redis import asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+log = get_logger("cluster")
+
+# Длина кадра брокера: 4 байта перед pickle-телом
+FRAME = struct.Struct("!I")
+
+OnMessage = Callable[[Dict], Awaitable[Any]]
+
+
+class LocalBackend:
+    """
+    Один процесс: шина — прямой вызов, хранилище не нужно.
+    Единственная копия списка комнат — сам LobbyFeed.
+    """
+
+    async def start(self, on_message: OnMessage):
+        self._on_message = on_message
+
+    async def close(self):
+        pass
+
+    async def publish(self, message: Dict):
+        await self._on_message(message)
+
+    async def put_room(self, summary: Dict):
+        pass
+
+    async def remove_room(self, room_id: str):
+        pass
+
+    async def rooms(self) -> List[Dict]:
+        return []
+
+
+async def _consume(messages, on_message: OnMessage):
+    """ Применяет сообщения шины по одному, в порядке поступления """
+    async for message in messages:
+        try:
+            await on_message(message)
+        except Exception:
+            log.exception("Ошибка при обработке сообщения шины")
+
+
+# Локальный брокер
+
+async def read_frame(reader: asyncio.StreamReader):
+    header = await reader.readexactly(FRAME.size)
+    return pickle.loads(await reader.readexactly(FRAME.unpack(header)[0]))
+
+
+def write_frame(writer: asyncio.StreamWriter, frame: tuple):
+    body = pickle.dumps(frame, protocol=pickle.HIGHEST_PROTOCOL)
+    writer.write(FRAME.pack(len(body)) + body)
+
+
+class Broker:
+    """
+    Pub/sub и хеши в памяти одного процесса за Unix-сокетом — замена Redis
+    для запуска на одной машине и тестов. Кадры:
+    ("sub", канал, id запроса) -> ("reply", id запроса, None), ("pub", канал, данные), ("hset", ключ, поле, значение), ("hdel", ключ, поле),
+    ("hvals", ключ, id запроса) -> ("reply", id запроса, значения).
+    Сокет доступен только владельцу: кадры — pickle.
+    """
+
+    def __init__(self):
+        self._channels: Dict[str, Set[asyncio.StreamWriter]] = {}
+        self._hashes: Dict[str, Dict[str, Any]] = {}
+
+    async def serve(self, path: str) -> asyncio.AbstractServer:
+        if os.path.exists(path):
+            os.unlink(path)
+        server = await asyncio.start_unix_server(self._handle, path)
+        os.chmod(path, 0o600)
+        return server
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                op, *args = await read_frame(reader)
+                if op == "pub":
+                    channel, data = args
+                    for subscriber in self._channels.get(channel, ()):
+                        write_frame(subscriber, ("msg", channel, data))
+                elif op == "sub":
+                    channel, request_id = args
+                    self._channels.setdefault(channel, set()).add(writer)
+                    write_frame(writer, ("reply", request_id, None))
+                elif op == "hset":
+                    key, field, value = args
+                    self._hashes.setdefault(key, {})[field] = value
+                elif op == "hdel":
+                    key, field = args
+                    self._hashes.get(key, {}).pop(field, None)
+                elif op == "hvals":
+                    key, request_id = args
+                    write_frame(writer, ("reply", request_id, list(self._hashes.get(key, {}).values())))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for subscribers in self._channels.values():
+                subscribers.discard(writer)
+            writer.close()
+
+
+class BrokerClient:
+    """ Соединение с Broker; подключается при первом обращении """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.messages: asyncio.Queue = asyncio.Queue()
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._replies: Dict[int, asyncio.Future] = {}
+        self._request_ids = itertools.count()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def send(self, *frame):
+        async with self._lock:
+            if self._writer is None:
+                reader, self._writer = await asyncio.open_unix_connection(self.path)
+                self._task = asyncio.create_task(self._read(reader))
+        write_frame(self._writer, frame)
+
+    async def request(self, op: str, *args):
+        request_id = next(self._request_ids)
+        future = self._replies[request_id] = asyncio.get_running_loop().create_future()
+        await self.send(op, *args, request_id)
+        return await future
+
+    async def listen(self):
+        while True:
+            yield await self.messages.get()
+
+    async def _read(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                kind, key, data = await read_frame(reader)
+                if kind == "msg":
+                    self.messages.put_nowait(data)
+                elif kind == "reply":
+                    future = self._replies.pop(key, None)
+                    if future is not None and not future.done():
+                        future.set_result(data)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            log.error("Соединение с брокером {} закрыто", self.path)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class BrokerBackend(LocalBackend):
+    def __init__(self, path: str, prefix: str = "alko"):
+        self.path = path
+        self.channel = f"{prefix}:lobby"
+        self.key = f"{prefix}:rooms"
+        self.client = BrokerClient(path)
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, on_message: OnMessage):
+        await self.client.request("sub", self.channel)
+        self._task = asyncio.create_task(_consume(self.client.listen(), on_message))
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        await self.client.close()
+
+    async def publish(self, message: Dict):
+        await self.client.send("pub", self.channel, message)
+
+    async def put_room(self, summary: Dict):
+        await self.client.send("hset", self.key, summary["id"], summary)
+
+    async def remove_room(self, room_id: str):
+        await self.client.send("hdel", self.key, room_id)
+
+    async def rooms(self) -> List[Dict]:
+        return await self.client.request("hvals", self.key)
+
+
+class RedisBackend(LocalBackend):
+    def __init__(self, url: str, prefix: str = "alko"):
+        if aioredis is None:
+            raise RuntimeError("Для CLUSTER_URL=redis://... нужен пакет redis (pip install redis)")
+        self.url = url
+        self.channel = f"{prefix}:lobby"
+        self.key = f"{prefix}:rooms"
+        self.redis = aioredis.Redis.from_url(url)
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, on_message: OnMessage):
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(self.channel)
+
+        async def messages():
+            async for message in pubsub.listen():
+                yield json.loads(message["data"])
+
+        self._task = asyncio.create_task(_consume(messages(), on_message))
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        await self.redis.aclose()
+
+    async def publish(self, message: Dict):
+        await self.redis.publish(self.channel, json.dumps(message, ensure_ascii=False))
+
+    async def put_room(self, summary: Dict):
+        await self.redis.hset(self.key, summary["id"], json.dumps(summary, ensure_ascii=False))
+
+    async def remove_room(self, room_id: str):
+        await self.redis.hdel(self.key, room_id)
+
+    async def rooms(self) -> List[Dict]:
+        return [json.loads(value) for value in await self.redis.hvals(self.key)]
+
+
+def backend_from_url(url: str) -> LocalBackend:
+    if not url:
+        return LocalBackend()
+    if url.startswith(("redis://", "rediss://")):
+        return RedisBackend(url)
+    if url.startswith("unix://"):
+        return BrokerBackend(url[len("unix://"):])
+    raise ValueError(f"Неизвестный CLUSTER_URL: {url}")
+
+
+# Запуск брокера и воркеров
+
+def worker_env(number: int, socket_path: str, public_host: str, port: int) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update(
+        CLUSTER_URL=f"unix://{socket_path}",
+        WORKER_ID=str(number),
+        WORKER_URL=f"http://{public_host}:{port}",
+    )
+    return env
+
+
+async def run_cluster(workers: int, host: str, port: int, public_host: str, socket_path: str):
+    broker = await Broker().serve(socket_path)
+    processes = [
+        subprocess.Popen(
+            # Через main.py, чтобы воркеры запускались с настройками транспорта (см. src/transport.py)
+            [sys.executable, "main.py", "--host", host, "--port", str(port + number)],
+            env=worker_env(number, socket_path, public_host, port + number),
+        )
+        for number in range(workers)
+    ]
+    log.info("Брокер {}, воркеры на портах {}-{}", socket_path, port, port + workers - 1)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        while not stop.is_set() and all(process.poll() is None for process in processes):
+            try:
+                await asyncio.wait_for(stop.wait(), 1.0)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+        broker.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000, help="порт первого воркера")
+    parser.add_argument("--public-host", default="127.0.0.1", help="хост в адресах перенаправления")
+    parser.add_argument("--socket", default="/tmp/alko-broker.sock", help="Unix-сокет брокера")
+    args = parser.parse_args()
+
+    asyncio.run(run_cluster(args.workers, args.host, args.port, args.public_host, args.socket))
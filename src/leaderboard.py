@@ -0,0 +1,284 @@
+"""
+Таблицы лидеров: общая по всем комнатам и своя у каждой комнаты.
+
+Игрок в таблице — это имя: sid меняется при каждом подключении, а очки
+должны переживать переподключения и смену комнат. Очки хранятся в
+RankIndex — отсортированном списке, разбитом на блоки; дерево Фенвика по
+длинам блоков даёт место игрока, а вставка и удаление трогают один
+небольшой блок. Так изменение очков и запрос места остаются
+логарифмическими и при сотнях тысяч игроков.
+
+При равных очках выше тот, кто набрал их раньше.
+
+Клиентам уходит не вся таблица, а изменения её первых top_k мест (delta),
+не чаще раза в LEADERBOARD_THROTTLE_MS на таблицу. Версия дельты растёт
+на единицу: клиент, заметивший пропуск, запрашивает таблицу целиком.
+
+Настройка через переменные окружения:
+    LEADERBOARD_TOP             — сколько первых мест видят клиенты
+    LEADERBOARD_THROTTLE_MS     — не чаще скольких мс рассылать изменения одной таблицы
+"""
+from bisect import bisect_left, insort
+from itertools import count, islice
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# Идентификатор общей таблицы; у таблиц комнат — id комнаты
+GLOBAL = "global"
+
+# Socket.IO-комната клиентов, получающих изменения общей таблицы
+LEADERBOARD_ROOM = "leaderboard"
+
+# Ключ сортировки: (-очки, порядковый номер изменения, имя)
+RankKey = Tuple[int, int, str]
+
+
+class RankIndex:
+    """ Отсортированные ключи блоками по load штук с подсчётом места за O(log n) """
+
+    def __init__(self, load: int = 512):
+        self._load = load
+        self._blocks: List[List[RankKey]] = []
+        self._maxes: List[RankKey] = []
+        # Дерево Фенвика по длинам блоков, индексы с единицы
+        self._tree: List[int] = [0]
+        self._len = 0
+
+    def _rebuild(self):
+        """ Дерево Фенвика заново — только когда блоки делятся или исчезают """
+        tree = [0] + [len(block) for block in self._blocks]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _grow(self, block: int, delta: int):
+        i = block + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _before(self, block: int) -> int:
+        """ Число ключей в блоках до block """
+        total, i = 0, block
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def add(self, key: RankKey):
+        self._len += 1
+        if not self._blocks:
+            self._blocks.append([key])
+            self._maxes.append(key)
+            self._rebuild()
+            return
+
+        i = min(bisect_left(self._maxes, key), len(self._blocks) - 1)
+        block = self._blocks[i]
+        insort(block, key)
+        self._maxes[i] = block[-1]
+        if len(block) > 2 * self._load:
+            # Большой блок делится пополам: вставка остаётся дешёвой
+            self._blocks.insert(i + 1, block[self._load:])
+            del block[self._load:]
+            self._maxes[i] = block[-1]
+            self._maxes.insert(i + 1, self._blocks[i + 1][-1])
+            self._rebuild()
+        else:
+            self._grow(i, 1)
+
+    def remove(self, key: RankKey):
+        i = bisect_left(self._maxes, key)
+        block = self._blocks[i]
+        del block[bisect_left(block, key)]
+        self._len -= 1
+        if block:
+            self._maxes[i] = block[-1]
+            self._grow(i, -1)
+        else:
+            del self._blocks[i]
+            del self._maxes[i]
+            self._rebuild()
+
+    def rank(self, key: RankKey) -> int:
+        """ Место ключа, считая с нуля """
+        i = bisect_left(self._maxes, key)
+        if i == len(self._blocks):
+            return self._len
+        return self._before(i) + bisect_left(self._blocks[i], key)
+
+    def slice(self, start: int, stop: int) -> Iterator[RankKey]:
+        """ Ключи с местами в [start, stop) """
+        if start >= stop:
+            return
+        # Спуск по дереву Фенвика до блока, в котором лежит start
+        block, position, step = 0, start, 1 << (len(self._tree).bit_length())
+        while step:
+            i = block + step
+            if i < len(self._tree) and self._tree[i] <= position:
+                block = i
+                position -= self._tree[i]
+            step >>= 1
+        keys = self._iter_from(block, position)
+        yield from islice(keys, stop - start)
+
+    def _iter_from(self, block: int, position: int) -> Iterator[RankKey]:
+        for i in range(block, len(self._blocks)):
+            yield from self._blocks[i][position:]
+            position = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[RankKey]:
+        return self._iter_from(0, 0)
+
+
+class Leaderboard:
+    """ Очки игроков одной таблицы; rank и top отдают места начиная с 1 """
+
+    def __init__(self, board_id: str, load: int = 512):
+        self.board_id = board_id
+        self.version = 0
+        self._keys: Dict[str, RankKey] = {}
+        self._index = RankIndex(load)
+        self._order = count()
+        # Первые места, которые видели клиенты при последней рассылке
+        self._published: List[Tuple[str, int]] = []
+
+    def add(self, name: str, points: int) -> int:
+        """ Прибавляет очки и возвращает новый итог игрока """
+        total = self.score(name) + points
+        self.set(name, total)
+        return total
+
+    def set(self, name: str, score: int):
+        key = self._keys.get(name)
+        if key is not None:
+            self._index.remove(key)
+        key = self._keys[name] = (-score, next(self._order), name)
+        self._index.add(key)
+
+    def score(self, name: str) -> int:
+        key = self._keys.get(name)
+        return -key[0] if key is not None else 0
+
+    def rank(self, name: str) -> Optional[int]:
+        key = self._keys.get(name)
+        return self._index.rank(key) + 1 if key is not None else None
+
+    def top(self, limit: int, start: int = 0) -> List[Dict]:
+        return [
+            {"rank": rank, "name": key[2], "score": -key[0]}
+            for rank, key in enumerate(self._index.slice(start, start + limit), start + 1)
+        ]
+
+    def entries(self) -> Iterable[Tuple[str, int]]:
+        """ Все игроки от первого места к последнему """
+        return ((key[2], -key[0]) for key in self._index)
+
+    def table(self, name: Optional[str] = None) -> Dict:
+        """
+        Первые места на момент последней дельты и место игрока name — для первой
+        загрузки. Дальше клиент применяет дельты с версиями после этой.
+        """
+        return {
+            "board": self.board_id,
+            "version": self.version,
+            "size": len(self),
+            "top": [
+                {"rank": rank, "name": player, "score": score}
+                for rank, (player, score) in enumerate(self._published, 1)
+            ],
+            "me": {"rank": self.rank(name), "score": self.score(name)} if name in self._keys else None,
+        }
+
+    def delta(self, limit: int) -> Optional[Dict]:
+        """
+        Изменения первых limit мест с прошлого вызова: новые места и очки
+        и вышедшие из них игроки. None — первые места не изменились.
+        """
+        current = [(entry["name"], entry["score"]) for entry in self.top(limit)]
+        if current == self._published:
+            return None
+        previous = dict(enumerate(self._published, 1))
+        changes = [
+            {"rank": rank, "name": name, "score": score}
+            for rank, (name, score) in enumerate(current, 1)
+            if previous.get(rank) != (name, score)
+        ]
+        staying = {name for name, _ in current}
+        removed = [name for name, _ in self._published if name not in staying]
+        self._published = current
+        self.version += 1
+        return {
+            "board": self.board_id,
+            "version": self.version,
+            "size": len(self),
+            "changes": changes,
+            "removed": removed,
+        }
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+class Leaderboards:
+    """
+    Общая таблица и таблицы комнат.
+
+    Таблица комнаты живёт, пока есть комната; таблицы удалённых комнат
+    убирает фоновая уборка. Если задан journal (см. src/persistence.py),
+    каждое изменение очков передаётся ему. pending — таблицы, изменения
+    которых ещё не разосланы.
+    """
+
+    def __init__(self, load: int = 512):
+        self._load = load
+        self.journal = None
+        self._boards: Dict[str, Leaderboard] = {GLOBAL: Leaderboard(GLOBAL, load)}
+        self.pending: Set[str] = set()
+
+    @property
+    def everyone(self) -> Leaderboard:
+        return self._boards[GLOBAL]
+
+    def get(self, board_id: str) -> Optional[Leaderboard]:
+        return self._boards.get(board_id)
+
+    def board(self, board_id: str) -> Leaderboard:
+        board = self._boards.get(board_id)
+        if board is None:
+            board = self._boards[board_id] = Leaderboard(board_id, self._load)
+        return board
+
+    def award(self, name: str, points: int, room_id: Optional[str] = None) -> List[str]:
+        """ Начисляет очки в общей таблице и таблице комнаты; возвращает таблицы, ставшие pending """
+        touched = []
+        for board_id in (GLOBAL, room_id) if room_id is not None else (GLOBAL,):
+            total = self.board(board_id).add(name, points)
+            if self.journal is not None:
+                self.journal.scored(board_id, name, total)
+            if board_id not in self.pending:
+                self.pending.add(board_id)
+                touched.append(board_id)
+        return touched
+
+    def restore(self, board_id: str, name: str, score: int):
+        self.board(board_id).set(name, score)
+
+    def drop(self, board_id: str) -> Optional[Leaderboard]:
+        if board_id == GLOBAL:
+            return None
+        self.pending.discard(board_id)
+        return self._boards.pop(board_id, None)
+
+    def rooms(self) -> List[str]:
+        return [board_id for board_id in self._boards if board_id != GLOBAL]
+
+    def __iter__(self) -> Iterator[Leaderboard]:
+        return iter(self._boards.values())
@@ -0,0 +1,184 @@
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from secrets import token_hex
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+from src.registry import RoomRecord
+
+
+# Имя Socket.IO-комнаты, в которую попадают клиенты, смотрящие список комнат
+LOBBY_ROOM = "lobby"
+
+# Ключ сортировки комнаты в индексах: (название в нижнем регистре, id)
+IndexKey = Tuple[str, str]
+
+
+def room_summary(room: RoomRecord, worker: Optional[str] = None) -> Dict:
+    """ Краткое описание комнаты для списка в лобби; worker — адрес её процесса """
+    return {
+        "id": room.id,
+        "name": room.name,
+        "context": room.context,
+        "player_count": len(room.members),
+        "created_at": room.created_at,
+        "worker": worker,
+    }
+
+
+class LobbyFeed:
+    """
+    Версионированная лента изменений списка комнат.
+
+    Каждое изменение увеличивает версию и сохраняется в ограниченном журнале дельт,
+    чтобы переподключившийся клиент мог догнать состояние без полного списка.
+    Версии имеют смысл только внутри одной ленты, поэтому клиент присылает
+    их вместе с epoch — случайной меткой ленты.
+
+    Список отдаётся страницами (page) по отсортированному индексу названий;
+    у каждой тематики свой такой же индекс. Индексы обновляются при каждом
+    изменении, страницы кешируются до следующего изменения.
+    """
+
+    def __init__(self, max_deltas: int = 1024, max_scan: int = 2000, max_cached_pages: int = 128):
+        self.epoch = token_hex(4)
+        self.version = 0
+        self.max_scan = max_scan
+        self.max_cached_pages = max_cached_pages
+        self._rooms: Dict[str, Dict] = {}
+        self._deltas: Deque[Tuple[int, Dict]] = deque(maxlen=max_deltas)
+        self._index: List[IndexKey] = []
+        self._by_context: Dict[str, List[IndexKey]] = {}
+        self._pages: Dict[tuple, Dict] = {}
+
+    def _push(self, delta: Dict) -> Dict:
+        self.version += 1
+        delta["version"] = self.version
+        self._deltas.append((self.version, delta))
+        self._pages.clear()
+        return delta
+
+    @staticmethod
+    def _key(summary: Dict) -> IndexKey:
+        return summary["name"].casefold(), summary["id"]
+
+    def _index_add(self, summary: Dict):
+        key = self._key(summary)
+        insort(self._index, key)
+        insort(self._by_context.setdefault(summary["context"], []), key)
+
+    def _index_remove(self, summary: Dict):
+        key = self._key(summary)
+        _discard(self._index, key)
+        bucket = self._by_context.get(summary["context"])
+        if bucket is not None:
+            _discard(bucket, key)
+            if not bucket:
+                del self._by_context[summary["context"]]
+
+    def apply(self, change: Dict) -> Optional[Dict]:
+        """
+        Применяет изменение {"type": ..., "room": сводка} или {"type": "room_removed", "room_id": ...}.
+        Возвращает дельту с новой версией либо None, если список не изменился.
+        """
+        if change["type"] == "room_removed":
+            previous = self._rooms.pop(change["room_id"], None)
+            if previous is None:
+                return None
+            self._index_remove(previous)
+        else:
+            summary = change["room"]
+            previous = self._rooms.get(summary["id"])
+            if change["type"] == "room_changed" and previous is None:
+                return None
+            self._rooms[summary["id"]] = summary
+            if previous is None:
+                self._index_add(summary)
+            elif self._key(previous) != self._key(summary) or previous["context"] != summary["context"]:
+                self._index_remove(previous)
+                self._index_add(summary)
+        return self._push(dict(change))
+
+    def room_added(self, room: RoomRecord) -> Dict:
+        return self.apply({"type": "room_added", "room": room_summary(room)})
+
+    def room_changed(self, room: RoomRecord) -> Optional[Dict]:
+        return self.apply({"type": "room_changed", "room": room_summary(room)})
+
+    def room_removed(self, room_id: str) -> Optional[Dict]:
+        return self.apply({"type": "room_removed", "room_id": room_id})
+
+    def get(self, room_id: str) -> Optional[Dict]:
+        return self._rooms.get(room_id)
+
+    def page(
+        self,
+        context: Optional[str] = None,
+        prefix: str = "",
+        min_players: int = 0,
+        max_players: Optional[int] = None,
+        cursor: Optional[Sequence[str]] = None,
+        limit: int = 50,
+    ) -> Dict:
+        """
+        Страница комнат по названию: с тематикой context, началом названия prefix
+        и числом игроков в пределах [min_players, max_players]. cursor — ключ
+        последней комнаты предыдущей страницы; в ответе cursor равен None, если
+        страница последняя. За вызов просматривается не больше max_scan комнат,
+        поэтому при редком фильтре страница может быть короче limit.
+        """
+        query = (context, prefix, min_players, max_players, tuple(cursor) if cursor else None, limit)
+        cached = self._pages.get(query)
+        if cached is not None:
+            return cached
+
+        index = self._index if context is None else self._by_context.get(context, [])
+        prefix = prefix.casefold()
+        if cursor:
+            position = bisect_right(index, tuple(cursor))
+        else:
+            position = bisect_left(index, (prefix, ""))
+
+        rooms, last, scanned = [], None, 0
+        while position < len(index) and len(rooms) < limit and scanned < self.max_scan:
+            key = last = index[position]
+            if not key[0].startswith(prefix):
+                last = None
+                break
+            summary = self._rooms[key[1]]
+            if summary["player_count"] >= min_players and (
+                max_players is None or summary["player_count"] <= max_players
+            ):
+                rooms.append(summary)
+            position += 1
+            scanned += 1
+
+        more = last is not None and position < len(index) and index[position][0].startswith(prefix)
+        page = {
+            "epoch": self.epoch,
+            "version": self.version,
+            "rooms": rooms,
+            "cursor": list(last) if more else None,
+        }
+        if len(self._pages) >= self.max_cached_pages:
+            self._pages.clear()
+        self._pages[query] = page
+        return page
+
+    def since(self, version: int) -> Optional[List[Dict]]:
+        """
+        Дельты, пропущенные клиентом с версией `version`.
+        Возвращает None, если журнал уже не покрывает этот промежуток.
+        """
+        if version > self.version or version < 0:
+            return None
+        if version == self.version:
+            return []
+        if not self._deltas or self._deltas[0][0] > version + 1:
+            return None
+        return [delta for v, delta in self._deltas if v > version]
+
+
+def _discard(index: List[IndexKey], key: IndexKey):
+    position = bisect_left(index, key)
+    if position < len(index) and index[position] == key:
+        del index[position]
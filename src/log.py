@@ -0,0 +1,68 @@
+"""
+Структурное логирование через loguru с фоновым приёмником.
+
+Записи ставятся в очередь (enqueue=True), а форматирование и вывод выполняет
+отдельный поток, поэтому обработчики событий не блокируются на stdout.
+
+Настройка через переменные окружения:
+    LOG_LEVEL         — минимальный уровень (по умолчанию INFO)
+    LOG_JSON          — 1, чтобы писать записи в JSON
+    LOG_SAMPLE        — выборка по событиям, например "send_message=100,join_room=10":
+                        логируется каждое N-е событие
+    LOG_STATE_DUMPS   — 1, чтобы выводить полные дампы комнат и игроков на уровне DEBUG
+"""
+import os
+import sys
+from typing import Dict
+
+from loguru import logger
+
+LOG_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | "
+    "{extra[event]: <14} | <level>{message}</level>"
+)
+
+
+def parse_sample_rates(value: str) -> Dict[str, int]:
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        event, _, rate = item.partition("=")
+        rates[event.strip()] = max(int(rate or 1), 1)
+    return rates
+
+
+class EventSampler:
+    """ Пропускает каждое N-е событие данного типа; без настройки — все события """
+
+    __slots__ = ("rates", "_counters")
+
+    def __init__(self, rates: Dict[str, int]):
+        self.rates = rates
+        self._counters: Dict[str, int] = {}
+
+    def __call__(self, event: str) -> bool:
+        rate = self.rates.get(event)
+        if rate is None or rate == 1:
+            return True
+        count = self._counters.get(event, 0)
+        self._counters[event] = (count + 1) % rate
+        return count == 0
+
+
+LOG_STATE_DUMPS = os.getenv("LOG_STATE_DUMPS") == "1"
+sampled = EventSampler(parse_sample_rates(os.getenv("LOG_SAMPLE", "")))
+
+
+def setup_logging(level: str = None, serialize: bool = None):
+    """ Заменяет приёмник по умолчанию на фоновый с заданным уровнем """
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    serialize = os.getenv("LOG_JSON") == "1" if serialize is None else serialize
+
+    logger.remove()
+    logger.configure(extra={"event": "-"})
+    logger.add(sys.stderr, level=level, format=LOG_FORMAT, serialize=serialize, enqueue=True)
+
+
+def get_logger(event: str):
+    """ Логгер с привязанным именем события """
+    return logger.bind(event=event)
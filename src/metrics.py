@@ -0,0 +1,175 @@
+"""
+Метрики обработчиков Socket.IO в текстовом формате Prometheus.
+
+Счётчики и гистограммы создаются заранее (при регистрации обработчика),
+наблюдение — это bisect по границам корзин и пара сложений, без выделения
+памяти на вызов. Gauge-метрики вычисляются функциями в момент выгрузки.
+"""
+from bisect import bisect_left
+from functools import wraps
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from socketio import packet
+
+# Границы корзин задержки обработчиков, секунды
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float] = LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class HandlerStats:
+    __slots__ = ("calls", "errors", "latency")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latency = Histogram()
+
+
+def _size(part) -> int:
+    """ Размер части пакета в байтах; ASCII-строку не нужно кодировать """
+    if isinstance(part, str) and not part.isascii():
+        return len(part.encode())
+    return len(part)
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+class Metrics:
+    def __init__(self, prefix: str = "alko"):
+        self.prefix = prefix
+        self.handlers: Dict[str, HandlerStats] = {}
+        self.emits: Dict[str, List[int]] = {}
+        self.gauges: Dict[str, Tuple[str, Callable[[], float]]] = {}
+        self.counters: Dict[str, Tuple[str, Callable, Optional[str]]] = {}
+        self.loop_lag = Histogram(LATENCY_BUCKETS)
+
+    def instrument(self, event: str):
+        """ Декоратор обработчика: число вызовов, ошибок и гистограмма задержки """
+        stats = self.handlers.setdefault(event, HandlerStats())
+
+        def decorator(handler):
+            @wraps(handler)
+            async def wrapper(*args):
+                stats.calls += 1
+                started = perf_counter()
+                try:
+                    return await handler(*args)
+                except Exception:
+                    stats.errors += 1
+                    raise
+                finally:
+                    stats.latency.observe(perf_counter() - started)
+            return wrapper
+        return decorator
+
+    def emitted(self, event: str, size: int):
+        counters = self.emits.get(event)
+        if counters is None:
+            counters = self.emits[event] = [0, 0]
+        counters[0] += 1
+        counters[1] += size
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], float]):
+        self.gauges[name] = (help_text, read)
+
+    def counter(
+        self, name: str, help_text: str,
+        read: Callable[[], Union[float, Dict[str, float]]], label: Optional[str] = None,
+    ):
+        """ Счётчик, который ведёт сам компонент; с label read() возвращает словарь значение метки -> число """
+        self.counters[name] = (help_text, read, label)
+
+    def packet_class(self, base=packet.Packet):
+        """ Класс пакета Socket.IO, который считает исходящие события и их размер """
+        metrics = self
+
+        class CountingPacket(base):
+            def encode(self):
+                encoded = super().encode()
+                if self.packet_type == packet.EVENT and self.data:
+                    parts = encoded if isinstance(encoded, list) else (encoded,)
+                    metrics.emitted(self.data[0], sum(map(_size, parts)))
+                return encoded
+
+        return CountingPacket
+
+    def render(self) -> str:
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_handler_calls_total Вызовы обработчиков событий",
+            f"# TYPE {p}_handler_calls_total counter",
+        ]
+        lines += [f"{p}_handler_calls_total{_labels(event=e)} {s.calls}" for e, s in self.handlers.items()]
+        lines += [
+            f"# HELP {p}_handler_errors_total Необработанные исключения в обработчиках",
+            f"# TYPE {p}_handler_errors_total counter",
+        ]
+        lines += [f"{p}_handler_errors_total{_labels(event=e)} {s.errors}" for e, s in self.handlers.items()]
+        lines += [
+            f"# HELP {p}_handler_seconds Время выполнения обработчиков",
+            f"# TYPE {p}_handler_seconds histogram",
+        ]
+        for event, stats in self.handlers.items():
+            lines += self._histogram(f"{p}_handler_seconds", stats.latency, event=event)
+
+        lines += [
+            f"# HELP {p}_emits_total Исходящие события (по одному на emit)",
+            f"# TYPE {p}_emits_total counter",
+        ]
+        lines += [f"{p}_emits_total{_labels(event=e)} {c[0]}" for e, c in self.emits.items()]
+        lines += [
+            f"# HELP {p}_emit_bytes_total Размер закодированных исходящих событий",
+            f"# TYPE {p}_emit_bytes_total counter",
+        ]
+        lines += [f"{p}_emit_bytes_total{_labels(event=e)} {c[1]}" for e, c in self.emits.items()]
+
+        lines += [
+            f"# HELP {p}_event_loop_lag_seconds Задержка срабатывания таймера цикла событий",
+            f"# TYPE {p}_event_loop_lag_seconds histogram",
+        ]
+        lines += self._histogram(f"{p}_event_loop_lag_seconds", self.loop_lag)
+
+        for name, (help_text, read, label) in self.counters.items():
+            lines += [f"# HELP {p}_{name} {help_text}", f"# TYPE {p}_{name} counter"]
+            if label is None:
+                lines.append(f"{p}_{name} {read()}")
+            else:
+                lines += [f"{p}_{name}{_labels(**{label: key})} {value}" for key, value in read().items()]
+
+        for name, (help_text, read) in self.gauges.items():
+            lines += [
+                f"# HELP {p}_{name} {help_text}",
+                f"# TYPE {p}_{name} gauge",
+                f"{p}_{name} {read()}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _histogram(name: str, histogram: Histogram, **labels) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(histogram.bounds, histogram.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}")
+        lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {histogram.count}")
+        suffix = _labels(**labels) if labels else ""
+        lines.append(f"{name}_sum{suffix} {histogram.sum}")
+        lines.append(f"{name}_count{suffix} {histogram.count}")
+        return lines
@@ -0,0 +1,428 @@
+"""
+Сохранение комнат и чата между перезапусками: снимок + журнал изменений (WAL).
+
+Каждое изменение реестра комнат (создание, вход, выход, удаление, сообщение)
+и таблиц лидеров (новый итог игрока) становится строкой журнала "seq операция данные". Строки копятся в буфере и
+раз в PERSIST_COMMIT_MS записываются одной пачкой с одним fsync (group commit),
+поэтому поток сообщений чата не упирается в fsync. Запись идёт по порядку
+в отдельном потоке и не блокирует цикл событий.
+
+Раз в PERSIST_SNAPSHOT_EVERY записей состояние сохраняется компактным снимком
+(комнаты, составы, сообщения из памяти ChatHistory и очки), а журнал обрезается.
+При запуске применяются снимок и записи журнала с seq больше, чем у снимка.
+Сообщения лежат в том же JSON, что хранит ChatHistory, и при восстановлении
+не перекодируются. Сообщения, вытесненные из памяти в CHAT_SPILL_DIR,
+в снимок не входят.
+
+После восстановления игроки в комнатах — записи с sid прошлого запуска.
+Игрок, вернувшийся в комнату с выданным ему при входе token, занимает свою
+запись (и права создателя); остальных убирают через PERSIST_GRACE секунд.
+
+Настройка через переменные окружения:
+    PERSIST_URL             — пусто: без сохранения;
+                              file:///var/lib/alko: каталог со снимком и журналом;
+                              sqlite:///var/lib/alko.db: база SQLite
+    PERSIST_COMMIT_MS       — окно group commit
+    PERSIST_SNAPSHOT_EVERY  — записей журнала между снимками
+    PERSIST_GRACE           — сколько секунд ждать игроков после перезапуска
+"""
+import asyncio
+import os
+import signal
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+from src.leaderboard import GLOBAL, Leaderboards
+from src.log import get_logger
+from src.registry import PlayerRecord, RoomRecord, RoomRegistry
+from src.scheduler import Scheduler
+from src.serialization import json_module
+
+log = get_logger("persistence")
+
+codec = json_module()
+
+
+def _dumps(value) -> bytes:
+    return codec.dumps(value).encode()
+
+
+# Хранилища: вызываются только из потока журнала
+
+class FileStore:
+    """ Снимок и журнал — два файла в каталоге """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, "snapshot.log")
+        self.log_path = os.path.join(directory, "journal.log")
+        self._log = None
+
+    def load(self) -> Tuple[List[bytes], List[bytes]]:
+        snapshot = self._read(self.snapshot_path)
+        lines = self._read(self.log_path)
+        # Недописанная при сбое последняя строка отрезается, чтобы не склеиться с новыми
+        if lines and not lines[-1].endswith(b"\n"):
+            torn = lines.pop()
+            with open(self.log_path, "r+b") as file:
+                file.truncate(os.path.getsize(self.log_path) - len(torn))
+            log.warning("Обрезана недописанная запись журнала ({} байт)", len(torn))
+        return snapshot, lines
+
+    @staticmethod
+    def _read(path: str) -> List[bytes]:
+        try:
+            with open(path, "rb") as file:
+                return file.read().splitlines(keepends=True)
+        except FileNotFoundError:
+            return []
+
+    def _open_log(self):
+        if self._log is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._log = open(self.log_path, "ab")
+        return self._log
+
+    def append(self, lines: List[bytes]):
+        file = self._open_log()
+        file.write(b"".join(lines))
+        file.flush()
+        os.fsync(file.fileno())
+
+    def write_snapshot(self, lines: List[bytes]):
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = self.snapshot_path + ".tmp"
+        with open(temporary, "wb") as file:
+            file.write(b"".join(lines))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.snapshot_path)
+        directory = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+        # Всё записанное в журнал уже вошло в снимок
+        file = self._open_log()
+        file.truncate(0)
+        os.fsync(file.fileno())
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+class SqliteStore:
+    """ Снимок и журнал — две таблицы SQLite; снимок и обрезка журнала в одной транзакции """
+
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=FULL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS journal (line BLOB NOT NULL)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS snapshot (line BLOB NOT NULL)")
+
+    def load(self) -> Tuple[List[bytes], List[bytes]]:
+        snapshot = [row[0] for row in self.db.execute("SELECT line FROM snapshot ORDER BY rowid")]
+        lines = [row[0] for row in self.db.execute("SELECT line FROM journal ORDER BY rowid")]
+        return snapshot, lines
+
+    def append(self, lines: List[bytes]):
+        with self._transaction():
+            self.db.executemany("INSERT INTO journal (line) VALUES (?)", ((line,) for line in lines))
+
+    def write_snapshot(self, lines: List[bytes]):
+        with self._transaction():
+            self.db.execute("DELETE FROM snapshot")
+            self.db.executemany("INSERT INTO snapshot (line) VALUES (?)", ((line,) for line in lines))
+            self.db.execute("DELETE FROM journal")
+
+    @contextmanager
+    def _transaction(self):
+        self.db.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+
+    def close(self):
+        self.db.close()
+
+
+def store_from_url(url: str):
+    if not url:
+        return None
+    if url.startswith("file://"):
+        return FileStore(url[len("file://"):])
+    if url.startswith("sqlite://"):
+        return SqliteStore(url[len("sqlite://"):])
+    raise ValueError(f"Неизвестный PERSIST_URL: {url}")
+
+
+# Записи журнала и снимка
+
+def snapshot_lines(rooms: RoomRegistry, seq: int, leaderboards: Optional[Leaderboards] = None) -> List[bytes]:
+    """ Состояние реестра в виде записей, которые restore применяет так же, как журнал """
+    prefix = b"%d " % seq
+    lines = [prefix + b"state " + _dumps({"last_id": rooms.last_id}) + b"\n"]
+    for room in rooms:
+        lines.append(prefix + b"room " + _dumps({
+            "id": room.id,
+            "name": room.name,
+            "questions_count": room.questions_count,
+            "context": room.context,
+            "creator": room.creator_sid,
+            "created_at": room.created_at,
+            "members": [[player.sid, player.name, player.token] for player in room.members.values()],
+        }) + b"\n")
+        message_prefix = prefix + b"msg " + room.id.encode() + b" "
+        encoded, _ = room.history.page_encoded(None, len(room.history))
+        lines.extend(message_prefix + message + b"\n" for message in encoded)
+    if leaderboards is not None:
+        for board in leaderboards:
+            # Таблицы удалённых комнат ещё не убраны уборкой — в снимок не нужны
+            if board.board_id != GLOBAL and board.board_id not in rooms:
+                continue
+            # От первого места к последнему: при восстановлении сохранится порядок равных очков
+            lines.extend(
+                prefix + b"score " + _dumps([board.board_id, name, score]) + b"\n"
+                for name, score in board.entries()
+            )
+    return lines
+
+
+def _parse(line: bytes) -> Tuple[int, bytes, bytes]:
+    seq, op, payload = line.rstrip(b"\n").split(b" ", 2)
+    return int(seq), op, payload
+
+
+def _apply(rooms: RoomRegistry, op: bytes, payload: bytes, leaderboards: Optional[Leaderboards]):
+    if op == b"msg":
+        room_id, encoded = payload.split(b" ", 1)
+        room = rooms.get(room_id.decode())
+        if room is not None:
+            room.history.restore(codec.loads(encoded), encoded)
+        return
+
+    data = codec.loads(payload)
+    if op == b"join":
+        # В записях старых версий token нет
+        room_id, sid, name, *token = data
+        room = rooms.get(room_id)
+        if room is not None:
+            rooms.join(room, PlayerRecord(sid, name, token=next(iter(token), None)))
+    elif op == b"rejoin":
+        room_id, stale_sid, sid, name = data
+        room = rooms.get(room_id)
+        if room is not None:
+            rooms.replace(room, stale_sid, PlayerRecord(sid, name))
+    elif op == b"leave":
+        room = rooms.room_of(data)
+        if room is not None:
+            rooms.leave(room.members[data])
+    elif op == b"remove":
+        rooms.remove(data)
+        if leaderboards is not None:
+            leaderboards.drop(data)
+    elif op == b"score":
+        if leaderboards is not None:
+            leaderboards.restore(*data)
+    elif op in (b"create", b"room"):
+        room = rooms.restore(
+            data["id"], data["name"], data["questions_count"], data["context"],
+            data["creator"], data["created_at"],
+        )
+        rooms.last_id = max(rooms.last_id, data.get("last_id", 0))
+        for sid, name, *token in data.get("members", ()):
+            rooms.join(room, PlayerRecord(sid, name, token=next(iter(token), None)))
+    elif op == b"state":
+        rooms.last_id = max(rooms.last_id, data["last_id"])
+    else:
+        raise ValueError(f"Неизвестная запись журнала: {op!r}")
+
+
+def restore(
+    rooms: RoomRegistry, snapshot: List[bytes], lines: List[bytes], leaderboards: Optional[Leaderboards] = None,
+) -> Tuple[int, int]:
+    """
+    Применяет к пустому реестру снимок и затем журнал.
+    Возвращает seq последней применённой записи и seq снимка.
+    """
+    snapshot_seq = 0
+    for line in snapshot:
+        snapshot_seq, op, payload = _parse(line)
+        _apply(rooms, op, payload, leaderboards)
+
+    seq = snapshot_seq
+    for number, line in enumerate(lines):
+        try:
+            line_seq, op, payload = _parse(line)
+            if line_seq <= snapshot_seq:
+                continue
+            _apply(rooms, op, payload, leaderboards)
+        except Exception:
+            log.exception("Журнал повреждён на записи {}, остальные {} пропущены", number, len(lines) - number)
+            break
+        seq = line_seq
+    return seq, snapshot_seq
+
+
+class Journal:
+    """
+    Журнал изменений реестра комнат и таблиц лидеров: они вызывают его методы
+    при каждом изменении. Записи сбрасываются пачками через общий планировщик.
+    """
+
+    def __init__(
+        self,
+        store,
+        rooms: RoomRegistry,
+        scheduler: Scheduler,
+        commit_interval: float = 0.05,
+        snapshot_every: int = 50_000,
+        leaderboards: Optional[Leaderboards] = None,
+    ):
+        self.store = store
+        self.rooms = rooms
+        self.leaderboards = leaderboards
+        self.scheduler = scheduler
+        self.commit_interval = commit_interval
+        self.snapshot_every = snapshot_every
+        self.seq = 0
+        self.snapshot_seq = 0
+        self.frozen = False
+        self.commits = 0
+        self.snapshots = 0
+        self._buffer: List[bytes] = []
+        self._flush_timer = None
+        # Один поток: пачки журнала и снимки пишутся строго по порядку
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal")
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def recover(self) -> int:
+        """ Восстанавливает реестр из хранилища и подключается к нему; возвращает число комнат """
+        snapshot, lines = await self._run(self.store.load)
+        self.seq, self.snapshot_seq = restore(self.rooms, snapshot, lines, self.leaderboards)
+        stale = self.rooms.mark_stale()
+        self.rooms.journal = self
+        if self.leaderboards is not None:
+            self.leaderboards.journal = self
+        log.info(
+            "Восстановлено комнат: {}, игроков ждём: {} (снимок {}, записей журнала {})",
+            len(self.rooms), stale, len(snapshot), len(lines),
+        )
+        return len(self.rooms)
+
+    # Вызовы реестра комнат
+
+    def _record(self, op: bytes, payload: bytes):
+        if self.frozen:
+            return
+        self.seq += 1
+        self._buffer.append(b"%d %s %s\n" % (self.seq, op, payload))
+        if self._flush_timer is None:
+            self._flush_timer = self.scheduler.call_later(self.commit_interval, self.flush)
+
+    def created(self, room: RoomRecord):
+        self._record(b"create", _dumps({
+            "id": room.id,
+            "name": room.name,
+            "questions_count": room.questions_count,
+            "context": room.context,
+            "creator": room.creator_sid,
+            "created_at": room.created_at,
+            "last_id": self.rooms.last_id,
+        }))
+
+    def joined(self, room: RoomRecord, player: PlayerRecord):
+        self._record(b"join", _dumps([room.id, player.sid, player.name, player.token]))
+
+    def replaced(self, room: RoomRecord, stale_sid: str, player: PlayerRecord):
+        self._record(b"rejoin", _dumps([room.id, stale_sid, player.sid, player.name]))
+
+    def left(self, sid: str):
+        self._record(b"leave", _dumps(sid))
+
+    def removed(self, room_id: str):
+        self._record(b"remove", _dumps(room_id))
+
+    def posted(self, room: RoomRecord, encoded: bytes):
+        self._record(b"msg", room.id.encode() + b" " + encoded)
+
+    def scored(self, board_id: str, name: str, total: int):
+        self._record(b"score", _dumps([board_id, name, total]))
+
+    # Запись на диск
+
+    async def flush(self):
+        self._flush_timer = None
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        await self._run(self.store.append, batch)
+        self.commits += 1
+        if self.seq - self.snapshot_seq >= self.snapshot_every:
+            await self.checkpoint()
+
+    async def checkpoint(self):
+        """ Снимок текущего состояния; после него журнал обрезается """
+        if self.seq == self.snapshot_seq:
+            return
+        # Снимок и остаток буфера собираются синхронно, без изменений реестра между ними
+        batch, self._buffer = self._buffer, []
+        self.snapshot_seq = self.seq
+        lines = snapshot_lines(self.rooms, self.seq, self.leaderboards)
+        await self._run(self._write_snapshot, batch, lines)
+        self.snapshots += 1
+
+    def _write_snapshot(self, batch: List[bytes], lines: List[bytes]):
+        if batch:
+            self.store.append(batch)
+        self.store.write_snapshot(lines)
+
+    def freeze(self):
+        """ Больше ничего не записывать: дальнейшие изменения — это остановка сервера """
+        self.frozen = True
+
+    async def close(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+        await self.flush()
+        await self._run(self.store.close)
+        self._executor.shutdown()
+
+
+def freeze_on_exit(journal: Journal):
+    """
+    uvicorn закрывает соединения раньше, чем завершается lifespan, и disconnect
+    успел бы записать в журнал выход всех игроков. Поэтому по SIGINT/SIGTERM
+    журнал сначала замораживается, а затем срабатывает прежний обработчик.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        previous = signal.getsignal(sig)
+
+        def handler(signum, frame, previous=previous):
+            journal.freeze()
+            if previous == signal.SIG_IGN:
+                return
+            if callable(previous):
+                previous(signum, frame)
+            else:
+                signal.signal(signum, signal.SIG_DFL)
+                os.kill(os.getpid(), signum)
+
+        signal.signal(sig, handler)
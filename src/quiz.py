@@ -0,0 +1,110 @@
+from typing import Dict, List, Optional, Set
+
+from src.answers import AnswerIndex
+from src.scheduler import Timer
+
+# Ответ — строка или список вариантов; длиннее ответы не проверяются:
+# список без ограничений позволил бы перебрать все варианты одним событием
+MAX_ANSWER_VARIANTS = 5
+MAX_ANSWER_LENGTH = 200
+
+# Состояния раунда
+WAITING = "waiting"      # игра создана, первая загадка ещё не задана
+ASKING = "asking"        # загадка задана, принимаются ответы
+REVEALED = "revealed"    # итог раунда отправлен, ждём "next"
+
+
+class QuizGame:
+    """
+    Состояние викторины одной комнаты.
+
+    Раунд закрывается первым верным ответом, ответами всех игроков или по таймеру.
+    Все переходы состояний синхронные: обработчики меняют состояние до первого
+    await, поэтому одновременные ответы в одной комнате засчитываются ровно один раз.
+    """
+
+    __slots__ = ("room_id", "riddles", "answers", "position", "state", "scores", "answered", "timer")
+
+    def __init__(self, room_id: str, riddles: List[Dict]):
+        self.room_id = room_id
+        self.riddles = riddles
+        # Ответы по месту загадки в игре: номера в банке из разных категорий могут совпадать
+        self.answers = AnswerIndex()
+        for position, riddle in enumerate(riddles):
+            self.answers.add(position, riddle["answer"])
+        self.position = -1
+        self.state = WAITING
+        self.scores: Dict[str, int] = {}
+        self.answered: Set[str] = set()
+        self.timer: Optional[Timer] = None
+
+    @property
+    def riddle(self) -> Optional[Dict]:
+        if 0 <= self.position < len(self.riddles):
+            return self.riddles[self.position]
+        return None
+
+    @property
+    def round(self) -> int:
+        return self.position + 1
+
+    def next_riddle(self) -> Optional[Dict]:
+        """ Задаёт следующую загадку; None — загадки закончились """
+        self.position += 1
+        riddle = self.riddle
+        if riddle is None:
+            return None
+        self.state = ASKING
+        self.answered.clear()
+        return self.question()
+
+    def question(self) -> Dict:
+        """ Текущая загадка в виде, который уходит клиентам """
+        return {"number": self.round, "text": self.riddle["text"], "total": len(self.riddles)}
+
+    def answer(self, sid: str, text, players_count: int) -> Optional[Dict]:
+        """
+        Принимает ответ игрока; возвращает итог раунда, если раунд закрылся.
+        Некорректный ответ отбрасывается и не расходует попытку.
+        """
+        if self.state != ASKING or sid in self.answered:
+            return None
+        texts = text if isinstance(text, list) else [text]
+        if not 0 < len(texts) <= MAX_ANSWER_VARIANTS or not all(
+            isinstance(item, str) and len(item) <= MAX_ANSWER_LENGTH for item in texts
+        ):
+            return None
+        self.answered.add(sid)
+
+        if any(self.answers.check(self.position, item) for item in texts):
+            self.scores[sid] = self.scores.get(sid, 0) + 1
+            return self._close(winner=sid)
+        if len(self.answered) >= players_count:
+            return self._close(winner=None)
+        return None
+
+    def timeout(self, round_number: int) -> Optional[Dict]:
+        """ Закрывает раунд по таймеру, если он ещё не закрыт ответом """
+        if self.state != ASKING or round_number != self.round:
+            return None
+        return self._close(winner=None)
+
+    def _close(self, winner: Optional[str]) -> Dict:
+        self.state = REVEALED
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        riddle = self.riddle
+        return {
+            "number": self.round,
+            "text": riddle["text"],
+            "answer": riddle["answer"][0] if riddle["answer"] else "",
+            "is_correct": winner is not None,
+            "winner": winner,
+            "scores": dict(self.scores),
+        }
+
+    def stop(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
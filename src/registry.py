@@ -0,0 +1,260 @@
+from datetime import datetime
+from hmac import compare_digest
+from secrets import token_urlsafe
+from time import monotonic
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+from src.chat_history import ChatHistory
+
+
+class PlayerRecord:
+    """
+    Подключённый игрок; room_id равен None, пока игрок не в комнате.
+    token — секрет, выданный при входе в комнату: по нему игрок после
+    перезапуска сервера занимает свою прежнюю запись. В to_dict не попадает.
+    """
+
+    __slots__ = ("sid", "name", "room_id", "token")
+
+    def __init__(
+        self, sid: str, name: Optional[str] = None, room_id: Optional[str] = None, token: Optional[str] = None,
+    ):
+        self.sid = sid
+        self.name = name
+        self.room_id = room_id
+        self.token = token
+
+    def to_dict(self) -> Dict:
+        return {"sid": self.sid, "name": self.name, "room_id": self.room_id}
+
+
+class RoomRecord:
+    """
+    Комната с упорядоченным составом игроков.
+
+    members — словарь sid -> PlayerRecord: сохраняет порядок входа
+    и позволяет удалять игрока за O(1). last_active — время (monotonic)
+    последнего входа или сообщения. roster_version растёт при каждом
+    изменении состава: по нему клиент замечает пропущенные дельты.
+    """
+
+    __slots__ = (
+        "id", "name", "questions_count", "context",
+        "creator_sid", "members", "history", "created_at", "last_active", "roster_version",
+    )
+
+    def __init__(
+        self, room_id: str, name: str, questions_count: int, context: str, creator_sid: str,
+        history: Optional[ChatHistory] = None,
+    ):
+        self.id = room_id
+        self.name = name
+        self.questions_count = questions_count
+        self.context = context
+        self.creator_sid = creator_sid
+        self.members: Dict[str, PlayerRecord] = {}
+        self.history = history if history is not None else ChatHistory(room_id)
+        self.created_at = datetime.now().isoformat()
+        self.last_active = monotonic()
+        self.roster_version = 0
+
+    def player_list(self) -> List[Dict]:
+        return [{"sid": player.sid, "name": player.name} for player in self.members.values()]
+
+    def roster(self) -> Dict:
+        """ Полный состав комнаты с версией — для первой загрузки и пересинхронизации """
+        return {
+            "room_id": self.id,
+            "players": self.player_list(),
+            "creator": self.creator_sid,
+            "roster_version": self.roster_version,
+        }
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "questions_count": self.questions_count,
+            "context": self.context,
+            "creator": self.creator_sid,
+            "players": self.player_list(),
+            "roster_version": self.roster_version,
+            "created_at": self.created_at,
+        }
+
+
+class PlayerRegistry:
+    """ Реестр подключённых игроков по sid """
+
+    def __init__(self):
+        self._players: Dict[str, PlayerRecord] = {}
+
+    def connect(self, sid: str) -> PlayerRecord:
+        player = self._players[sid] = PlayerRecord(sid)
+        return player
+
+    def get(self, sid: str) -> Optional[PlayerRecord]:
+        return self._players.get(sid)
+
+    def remove(self, sid: str) -> Optional[PlayerRecord]:
+        return self._players.pop(sid, None)
+
+    def __contains__(self, sid: str) -> bool:
+        return sid in self._players
+
+    def __len__(self) -> int:
+        return len(self._players)
+
+    def __iter__(self) -> Iterator[PlayerRecord]:
+        return iter(self._players.values())
+
+
+class RoomRegistry:
+    """
+    Реестр комнат с индексом sid -> комната.
+
+    Идентификаторы комнат монотонно растут и не переиспользуются после удаления.
+    Если задан journal (см. src/persistence.py), каждое изменение передаётся ему.
+    """
+
+    def __init__(self, prefix: str = "room_", history: Callable[..., ChatHistory] = ChatHistory):
+        self._prefix = prefix
+        self._history = history
+        self.last_id = 0
+        self.journal = None
+        self._rooms: Dict[str, RoomRecord] = {}
+        self._room_by_sid: Dict[str, RoomRecord] = {}
+        # sid игроков, восстановленных из журнала и ещё не вернувшихся
+        self._stale: Set[str] = set()
+
+    def create(self, name: str, questions_count: int, context: str, creator: PlayerRecord) -> RoomRecord:
+        self.last_id += 1
+        room_id = f"{self._prefix}{self.last_id}"
+        room = RoomRecord(room_id, name, questions_count, context, creator.sid, self._history(room_id))
+        self._rooms[room.id] = room
+        if self.journal is not None:
+            self.journal.created(room)
+        self.join(room, creator)
+        return room
+
+    def restore(
+        self, room_id: str, name: str, questions_count: int, context: str, creator_sid: str, created_at: str,
+    ) -> RoomRecord:
+        """ Пустая комната с готовым id — при восстановлении из журнала """
+        room = RoomRecord(room_id, name, questions_count, context, creator_sid, self._history(room_id))
+        room.created_at = created_at
+        self._rooms[room.id] = room
+        return room
+
+    def post(self, room: RoomRecord, message: Dict) -> Dict:
+        """ Добавляет сообщение в историю комнаты """
+        room.history.append(message)
+        room.last_active = monotonic()
+        if self.journal is not None:
+            self.journal.posted(room, room.history.last_encoded())
+        return message
+
+    def get(self, room_id: Optional[str]) -> Optional[RoomRecord]:
+        return self._rooms.get(room_id)
+
+    def room_of(self, sid: str) -> Optional[RoomRecord]:
+        return self._room_by_sid.get(sid)
+
+    def join(self, room: RoomRecord, player: PlayerRecord, token: Optional[str] = None) -> Optional[str]:
+        """
+        Добавляет игрока в комнату; возвращает sid записи, которую он занял, если такая была.
+        token — выданный раньше секрет: только с ним можно занять запись из прошлого запуска.
+        """
+        # Вернувшийся после перезапуска игрок занимает свою прежнюю запись
+        if self._stale and token:
+            for sid, member in room.members.items():
+                if sid in self._stale and member.token and compare_digest(member.token.encode(), token.encode()):
+                    self.replace(room, sid, player)
+                    return sid
+
+        if player.token is None:
+            player.token = token_urlsafe(16)
+
+        # Игрок может находиться только в одной комнате
+        if player.room_id is not None and player.room_id != room.id:
+            self.leave(player)
+        if player.sid not in room.members:
+            room.roster_version += 1
+        room.members[player.sid] = player
+        player.room_id = room.id
+        self._room_by_sid[player.sid] = room
+        room.last_active = monotonic()
+        if self.journal is not None:
+            self.journal.joined(room, player)
+        return None
+
+    def replace(self, room: RoomRecord, stale_sid: str, player: PlayerRecord):
+        """ Игрок входит в комнату вместо записи stale_sid и наследует её token и права создателя """
+        if player.room_id is not None and player.room_id != room.id:
+            self.leave(player)
+        stale = room.members.pop(stale_sid, None)
+        if stale is not None:
+            player.token = stale.token
+        self._room_by_sid.pop(stale_sid, None)
+        self._stale.discard(stale_sid)
+        room.members[player.sid] = player
+        player.room_id = room.id
+        self._room_by_sid[player.sid] = room
+        if room.creator_sid == stale_sid:
+            room.creator_sid = player.sid
+        room.roster_version += 1
+        room.last_active = monotonic()
+        if self.journal is not None:
+            self.journal.replaced(room, stale_sid, player)
+
+    def leave(self, player: PlayerRecord) -> Optional[RoomRecord]:
+        """ Убирает игрока из его комнаты и возвращает эту комнату """
+        room = self._room_by_sid.pop(player.sid, None)
+        if room is not None:
+            room.members.pop(player.sid, None)
+            room.roster_version += 1
+            self._stale.discard(player.sid)
+            # Права создателя переходят к следующему по порядку входа игроку
+            if room.creator_sid == player.sid and room.members:
+                room.creator_sid = next(iter(room.members))
+            if self.journal is not None:
+                self.journal.left(player.sid)
+        player.room_id = None
+        return room
+
+    def remove(self, room_id: str) -> Optional[RoomRecord]:
+        room = self._rooms.pop(room_id, None)
+        if room is not None:
+            for player in room.members.values():
+                self._room_by_sid.pop(player.sid, None)
+                self._stale.discard(player.sid)
+                player.room_id = None
+            room.history.close()
+            if self.journal is not None:
+                self.journal.removed(room_id)
+        return room
+
+    def mark_stale(self) -> int:
+        """ Все игроки в комнатах — из прошлого запуска; возвращает их число """
+        self._stale = set(self._room_by_sid)
+        return len(self._stale)
+
+    def expire_stale(self) -> List[RoomRecord]:
+        """ Убирает не вернувшихся игроков и возвращает затронутые комнаты """
+        touched: Dict[str, RoomRecord] = {}
+        for sid in list(self._stale):
+            room = self._room_by_sid.get(sid)
+            if room is not None:
+                self.leave(room.members[sid])
+                touched[room.id] = room
+        self._stale.clear()
+        return list(touched.values())
+
+    def __contains__(self, room_id: str) -> bool:
+        return room_id in self._rooms
+
+    def __len__(self) -> int:
+        return len(self._rooms)
+
+    def __iter__(self) -> Iterator[RoomRecord]:
+        return iter(self._rooms.values())
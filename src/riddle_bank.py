@@ -0,0 +1,132 @@
+"""
+Банк загадок в компактном файловом формате с индексом смещений.
+
+Формат файла:
+    заголовок  — MAGIC, смещение и длина каталога категорий (struct HEADER)
+    данные     — загадки в JSON (UTF-8), записанные подряд
+    таблица    — пары uint64 (смещение, длина) для каждой загадки,
+                 загадки одной категории идут в таблице подряд
+    каталог    — JSON {"count": N, "table": смещение таблицы,
+                 "categories": {имя: [первая запись, количество]}}
+
+Файл читается через mmap: при открытии разбираются только заголовок и каталог,
+а выборка для комнаты декодирует лишь выбранные записи.
+
+Конвертация текущего списка загадок:
+    python -m src.riddle_bank riddles.bank --module src.all_riddles
+"""
+import argparse
+import importlib
+import io
+import json
+import mmap
+import random
+import struct
+from array import array
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+MAGIC = b"RBANK001"
+HEADER = struct.Struct("<8sQQ")
+DEFAULT_CATEGORY = "общие"
+
+
+def write_bank(out: BinaryIO, riddles: Iterable[Dict], default_category: str = DEFAULT_CATEGORY):
+    """ Записывает загадки в формате банка; категория берётся из поля "category" """
+    by_category: Dict[str, List[Dict]] = {}
+    for riddle in riddles:
+        category = (riddle.get("category") or default_category).casefold()
+        by_category.setdefault(category, []).append(riddle)
+
+    out.write(b"\0" * HEADER.size)
+    table = array("Q")
+    categories = {}
+    for category, items in by_category.items():
+        categories[category] = [len(table) // 2, len(items)]
+        for riddle in items:
+            encoded = json.dumps(riddle, ensure_ascii=False).encode()
+            table.extend((out.tell(), len(encoded)))
+            out.write(encoded)
+
+    # Таблица выравнивается по 8 байт, чтобы читать её через memoryview.cast("Q")
+    out.write(b"\0" * (-out.tell() % 8))
+    table_offset = out.tell()
+    out.write(table.tobytes())
+    catalog = json.dumps(
+        {"count": len(table) // 2, "table": table_offset, "categories": categories},
+        ensure_ascii=False,
+    ).encode()
+    catalog_offset = out.tell()
+    out.write(catalog)
+    out.seek(0)
+    out.write(HEADER.pack(MAGIC, catalog_offset, len(catalog)))
+
+
+class RiddleBank:
+    """ Банк загадок поверх mmap (или байтов, если он собран в памяти) """
+
+    def __init__(self, buffer, source: Optional[BinaryIO] = None):
+        self._buffer = buffer
+        self._source = source
+
+        magic, catalog_offset, catalog_length = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("Неизвестный формат банка загадок")
+        catalog = json.loads(buffer[catalog_offset:catalog_offset + catalog_length])
+
+        self.count: int = catalog["count"]
+        self.categories: Dict[str, Tuple[int, int]] = {
+            name: tuple(span) for name, span in catalog["categories"].items()
+        }
+        table_offset = catalog["table"]
+        self._table = memoryview(buffer)[table_offset:table_offset + self.count * 16].cast("Q")
+
+    @classmethod
+    def open(cls, path: str) -> "RiddleBank":
+        source = open(path, "rb")
+        return cls(mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ), source)
+
+    @classmethod
+    def from_riddles(cls, riddles: Iterable[Dict]) -> "RiddleBank":
+        out = io.BytesIO()
+        write_bank(out, riddles)
+        return cls(out.getvalue())
+
+    def get(self, position: int) -> Dict:
+        offset, length = self._table[2 * position], self._table[2 * position + 1]
+        return json.loads(self._buffer[offset:offset + length])
+
+    def span(self, category: Optional[str]) -> Tuple[int, int]:
+        """ Диапазон записей категории; неизвестная или пустая категория — весь банк """
+        if category:
+            span = self.categories.get(category.strip().casefold())
+            if span is not None:
+                return span
+        return 0, self.count
+
+    def sample(self, category: Optional[str], k: int, rng: Optional[random.Random] = None) -> List[Dict]:
+        """ Случайные k загадок категории без повторов """
+        first, size = self.span(category)
+        positions = (rng or random).sample(range(first, first + size), min(max(k, 0), size))
+        return [self.get(position) for position in positions]
+
+    def close(self):
+        self._table.release()
+        if self._source is not None:
+            self._buffer.close()
+            self._source.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Конвертирует список загадок в файл банка")
+    parser.add_argument("output", help="путь к файлу банка")
+    parser.add_argument("--module", default="src.all_riddles", help="модуль со списком riddles")
+    parser.add_argument("--category", default=DEFAULT_CATEGORY, help="категория по умолчанию")
+    args = parser.parse_args()
+
+    riddles = importlib.import_module(args.module).riddles
+    with open(args.output, "wb") as output:
+        write_bank(output, riddles, default_category=args.category)
+    print(f"Записано загадок: {len(riddles)} -> {args.output}")
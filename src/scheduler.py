@@ -0,0 +1,90 @@
+import asyncio
+import heapq
+import itertools
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+
+from src.log import get_logger
+
+log = get_logger("scheduler")
+
+
+class Timer:
+    """ Запланированный вызов; отмена только помечает запись в куче """
+
+    __slots__ = ("deadline", "callback", "args", "cancelled")
+
+    def __init__(self, deadline: float, callback: Callable[..., Awaitable[Any]], args: tuple):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Scheduler:
+    """
+    Общий планировщик таймеров для всех комнат.
+
+    Таймеры лежат в одной куче по времени срабатывания, а их обслуживает
+    единственная фоновая задача, которая спит до ближайшего срока.
+    Так 10k одновременных игр не создают 10k задач или таймеров цикла событий.
+    Сработавший таймер запускается отдельной задачей: медленный обработчик
+    (запись журнала, уборка) не задерживает остальные таймеры.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, Timer]] = []
+        self._counter = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # Выполняющиеся обработчики: ссылка нужна, чтобы задачу не собрал сборщик мусора
+        self._running: Set[asyncio.Task] = set()
+
+    def call_later(self, delay: float, callback: Callable[..., Awaitable[Any]], *args) -> Timer:
+        loop = asyncio.get_running_loop()
+        timer = Timer(loop.time() + delay, callback, args)
+        heapq.heappush(self._heap, (timer.deadline, next(self._counter), timer))
+
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+        elif self._heap[0][2] is timer:
+            # Новый таймер раньше текущего ближайшего — будим задачу
+            self._wakeup.set()
+        return timer
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._heap:
+            deadline, _, timer = self._heap[0]
+            if timer.cancelled:
+                heapq.heappop(self._heap)
+                continue
+
+            delay = deadline - loop.time()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            if timer.cancelled:
+                continue
+            task = loop.create_task(self._fire(timer))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    @staticmethod
+    async def _fire(timer: Timer):
+        try:
+            await timer.callback(*timer.args)
+        except Exception:
+            log.exception("Ошибка в таймере {}", timer.callback.__name__)
+
+    def __len__(self) -> int:
+        return sum(1 for _, _, timer in self._heap if not timer.cancelled)
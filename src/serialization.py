@@ -0,0 +1,223 @@
+"""
+Сериализация пакетов Socket.IO.
+
+JSON-режим по умолчанию использует orjson (если установлен): он быстрее
+стандартного json и пишет кириллицу в UTF-8, а не \\uXXXX, поэтому сообщения
+чата почти втрое короче. Большие ответы (список комнат, страницы истории)
+можно отдать как RawJSON — готовый текст, который вставляется в пакет без
+повторного кодирования.
+
+MessagePack — по желанию клиента: он подключается с ?serializer=msgpack и
+парсером socket.io-msgpack-parser. Пакет переводится в MessagePack не больше
+одного раза на эмит, сколько бы таких получателей ни было, и из данных
+пакета, а не разбором готового JSON. Режим доступен, если установлен пакет
+msgpack.
+
+Настройка через переменные окружения:
+    SERIALIZER — orjson (по умолчанию, если установлен) или json
+"""
+import json
+from typing import Any, Dict, List, Set
+from urllib.parse import parse_qs
+
+from socketio import packet
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class StdlibJson:
+    """ Стандартный json без экранирования не-ASCII символов """
+
+    @staticmethod
+    def dumps(obj, **kwargs) -> str:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+    loads = staticmethod(json.loads)
+
+
+class OrJson:
+    @staticmethod
+    def dumps(obj, **kwargs) -> str:
+        return orjson.dumps(obj).decode()
+
+    loads = staticmethod(orjson.loads) if orjson is not None else None
+
+
+def json_module(name: str = None):
+    """ Кодировщик JSON по имени; без orjson — стандартный json """
+    if name == "json" or orjson is None:
+        return StdlibJson
+    return OrJson
+
+
+def available_serializers():
+    return ["json", "msgpack"] if msgpack is not None else ["json"]
+
+
+class RawJSON(str):
+    """ Уже закодированное значение JSON; пакет вставляет его как есть """
+
+
+class EncodedPacket(str):
+    """ Текст пакета Socket.IO со ссылкой на сам пакет: из него строится кадр MessagePack """
+
+
+def raw_array(items: List[bytes]) -> RawJSON:
+    """ Массив из готовых JSON-элементов в UTF-8, например закодированных сообщений истории """
+    return RawJSON(b"[" + b",".join(items) + b"]", "utf-8")
+
+
+def raw_object(fields: Dict[str, Any], json_module=StdlibJson) -> RawJSON:
+    """ Объект JSON, поля-RawJSON которого вставляются без перекодирования """
+    return RawJSON("{" + ",".join(
+        json_module.dumps(key) + ":" + (value if isinstance(value, RawJSON) else json_module.dumps(value))
+        for key, value in fields.items()
+    ) + "}")
+
+
+class EncodeOnce:
+    """ Кодирует значение заново, только когда передан другой объект (новый снимок лобби и т.п.) """
+
+    def __init__(self, json_module=StdlibJson):
+        self.json = json_module
+        self._source = None
+        self._encoded = None
+
+    def __call__(self, value) -> RawJSON:
+        if value is not self._source:
+            self._source = value
+            self._encoded = RawJSON(self.json.dumps(value))
+        return self._encoded
+
+
+def packet_class(json_module=StdlibJson, base=packet.Packet):
+    """
+    Класс пакета: JSON через json_module, события вида [event, RawJSON] собираются
+    склейкой строк, а бинарный пакет от клиента читается как MessagePack.
+    Входящие бинарные события с вложениями по-прежнему разбираются.
+    """
+
+    class FastPacket(base):
+        # Сервер не шлёт бинарных вложений: без рекурсивного поиска bytes в каждом эмите
+        uses_binary_events = False
+        json = json_module
+        # Включает MsgpackClients с первым таким клиентом: без них текст пакета не оборачивается
+        keep_packet = False
+
+        def encode(self):
+            data = self.data
+            if self.packet_type == packet.EVENT and data and len(data) == 2 and isinstance(data[1], RawJSON):
+                encoded = str(packet.EVENT)
+                if self.namespace is not None and self.namespace != "/":
+                    encoded += self.namespace + ","
+                if self.id is not None:
+                    encoded += str(self.id)
+                encoded += "[" + self.json.dumps(data[0]) + "," + data[1] + "]"
+            else:
+                encoded = super().encode()
+            if not self.keep_packet or not isinstance(encoded, str):
+                return encoded
+            encoded = EncodedPacket(encoded)
+            encoded.packet = self
+            return encoded
+
+        def decode(self, encoded_packet):
+            if isinstance(encoded_packet, bytes) and msgpack is not None:
+                decoded = msgpack.loads(encoded_packet)
+                self.packet_type = decoded["type"]
+                self.data = decoded.get("data")
+                self.id = decoded.get("id")
+                self.namespace = decoded["nsp"]
+                return 0
+            return super().decode(encoded_packet)
+
+    return FastPacket
+
+
+def _plain(value, json_module):
+    """ Значение для MessagePack; RawJSON разбирается один раз и запоминается """
+    if not isinstance(value, RawJSON):
+        return value
+    plain = value.__dict__.get("plain")
+    if plain is None:
+        # orjson не принимает подклассы str
+        plain = value.plain = json_module.loads(str(value))
+    return plain
+
+
+class MsgpackClients:
+    """
+    Клиенты, договорившиеся о MessagePack.
+
+    Перехватывает отправку пакетов сервера: для таких клиентов пакет эмита
+    один раз кодируется в MessagePack из его данных (EncodedPacket.packet) и
+    кешируется на самом пакете Engine.IO, который получают все адресаты эмита.
+    Кадр без ссылки на пакет разбирается из JSON.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self._eio_sids: Set[str] = set()
+        self._by_sid: Dict[str, str] = {}
+        self._send_eio_packet = server._send_eio_packet
+        self._send_packet = server._send_packet
+        if msgpack is not None:
+            self._packer = msgpack.Packer()
+            server._send_eio_packet = self._guarded_send_eio_packet
+            server._send_packet = self._guarded_send_packet
+
+    def register(self, sid: str, environ: Dict) -> bool:
+        """ Отмечает клиента, подключившегося с ?serializer=msgpack """
+        if msgpack is None:
+            return False
+        query = parse_qs(environ.get("QUERY_STRING", ""))
+        if query.get("serializer") != ["msgpack"]:
+            return False
+        self.server.packet_class.keep_packet = True
+        eio_sid = self.server.manager.eio_sid_from_sid(sid, "/")
+        self._eio_sids.add(eio_sid)
+        self._by_sid[sid] = eio_sid
+        return True
+
+    def forget(self, sid: str):
+        eio_sid = self._by_sid.pop(sid, None)
+        if eio_sid is not None:
+            self._eio_sids.discard(eio_sid)
+
+    def encode(self, pkt: packet.Packet) -> bytes:
+        data = pkt.data
+        if isinstance(data, list):
+            data = [_plain(value, pkt.json) for value in data]
+        # Пакет, разобранный из JSON-кадра, для "/" остаётся с namespace=None,
+        # а socket.io-msgpack-parser принимает только строковый nsp
+        encoded = {"type": pkt.packet_type, "data": data, "nsp": pkt.namespace or "/"}
+        if pkt.id is not None:
+            encoded["id"] = pkt.id
+        return self._packer.pack(encoded)
+
+    async def _guarded_send_eio_packet(self, eio_sid: str, eio_packet):
+        if eio_sid in self._eio_sids and isinstance(eio_packet.data, str):
+            converted = getattr(eio_packet, "msgpack", None)
+            if converted is None:
+                pkt = getattr(eio_packet.data, "packet", None)
+                if pkt is None:
+                    pkt = self.server.packet_class(encoded_packet=eio_packet.data)
+                converted = eio_packet.msgpack = type(eio_packet)(eio_packet.packet_type, self.encode(pkt))
+            eio_packet = converted
+        await self._send_eio_packet(eio_sid, eio_packet)
+
+    async def _guarded_send_packet(self, eio_sid: str, pkt: packet.Packet):
+        if eio_sid in self._eio_sids:
+            return await self.server.eio.send(eio_sid, self.encode(pkt))
+        await self._send_packet(eio_sid, pkt)
+
+    def __len__(self) -> int:
+        return len(self._eio_sids)
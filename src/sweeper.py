@@ -0,0 +1,104 @@
+"""
+Фоновая уборка: простаивающие комнаты, осиротевшие игроки и старая история.
+
+Каждая уборка — это источник ключей (sid, id комнат) и проверка одного ключа,
+которая освобождает запись и возвращает, сколько удалось освободить. Раз в
+SWEEP_INTERVAL секунд Sweeper проверяет не больше SWEEP_BATCH ключей и
+продолжает с того же места на следующем тике, так что проход по большому
+реестру растягивается на несколько тиков и не задерживает цикл событий.
+
+Настройка через переменные окружения:
+    SWEEP_INTERVAL  — период тика, с
+    SWEEP_BATCH     — ключей за тик
+    ROOM_IDLE_TTL   — комната без сообщений и входов дольше стольких секунд закрывается (0 — никогда)
+    HISTORY_TTL     — сообщения старше стольких секунд удаляются из истории (0 — хранить)
+"""
+from itertools import islice
+from time import perf_counter
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional
+
+from src.log import get_logger
+from src.scheduler import Scheduler
+
+log = get_logger("sweeper")
+
+
+class Sweep:
+    __slots__ = ("name", "keys", "reclaim", "checked", "reclaimed")
+
+    def __init__(self, name: str, keys: Callable[[], Iterable], reclaim: Callable[[Any], Awaitable[int]]):
+        self.name = name
+        self.keys = keys
+        self.reclaim = reclaim
+        self.checked = 0
+        self.reclaimed = 0
+
+
+class Sweeper:
+    def __init__(self, scheduler: Scheduler, interval: float = 5.0, batch: int = 500):
+        self.scheduler = scheduler
+        self.interval = interval
+        self.batch = batch
+        self.passes = 0
+        self.last_tick_ms = 0.0
+        self._sweeps: List[Sweep] = []
+        self._position = 0
+        self._keys: Optional[Iterator] = None
+
+    def add(self, name: str, keys: Callable[[], Iterable], reclaim: Callable[[Any], Awaitable[int]]):
+        """ reclaim(key) возвращает число освобождённых записей (0 — ключ жив) """
+        self._sweeps.append(Sweep(name, keys, reclaim))
+
+    def start(self):
+        if self._sweeps:
+            self.scheduler.call_later(self.interval, self._tick)
+
+    async def _tick(self):
+        started = perf_counter()
+        try:
+            await self.run(self.batch)
+        finally:
+            self.last_tick_ms = (perf_counter() - started) * 1000
+            self.scheduler.call_later(self.interval, self._tick)
+
+    async def run(self, budget: int):
+        """ Проверяет до budget ключей, продолжая с места прошлого вызова """
+        started = set()
+        while budget > 0:
+            sweep = self._sweeps[self._position]
+            if self._keys is None:
+                # За один вызов каждая уборка начинается не больше одного раза
+                if self._position in started:
+                    return
+                started.add(self._position)
+                # Копия ключей: реестр может меняться между тиками
+                self._keys = iter(list(sweep.keys()))
+
+            checked = 0
+            for key in islice(self._keys, budget):
+                checked += 1
+                sweep.reclaimed += await sweep.reclaim(key)
+            sweep.checked += checked
+            if checked == budget:
+                return
+            budget -= checked
+
+            # Ключи этой уборки кончились — переходим к следующей
+            self._keys = None
+            self._position = (self._position + 1) % len(self._sweeps)
+            if self._position == 0:
+                self.passes += 1
+                log.debug("Проход уборки {} завершён, освобождено: {}", self.passes, self.reclaimed())
+
+    def reclaimed(self) -> Dict[str, int]:
+        return {sweep.name: sweep.reclaimed for sweep in self._sweeps}
+
+    def stats(self) -> Dict:
+        return {
+            "passes": self.passes,
+            "last_tick_ms": round(self.last_tick_ms, 3),
+            "sweeps": {
+                sweep.name: {"checked": sweep.checked, "reclaimed": sweep.reclaimed}
+                for sweep in self._sweeps
+            },
+        }
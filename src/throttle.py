@@ -0,0 +1,142 @@
+"""
+Ограничение входящих событий и защита от медленных клиентов.
+
+RateLimiter — token bucket на каждую пару (sid, событие). Корзины одного sid
+лежат в одном array('d'): [токены, время, токены, время, ...] по номеру события,
+так что на клиента приходится один небольшой объект. Отказ — сравнение и
+счётчик, без исключений и ответных эмитов.
+
+OutboundGuard — порог очереди исходящих пакетов Engine.IO. Пока очередь клиента
+выше порога, новые пакеты ему отбрасываются; когда очередь разгрузится,
+вызывается on_resync(sid), и клиент получает актуальное состояние вместо
+всех пропущенных событий.
+
+Настройка через переменные окружения:
+    RATE_LIMITS          — бюджеты "событие=скорость:запас", например
+                           "send_message=5:10,create_room=0.5:3" (скорость в событиях/с)
+    OUTBOUND_HIGH_WATER  — порог очереди исходящих пакетов на клиента (0 — выключено)
+"""
+from array import array
+from functools import wraps
+from time import monotonic
+from typing import Any, Awaitable, Callable, Dict, Set, Tuple
+
+from src.log import get_logger
+from src.scheduler import Scheduler
+
+log = get_logger("throttle")
+
+DEFAULT_RATE_LIMITS = (
+    "send_message=5:10,create_room=0.5:3,join_room=1:5,leave_room=1:5,"
+    "get_rooms=2:10,get_chat_history=2:10,get_players=1:5,get_leaderboard=1:5,next=2:5,answer=3:6"
+)
+
+
+def parse_budgets(value: str) -> Dict[str, Tuple[float, float]]:
+    budgets = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        event, _, budget = item.partition("=")
+        rate, _, burst = budget.partition(":")
+        budgets[event.strip()] = (float(rate), float(burst or rate))
+    return budgets
+
+
+class RateLimiter:
+    def __init__(self, budgets: Dict[str, Tuple[float, float]]):
+        # событие -> (позиция в массиве корзин, скорость, запас)
+        self._slots = {
+            event: (2 * number, rate, burst)
+            for number, (event, (rate, burst)) in enumerate(budgets.items())
+        }
+        # Новая корзина полна: время 0 даёт максимальный запас при первом вызове
+        self._template = array("d", [0.0] * (2 * len(budgets)))
+        for slot, _, burst in self._slots.values():
+            self._template[slot] = burst
+        self._buckets: Dict[str, array] = {}
+        self.rejected: Dict[str, int] = dict.fromkeys(budgets, 0)
+
+    def allow(self, sid: str, event: str) -> bool:
+        budget = self._slots.get(event)
+        if budget is None:
+            return True
+        slot, rate, burst = budget
+        buckets = self._buckets.get(sid)
+        if buckets is None:
+            buckets = self._buckets[sid] = array("d", self._template)
+
+        now = monotonic()
+        tokens = min(burst, buckets[slot] + (now - buckets[slot + 1]) * rate)
+        buckets[slot + 1] = now
+        if tokens < 1.0:
+            buckets[slot] = tokens
+            self.rejected[event] += 1
+            return False
+        buckets[slot] = tokens - 1.0
+        return True
+
+    def limit(self, event: str):
+        """ Декоратор обработчика: событие сверх бюджета отбрасывается до вызова """
+        def decorator(handler):
+            @wraps(handler)
+            async def wrapper(sid, *args):
+                if not self.allow(sid, event):
+                    return None
+                return await handler(sid, *args)
+            return wrapper
+        return decorator
+
+    def forget(self, sid: str):
+        self._buckets.pop(sid, None)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class OutboundGuard:
+    def __init__(
+        self,
+        server,
+        scheduler: Scheduler,
+        high_water: int,
+        on_resync: Callable[[str], Awaitable[Any]],
+        check_interval: float = 0.5,
+    ):
+        self.server = server
+        self.scheduler = scheduler
+        self.high_water = high_water
+        self.on_resync = on_resync
+        self.check_interval = check_interval
+        self.dropped = 0
+        self.lagging: Set[str] = set()
+        self._send = server._send_eio_packet
+        if high_water > 0:
+            server._send_eio_packet = self._guarded_send
+
+    def _queue_size(self, eio_sid: str) -> int:
+        socket = self.server.eio.sockets.get(eio_sid)
+        return socket.queue.qsize() if socket is not None else 0
+
+    async def _guarded_send(self, eio_sid: str, eio_packet):
+        if eio_sid in self.lagging:
+            self.dropped += 1
+            return
+        if self._queue_size(eio_sid) >= self.high_water:
+            self.dropped += 1
+            self.lagging.add(eio_sid)
+            log.warning("Очередь клиента {} выше {}, события отбрасываются", eio_sid, self.high_water)
+            self.scheduler.call_later(self.check_interval, self._check, eio_sid)
+            return
+        await self._send(eio_sid, eio_packet)
+
+    async def _check(self, eio_sid: str):
+        """ Ждём, пока очередь разгрузится наполовину, затем досылаем состояние """
+        if eio_sid not in self.server.eio.sockets:
+            self.lagging.discard(eio_sid)
+            return
+        if self._queue_size(eio_sid) > self.high_water // 2:
+            self.scheduler.call_later(self.check_interval, self._check, eio_sid)
+            return
+        self.lagging.discard(eio_sid)
+        sid = self.server.manager.sid_from_eio_sid(eio_sid, "/")
+        if sid is not None:
+            await self.on_resync(sid)
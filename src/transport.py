@@ -0,0 +1,148 @@
+"""
+Настройки транспорта: параметры Engine.IO и запуск uvicorn.
+
+Профиль задаёт согласованный набор значений, отдельные переменные окружения
+и ключи командной строки (python main.py --help) его уточняют:
+    compat     — как раньше: polling с переходом на websocket, цикл событий
+                 и HTTP-парсер uvicorn выбирает сам, сжатие websocket включено
+    fast       — uvloop и httptools (если не установлены — asyncio и h11
+                 с предупреждением), без permessage-deflate: сообщения короткие,
+                 а zlib-контекст на каждое соединение стоит памяти и CPU
+    websocket  — fast, но только websocket: без polling-сессий и апгрейда
+
+SIO_COMPRESSION_THRESHOLD и SIO_HTTP_COMPRESSION относятся к ответам polling;
+сообщения websocket сжимает permessage-deflate (WS_PER_MESSAGE_DEFLATE), если
+его поддерживает клиент. SIO_MAX_PAYLOAD ограничивает и тело POST polling,
+и сообщение websocket.
+
+Настройка через переменные окружения:
+    HOST, PORT                  — адрес сервера
+    TRANSPORT_PROFILE           — compat | fast | websocket
+    UVICORN_LOOP                — auto | asyncio | uvloop
+    UVICORN_HTTP                — auto | h11 | httptools
+    UVICORN_WS                  — auto | websockets | wsproto
+    WS_PER_MESSAGE_DEFLATE      — 1 | 0
+    SIO_TRANSPORTS              — polling,websocket | websocket
+    SIO_PING_INTERVAL           — период ping Engine.IO, с
+    SIO_PING_TIMEOUT            — ожидание pong, с
+    SIO_MAX_PAYLOAD             — максимальный размер пакета, байт
+    SIO_HTTP_COMPRESSION        — 1 | 0
+    SIO_COMPRESSION_THRESHOLD   — сжимать ответы polling от стольких байт
+"""
+import argparse
+import importlib.util
+import os
+from typing import Dict, List, Mapping, Optional
+
+from src.log import get_logger
+
+log = get_logger("transport")
+
+PROFILES: Dict[str, Dict] = {
+    "compat": {
+        "loop": "auto",
+        "http": "auto",
+        "ws": "auto",
+        "ws_per_message_deflate": True,
+        "transports": ["polling", "websocket"],
+        "ping_interval": 25.0,
+        "ping_timeout": 20.0,
+        "max_payload": 1_000_000,
+        "http_compression": True,
+        "compression_threshold": 1024,
+    },
+}
+PROFILES["fast"] = dict(PROFILES["compat"], loop="uvloop", http="httptools", ws_per_message_deflate=False)
+PROFILES["websocket"] = dict(PROFILES["fast"], transports=["websocket"], http_compression=False)
+
+# Реализации uvicorn и пакеты, без которых они не работают
+_PACKAGES = {"uvloop": "uvloop", "httptools": "httptools", "websockets": "websockets", "wsproto": "wsproto"}
+_FALLBACKS = {"loop": "asyncio", "http": "h11", "ws": "auto"}
+
+
+def _flag(value: str) -> bool:
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _transports(value: str) -> List[str]:
+    transports = [item.strip() for item in value.split(",") if item.strip()]
+    unknown = set(transports) - {"polling", "websocket"}
+    if not transports or unknown:
+        raise argparse.ArgumentTypeError(f"неизвестные транспорты: {value}")
+    return transports
+
+
+# Настройка -> (переменная окружения, ключ командной строки, разбор значения)
+_OPTIONS = {
+    "loop": ("UVICORN_LOOP", "--loop", str),
+    "http": ("UVICORN_HTTP", "--http", str),
+    "ws": ("UVICORN_WS", "--ws", str),
+    "ws_per_message_deflate": ("WS_PER_MESSAGE_DEFLATE", "--ws-per-message-deflate", _flag),
+    "transports": ("SIO_TRANSPORTS", "--transports", _transports),
+    "ping_interval": ("SIO_PING_INTERVAL", "--ping-interval", float),
+    "ping_timeout": ("SIO_PING_TIMEOUT", "--ping-timeout", float),
+    "max_payload": ("SIO_MAX_PAYLOAD", "--max-payload", int),
+    "http_compression": ("SIO_HTTP_COMPRESSION", "--http-compression", _flag),
+    "compression_threshold": ("SIO_COMPRESSION_THRESHOLD", "--compression-threshold", int),
+}
+
+
+def parser() -> argparse.ArgumentParser:
+    cli = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    cli.add_argument("--host")
+    cli.add_argument("--port", type=int)
+    cli.add_argument("--profile", choices=sorted(PROFILES))
+    for env, flag, parse in _OPTIONS.values():
+        cli.add_argument(flag, type=parse, help=f"вместо {env}")
+    return cli
+
+
+def transport_settings(argv: Optional[List[str]] = None, env: Mapping[str, str] = os.environ) -> Dict:
+    """ Профиль, поверх него переменные окружения, поверх них ключи командной строки """
+    args = parser().parse_args(argv or [])
+    profile = args.profile or env.get("TRANSPORT_PROFILE", "compat")
+    if profile not in PROFILES:
+        raise ValueError(f"Неизвестный TRANSPORT_PROFILE: {profile}")
+
+    settings = dict(PROFILES[profile], profile=profile)
+    settings["host"] = args.host or env.get("HOST", "0.0.0.0")
+    settings["port"] = args.port or int(env.get("PORT", 8000))
+    for name, (variable, _, parse) in _OPTIONS.items():
+        if variable in env:
+            settings[name] = parse(env[variable])
+        value = getattr(args, name)
+        if value is not None:
+            settings[name] = value
+
+    # Реализация без установленного пакета — запасная, а не ошибка запуска
+    for name, fallback in _FALLBACKS.items():
+        package = _PACKAGES.get(settings[name])
+        if package is not None and importlib.util.find_spec(package) is None:
+            log.warning("{} не установлен, {}={}", package, name, fallback)
+            settings[name] = fallback
+    return settings
+
+
+def engineio_options(settings: Dict) -> Dict:
+    """ Параметры socketio.AsyncServer """
+    return {
+        "transports": settings["transports"],
+        "ping_interval": settings["ping_interval"],
+        "ping_timeout": settings["ping_timeout"],
+        "max_http_buffer_size": settings["max_payload"],
+        "http_compression": settings["http_compression"],
+        "compression_threshold": settings["compression_threshold"],
+    }
+
+
+def uvicorn_options(settings: Dict) -> Dict:
+    """ Параметры uvicorn.run """
+    return {
+        "host": settings["host"],
+        "port": settings["port"],
+        "loop": settings["loop"],
+        "http": settings["http"],
+        "ws": settings["ws"],
+        "ws_per_message_deflate": settings["ws_per_message_deflate"],
+        "ws_max_size": settings["max_payload"],
+    }
@@ -0,0 +1,161 @@
+"""
+HTTP-слой без Starlette-middleware: заголовки ответов и статические файлы из памяти.
+
+SecurityHeaders — чистое ASGI-middleware: заголовки (CSP и т.п.) кодируются
+один раз при создании и дописываются в http.response.start.
+
+StaticAssets при создании читает каталог статики в память и заранее сжимает
+каждый файл в gzip и, если установлен пакет brotli, в br. Вариант выбирается
+по Accept-Encoding; у каждого варианта свой сильный ETag, и запрос с
+совпадающим If-None-Match получает 304 без тела. Файл доступен и по обычному
+имени (Cache-Control: no-cache — браузер каждый раз сверяет ETag), и по имени
+с отпечатком содержимого, например static/script.1a2b3c4d.js, которое
+кешируется навсегда (immutable). Остальные запросы уходят в приложение.
+Изменения файлов на диске видны после перезапуска.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+Headers = List[Tuple[bytes, bytes]]
+
+NO_CACHE = b"no-cache"
+IMMUTABLE = b"public, max-age=31536000, immutable"
+# Сжатие мелких файлов не окупается
+MIN_COMPRESS_SIZE = 256
+
+
+class SecurityHeaders:
+    def __init__(self, app, headers: Dict[str, str]):
+        self.app = app
+        self.headers: Headers = [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", ())) + self.headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+class Asset:
+    """ Файл в памяти: варианты кодирования -> (тело, ETag) """
+
+    __slots__ = ("content_type", "fingerprint", "variants")
+
+    def __init__(self, content: bytes, content_type: str):
+        self.content_type = content_type.encode()
+        digest = hashlib.sha256(content).hexdigest()
+        self.fingerprint = digest[:8]
+        self.variants: Dict[str, Tuple[bytes, bytes]] = {"identity": (content, f'"{digest[:16]}"'.encode())}
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+
+        compressed = {"gzip": gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            compressed["br"] = brotli.compress(content, quality=11)
+        for encoding, body in compressed.items():
+            if len(body) < len(content):
+                self.variants[encoding] = (body, f'"{digest[:16]}-{encoding}"'.encode())
+
+    def choose(self, accept_encoding: str) -> str:
+        """ Лучший из заранее сжатых вариантов, который принимает клиент """
+        accepted = set()
+        for item in accept_encoding.split(","):
+            coding, *params = item.split(";")
+            quality = 1.0
+            for param in params:
+                name, _, value = param.strip().partition("=")
+                if name == "q":
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+            if quality > 0:
+                accepted.add(coding.strip().lower())
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and (encoding in accepted or "*" in accepted):
+                return encoding
+        return "identity"
+
+
+class StaticAssets:
+    def __init__(self, app, directory: str, prefix: str = "/static/", index: Optional[str] = "index.html"):
+        self.app = app
+        self._prefix = prefix
+        self.assets: Dict[str, Asset] = {}
+        # путь запроса -> (файл, Cache-Control)
+        self.routes: Dict[str, Tuple[Asset, bytes]] = {}
+
+        for name in self._files(directory):
+            with open(os.path.join(directory, name), "rb") as file:
+                content = file.read()
+            content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            if content_type.startswith("text/") or content_type in ("application/javascript", "application/json"):
+                content_type += "; charset=utf-8"
+            asset = self.assets[name] = Asset(content, content_type)
+
+            self.routes[prefix + name] = (asset, NO_CACHE)
+            self.routes[prefix + self._fingerprinted(name, asset)] = (asset, IMMUTABLE)
+        if index is not None and index in self.assets:
+            self.routes["/"] = (self.assets[index], NO_CACHE)
+
+    @staticmethod
+    def _files(directory: str) -> Iterable[str]:
+        for root, _, files in os.walk(directory):
+            for name in sorted(files):
+                yield os.path.relpath(os.path.join(root, name), directory).replace(os.sep, "/")
+
+    @staticmethod
+    def _fingerprinted(name: str, asset: Asset) -> str:
+        stem, dot, extension = name.rpartition(".")
+        return f"{stem}.{asset.fingerprint}.{extension}" if dot else f"{name}.{asset.fingerprint}"
+
+    def url(self, name: str) -> str:
+        """ Адрес файла с отпечатком содержимого: его можно кешировать навсегда """
+        return self._prefix + self._fingerprinted(name, self.assets[name])
+
+    @staticmethod
+    def _not_modified(if_none_match: Optional[bytes], etag: bytes) -> bool:
+        """ If-None-Match сравнивается слабо: W/"x" совпадает с "x" """
+        if if_none_match is None:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(b",")]
+        return b"*" in tags or any(tag.removeprefix(b"W/") == etag for tag in tags)
+
+    async def __call__(self, scope, receive, send):
+        route = self.routes.get(scope["path"]) if scope["type"] == "http" else None
+        if route is None or scope["method"] not in ("GET", "HEAD"):
+            return await self.app(scope, receive, send)
+
+        asset, cache_control = route
+        request_headers = dict(scope["headers"])
+        encoding = asset.choose(request_headers.get(b"accept-encoding", b"").decode("latin-1"))
+        body, etag = asset.variants[encoding]
+
+        headers = [
+            (b"etag", etag),
+            (b"cache-control", cache_control),
+            (b"vary", b"accept-encoding"),
+        ]
+        if self._not_modified(request_headers.get(b"if-none-match"), etag):
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        headers += [(b"content-type", asset.content_type), (b"content-length", str(len(body)).encode())]
+        if encoding != "identity":
+            headers.append((b"content-encoding", encoding.encode()))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else body})
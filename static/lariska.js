@@ -4,7 +4,7 @@
  * for outgoing requests, streamlining the development of real-time, interactive applications.
  */
 
-function Lariska({store, container, pages, url}) {
+function Lariska({store, container, pages, url, options={}}) {
 
   if (!window.Handlebars) { throw new Error('Handlebars should be loaded to document'); }
   if (!window.io) { throw new Error('io from socketio should be loaded to document'); }
@@ -14,7 +14,7 @@ function Lariska({store, container, pages, url}) {
   this.pages = pages // all app pages
   this.handlers = {} // all handlers
   this.url = url
-  this.socket = io.connect(this.url, {transports: ['websocket', 'polling']});
+  this.socket = io.connect(this.url, {transports: ['websocket', 'polling'], ...options});
 
   // Добавляем делегирование событий для data-action
   this.setupEventDelegation = function() {
@@ -1,10 +1,19 @@
 var store = {
     rooms: [],
+    roomsVersion: null,
+    roomsEpoch: null,
+    roomsCursor: null,
+    roomsQuery: { prefix: "" },
+    roomsAppending: false,
     currentRoom: null,
     playerName: "",
     messages: [],
+    hasMoreHistory: false,
     roomData: null,
-    joiningRoomId: null
+    joiningRoomId: null,
+    rejoining: false,
+    leaderboards: {},
+    leaderboard: null
 };
 
 app_pages = {
@@ -19,13 +28,61 @@ app_pages = {
     disconnected: {}
 };
 
-document.addEventListener('DOMContentLoaded', function () {
+const MSGPACK_PARSER_URL = "https://cdn.jsdelivr.net/npm/socket.io-msgpack-parser@3.0.2/+esm";
+
+// Формат пакетов — JSON. MessagePack только по запросу (?serializer=msgpack в адресе страницы),
+// если сервер его поддерживает и парсер загрузился: сервер всё равно кодирует каждый эмит в JSON,
+// так что MessagePack экономит трафик, но не процессор.
+// Сервер без polling принимает только websocket — сразу подключаемся им
+async function socketOptions() {
+    const options = {};
+    try {
+        const response = await fetch("/serializers");
+        const { serializers, transports } = await response.json();
+        if (transports && !transports.includes("polling")) {
+            options.transports = ["websocket"];
+        }
+        const wanted = new URLSearchParams(window.location.search).get("serializer") === "msgpack";
+        if (wanted && serializers.includes("msgpack")) {
+            const parser = await import(MSGPACK_PARSER_URL);
+            Object.assign(options, { parser: parser.default || parser, query: { serializer: "msgpack" } });
+        }
+    } catch (error) {
+        console.warn("MessagePack недоступен, используем JSON:", error);
+    }
+    return options;
+}
+
+// Имя и token, выданный сервером при входе в комнату: с ними после перезапуска
+// сервера игрок возвращается на своё место, а не занимает чужое
+const PLAYER_KEY = "player";
+
+function rememberPlayer(name, token) {
+    localStorage.setItem(PLAYER_KEY, JSON.stringify({ name: name, token: token }));
+}
+
+function forgetPlayer() {
+    localStorage.removeItem(PLAYER_KEY);
+}
+
+// token сохранён для того же имени — иначе он чужой и не нужен
+function playerToken(name) {
+    try {
+        const player = JSON.parse(localStorage.getItem(PLAYER_KEY));
+        return player && player.name === name ? player.token : null;
+    } catch (error) {
+        return null;
+    }
+}
+
+document.addEventListener('DOMContentLoaded', async function () {
 
     app = new Lariska({
         store: store,
         container: "#app",
         pages: app_pages,
-        url: window.location.hostname + ":8001"
+        url: window.location.host,
+        options: await socketOptions()
     });
 
     // ▶️ Кнопка "Создать игру"
@@ -36,9 +93,40 @@ document.addEventListener('DOMContentLoaded', function () {
     // ▶️ Кнопка "Присоединиться к игре"
     app.addHandler("choice_game", () => {
         app.go("choose_lobby");
-        app.emit("get_rooms");
+        requestRooms();
+    });
+
+    // Список комнат: с известной версией сервер пришлёт только пропущенные изменения
+    function requestRooms() {
+        store.roomsAppending = false;
+        if (store.roomsVersion !== null) {
+            app.emit("get_rooms", { ...store.roomsQuery, version: store.roomsVersion, epoch: store.roomsEpoch });
+        } else {
+            app.emit("get_rooms", store.roomsQuery);
+        }
+    }
+
+    // 🔎 Поиск по началу названия: первая страница заново
+    app.addHandler("search_rooms", () => {
+        store.roomsQuery = { prefix: document.getElementById('rooms_search').value.trim() };
+        store.roomsVersion = null;
+        requestRooms();
     });
 
+    // ➕ Следующая страница списка
+    app.addHandler("more_rooms", () => {
+        if (store.roomsCursor === null) {
+            return;
+        }
+        store.roomsAppending = true;
+        app.emit("get_rooms", { ...store.roomsQuery, cursor: store.roomsCursor });
+    });
+
+    function matchesRoomsQuery(room) {
+        const prefix = (store.roomsQuery.prefix || "").toLowerCase();
+        return room.name.toLowerCase().startsWith(prefix);
+    }
+
     // 🔙 Кнопка "Назад"
     app.addHandler("back", () => app.go("standby"));
 
@@ -69,26 +157,98 @@ document.addEventListener('DOMContentLoaded', function () {
 
     // ✅ Пришёл список комнат
     app.on("rooms_list", null, (data) => {
-        console.log("📥 Получен список комнат:", data.rooms);
-        store.rooms = data.rooms;
-        const renderRooms = () => {
+        console.log("📥 Получена страница комнат:", data.rooms);
+        if (store.roomsAppending) {
+            const known = new Set(store.rooms.map((room) => room.id));
+            store.rooms = store.rooms.concat(data.rooms.filter((room) => !known.has(room.id)));
+        } else {
+            store.rooms = data.rooms;
+        }
+        store.roomsAppending = false;
+        store.roomsCursor = data.cursor;
+        store.roomsVersion = data.version;
+        store.roomsEpoch = data.epoch;
+        renderRooms();
+    });
+
+    // ✅ Пропущенные изменения списка комнат после переподключения
+    app.on("rooms_delta", null, (data) => {
+        data.deltas.forEach(applyRoomsDelta);
+        renderRooms();
+    });
+
+    // ✅ Дельты списка комнат
+    ["room_added", "room_changed", "room_removed"].forEach((event) => {
+        app.on(event, null, (delta) => {
+            // Пропуск версии — запрашиваем недостающие изменения
+            if (store.roomsVersion !== null && delta.version !== store.roomsVersion + 1) {
+                if (delta.version > store.roomsVersion) {
+                    requestRooms();
+                }
+                return;
+            }
+            applyRoomsDelta(delta);
+            renderRooms();
+        });
+    });
+
+    // При переподключении догоняем список комнат с последней известной версии
+    app.socket.on("connect", () => {
+        if (store.roomsVersion !== null && app.state === "choose_lobby") {
+            requestRooms();
+        }
+        // После перезапуска сервера возвращаемся в свою комнату под тем же именем и с выданным token
+        if (store.currentRoom && store.playerName) {
+            store.rejoining = true;
+            app.emit("join_room", {
+                room_id: store.currentRoom.id,
+                player_name: store.playerName,
+                token: playerToken(store.playerName)
+            });
+        }
+    });
+
+    function applyRoomsDelta(delta) {
+        if (store.roomsVersion !== null && delta.version <= store.roomsVersion) {
+            return;
+        }
+        // Показана только часть списка: обновляем видимые комнаты, а новые
+        // добавляем, если они подходят под поиск и загружена последняя страница
+        const roomId = delta.type === "room_removed" ? delta.room_id : delta.room.id;
+        const index = store.rooms.findIndex((room) => room.id === roomId);
+        if (delta.type === "room_removed") {
+            if (index !== -1) {
+                store.rooms.splice(index, 1);
+            }
+        } else if (index !== -1) {
+            store.rooms[index] = delta.room;
+        } else if (store.roomsCursor === null && matchesRoomsQuery(delta.room)) {
+            store.rooms.push(delta.room);
+        }
+        store.roomsVersion = delta.version;
+    }
+
+    function renderRooms() {
         const list = document.getElementById('rooms_list');
         if (!list) {
             return;
         }
+        const more = document.getElementById('more_rooms');
+        if (more) {
+            more.style.display = store.roomsCursor === null ? "none" : "";
+        }
 
-        console.log("✅ Найден элемент #rooms_list, начинаем отрисовку");
         list.innerHTML = '';
 
-        if (data.rooms.length === 0) {
-        list.innerHTML = "<p>Нет доступных комнат</p>";
-        return;
+        if (store.rooms.length === 0) {
+            list.innerHTML = "<p>Нет доступных комнат</p>";
+            return;
         }
 
-        data.rooms.forEach(function(room) {
+        store.rooms.forEach(function(room) {
             const div = document.createElement('div');
             div.className = 'room-item';
-            div.textContent = `${room.name} (${room.players.length} игроков)`;
+            div.textContent = `${room.name} (${room.player_count} игроков)`;
 
             div.addEventListener('click', function () {
                 store.joiningRoomId = room.id;
@@ -97,10 +257,7 @@ document.addEventListener('DOMContentLoaded', function () {
 
             list.appendChild(div);
         });
-    };
-
-    renderRooms();
-});
+    }
 
     // ✅ Ввод имени при входе в комнату
     app.addHandler("join_room", () => {
@@ -115,15 +272,31 @@ document.addEventListener('DOMContentLoaded', function () {
 
         app.emit("join_room", {
             room_id: store.joiningRoomId,
-            player_name: playerName
+            player_name: playerName,
+            token: playerToken(playerName)
         });
     });
 
+    // 🔀 Комната на другом процессе сервера → переподключаемся к нему и входим заново
+    app.on("join_redirect", null, (data) => {
+        app.socket.io.uri = data.url;
+        app.socket.once("connect", () => {
+            app.emit("join_room", {
+                room_id: data.room_id,
+                player_name: store.playerName,
+                token: playerToken(store.playerName)
+            });
+        });
+        app.socket.disconnect().connect();
+    });
+
     // ✅ Комната успешно создана → переходим в лобби
     app.on("room_created", null, (data) => {
         store.currentRoom = data.room;
-        // Инициализируем сообщения из комнаты, если они есть
-        store.messages = data.room.messages || [];
+        rememberPlayer(store.playerName, data.token);
+        // Вместе с комнатой приходит последняя страница истории
+        store.messages = data.history.messages || [];
+        store.hasMoreHistory = !!data.history.has_more;
         console.log("Создана комната, сообщения:", store.messages);
         
         app.go("lobby");
@@ -136,9 +309,12 @@ document.addEventListener('DOMContentLoaded', function () {
 
     // ✅ Успешно вошли в комнату → переходим в лобби
     app.on("room_joined", null, (data) => {
+        store.rejoining = false;
         store.currentRoom = data.room;
-        // Инициализируем сообщения из комнаты, если они есть
-        store.messages = data.room.messages || [];
+        rememberPlayer(store.playerName, data.token);
+        // Вместе с комнатой и составом приходит последняя страница истории
+        store.messages = data.history.messages || [];
+        store.hasMoreHistory = !!data.history.has_more;
         console.log("Присоединились к комнате, сообщения:", store.messages);
         
         app.go("lobby");
@@ -162,8 +338,15 @@ document.addEventListener('DOMContentLoaded', function () {
         document.getElementById('message').value = "";
     });
 
+    // 📦 Пакет событий комнаты — раздаём каждое событие его обработчикам
+    app.on("batch", null, (data) => {
+        (data.events || []).forEach(([event, payload]) => {
+            app.socket.listeners(event).forEach((listener) => listener(payload));
+        });
+    });
+
     // ✅ Пришло сообщение в чат
-    app.on("new_message", (data) => {
+    app.on("new_message", null, (data) => {
         console.log("📨 Получено новое сообщение:", data);
         
         // Проверяем структуру сообщения
@@ -172,6 +355,11 @@ document.addEventListener('DOMContentLoaded', function () {
             return;
         }
         
+        // Сообщение могло уже прийти в истории чата при входе
+        if (data.id !== undefined && store.messages.some((msg) => msg.id === data.id)) {
+            return;
+        }
+
         store.messages.push(data);  // 👈 копим
         console.log("📚 Всего сообщений в store:", store.messages.length);
         
@@ -187,33 +375,78 @@ document.addEventListener('DOMContentLoaded', function () {
         }
     });
 
-    app.on("chat_history", (data) => {
+    app.on("chat_history", null, (data) => {
         console.log("📚 Получена история чата:", data);
         store.messages = data.messages || [];
+        store.hasMoreHistory = !!data.has_more;
         console.log("📚 Загружено сообщений в store:", store.messages.length);
         renderChat();
     });
 
-    // ✅ Обновление списка игроков в лобби
+    // ✅ Кнопка "Показать более ранние" — запрашиваем страницу старше первого сообщения
+    app.addHandler("load_history", () => {
+        if (!store.hasMoreHistory) return;
+        const first = store.messages.find((msg) => msg.id !== undefined);
+        app.emit("get_chat_history", first ? { before: first.id } : {});
+    });
+
+    app.on("chat_history_page", null, (data) => {
+        const known = new Set(store.messages.map((msg) => msg.id));
+        const older = (data.messages || []).filter((msg) => !known.has(msg.id));
+        store.messages = older.concat(store.messages);
+        store.hasMoreHistory = !!data.has_more;
+        renderChat(false);
+    });
+
+    // ✅ Полный состав комнаты: при пересинхронизации
     app.on("update_players", null, (data) => {
+        if (!store.currentRoom || data.room_id !== store.currentRoom.id) {
+            return;
+        }
         store.currentRoom.players = data.players;
-        // Обновляем только список игроков, не весь экран
+        store.currentRoom.creator = data.creator;
+        store.currentRoom.roster_version = data.roster_version;
+        renderPlayers();
+    });
+
+    // ✅ Дельты состава: применяются по порядку версий, пропуск — запрос полного состава
+    function applyRosterDelta(delta, change) {
+        const room = store.currentRoom;
+        if (!room || delta.room_id !== room.id || delta.roster_version <= room.roster_version) {
+            return;
+        }
+        if (delta.roster_version !== room.roster_version + 1) {
+            app.emit("get_players");
+            return;
+        }
+        room.players = change(room.players);
+        room.creator = delta.creator;
+        room.roster_version = delta.roster_version;
+        renderPlayers();
+    }
+
+    app.on("player_joined", null, (delta) => {
+        applyRosterDelta(delta, (players) => players
+            .filter((player) => player.sid !== delta.player.sid && player.sid !== delta.replaces)
+            .concat([delta.player]));
+    });
+
+    app.on("player_left", null, (delta) => {
+        applyRosterDelta(delta, (players) => players.filter((player) => player.sid !== delta.sid));
+    });
+
+    // Обновляем только список игроков, не весь экран
+    function renderPlayers() {
         const playersList = document.getElementById('players_list');
         if (playersList) {
-            playersList.innerHTML = `
-                <strong>Игроки:</strong>
-                <ul>
-                    ${data.players.map(player => `<li>${player.name}</li>`).join('')}
-                </ul>
-            `;
+            fillList(playersList, "Игроки:", store.currentRoom.players.map(player => player.name));
         }
-        // Перерендериваем чат для отображения новых сообщений
-        renderChat();
-    });
+    }
 
     // ✅ Уведомление о том, что лобби удалено
     app.on("lobby_deleted", null, (data) => {
         alert("Лобби было удалено создателем. Возвращаемся в главное меню.");
+        forgetPlayer();
         store.currentRoom = null;
         store.roomData = null;
         store.playerName = "";
@@ -224,6 +457,7 @@ document.addEventListener('DOMContentLoaded', function () {
     app.addHandler("leave_room", () => {
         if (store.currentRoom) {
             app.emit("leave_room", { room_id: store.currentRoom.id });
+            forgetPlayer();
             store.currentRoom = null;
             store.roomData = null;
             store.playerName = "";
@@ -233,22 +467,41 @@ document.addEventListener('DOMContentLoaded', function () {
 
     // ✅ Обработчик события "join_error"
     app.on("join_error", null, (data) => {
-        alert(data.message);
+        // Комната не пережила переподключение — молча возвращаемся в меню
+        if (!store.rejoining) {
+            alert(data.message);
+        }
+        store.rejoining = false;
         store.currentRoom = null;
         store.roomData = null;
         store.playerName = "";
         app.go("standby");
     });
 
-    // 🔹 Остальные игровые события пока не трогаем
-    app.on("riddle", "#showriddle", null, (data) => {
+    // 🎲 Викторина: "Начать игру", "Следующий вопрос" и "Начать сначала" запрашивают загадку
+    ["next", "restart"].forEach((action) => {
+        app.addHandler(action, () => app.emit("next"));
+    });
+
+    app.addHandler("answer", () => {
+        const text = document.getElementById('answer').value.trim();
+        if (!text) return;
+        app.emit("answer", { text: text });
+    });
+
+    app.on("riddle", "#showriddle", (data) => {
         console.log("Получена загадка", data);
         app.store.riddle = data;
+        // Таблица загружается один раз, дальше приходят дельты
+        if (!store.leaderboards[leaderboardId()]) {
+            requestLeaderboard();
+        }
     });
 
-    app.on("result", "#showanswer", null, (data) => {
+    app.on("result", "#showanswer", (data) => {
         console.log("Результат", data);
         app.store.riddle = data;
+        store.leaderboard = store.leaderboards[leaderboardId()] || null;
     });
 
     app.on("score", null, (data) => {
@@ -256,11 +509,80 @@ document.addEventListener('DOMContentLoaded', function () {
         app.store.score = data.value;
     });
 
-    app.on("over", "#over", null, (data) => {
+    // 🏆 Таблица лидеров: комнаты, а в одиночной игре — общая
+    function leaderboardId() {
+        return store.currentRoom ? store.currentRoom.id : "global";
+    }
+
+    function requestLeaderboard() {
+        app.emit("get_leaderboard", { board: store.currentRoom ? "room" : "global" });
+    }
+
+    app.on("leaderboard", null, (table) => {
+        store.leaderboards[table.board] = table;
+        renderLeaderboard();
+    });
+
+    // Дельта меняет только перечисленные места; пропуск версии — запрос таблицы целиком
+    app.on("leaderboard_delta", null, (delta) => {
+        const table = store.leaderboards[delta.board];
+        if (!table || delta.version <= table.version) {
+            return;
+        }
+        if (delta.version !== table.version + 1) {
+            requestLeaderboard();
+            return;
+        }
+        const byRank = new Map(table.top
+            .filter((entry) => !delta.removed.includes(entry.name))
+            .map((entry) => [entry.rank, entry]));
+        delta.changes.forEach((entry) => byRank.set(entry.rank, entry));
+        table.top = Array.from(byRank.values()).sort((a, b) => a.rank - b.rank);
+        table.version = delta.version;
+        table.size = delta.size;
+        const me = table.top.find((entry) => entry.name === store.playerName);
+        if (me) {
+            table.me = { rank: me.rank, score: me.score };
+        }
+        renderLeaderboard();
+    });
+
+    function renderLeaderboard() {
+        store.leaderboard = store.leaderboards[leaderboardId()] || null;
+        const element = document.getElementById('leaderboard');
+        if (!element || !store.leaderboard) {
+            return;
+        }
+        const table = store.leaderboard;
+        fillList(element, "Лидеры:", table.top.map(entry => `${entry.rank}. ${entry.name} — ${entry.score}`));
+        if (table.me) {
+            const me = document.createElement('p');
+            me.textContent = `Ваше место: ${table.me.rank} из ${table.size}`;
+            element.appendChild(me);
+        }
+    }
+
+    // Заголовок и список строк; имена игроков попадают в страницу только как текст
+    function fillList(element, title, lines) {
+        const heading = document.createElement('strong');
+        heading.textContent = title;
+        const list = document.createElement('ul');
+        lines.forEach((line) => {
+            const item = document.createElement('li');
+            item.textContent = line;
+            list.appendChild(item);
+        });
+        element.replaceChildren(heading, list);
+    }
+
+    app.on("over", "#over", (data) => {
         console.log("Игра завершена", data);
+        store.leaderboard = store.leaderboards[leaderboardId()] || null;
+        // Своё место могло измениться и за пределами первых мест
+        requestLeaderboard();
     });
 
-    function renderChat() {
+    function renderChat(scrollToEnd = true) {
         try {
             const chat = document.getElementById('chat');
             if (!chat) {
@@ -306,7 +628,9 @@ document.addEventListener('DOMContentLoaded', function () {
             });
             
             // Прокручиваем к последнему сообщению
-            chat.scrollTop = chat.scrollHeight;
+            if (scrollToEnd) {
+                chat.scrollTop = chat.scrollHeight;
+            }
             console.log("Чат обновлен, всего сообщений отображено:", store.messages.length);
         } catch (error) {
             console.error("Ошибка в функции renderChat:", error);
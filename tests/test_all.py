@@ -88,3 +88,93 @@ def test_logic_full(client, events, riddles):
     # Проверяем что очки сбросились в 0 после окончания игры
     assert score['value'] == 0, (f"После окончания игры количество очков должно быть 0, "
                                  f"получено значение {score['value']}!")
+
+
+def test_switching_rooms_leaves_previous_room():
+    """
+    Игрок, входящий в другую комнату, выходит из прежней: оставшиеся получают
+    player_left, чат прежней комнаты ему больше не приходит, пустая комната удаляется
+    """
+    import socketio
+
+    clients = {name: socketio.Client() for name in ('anna', 'boris', 'watcher')}
+    events = {name: [] for name in clients}
+    for name, sio in clients.items():
+        sio.on('*', lambda event, data, name=name: events[name].append((event, data)))
+        sio.connect(URL)
+    anna, boris, watcher = clients['anna'], clients['boris'], clients['watcher']
+
+    def last(name, event):
+        return next((data for got, data in reversed(events[name]) if got == event), None)
+
+    def listed(room_id):
+        watcher.emit('get_rooms', {'prefix': 'switch'})
+        time.sleep(0.2)
+        return {room['id']: room['player_count'] for room in last('watcher', 'rooms_list')['rooms']}.get(room_id)
+
+    try:
+        anna.emit('create_room', {'name': 'switch 1', 'questions_count': 5, 'context': '', 'player_name': 'Аня'})
+        time.sleep(0.2)
+        first = last('anna', 'room_created')['room']['id']
+        boris.emit('join_room', {'room_id': first, 'player_name': 'Боря'})
+        time.sleep(0.2)
+        assert listed(first) == 2
+
+        boris.emit('create_room', {'name': 'switch 2', 'questions_count': 5, 'context': '', 'player_name': 'Боря'})
+        time.sleep(0.2)
+        second = last('boris', 'room_created')['room']['id']
+        left = last('anna', 'player_left')
+        assert left and left['sid'] == boris.get_sid() and left['room_id'] == first
+        assert listed(first) == 1
+
+        anna.emit('send_message', {'text': 'только для первой комнаты'})
+        time.sleep(0.2)
+        assert not any(
+            event == 'new_message' and data['text'] == 'только для первой комнаты'
+            for event, data in events['boris']
+        )
+
+        # Создатель уходит в другую комнату — первая пустеет и исчезает из списка
+        anna.emit('join_room', {'room_id': second, 'player_name': 'Аня'})
+        time.sleep(0.2)
+        assert last('anna', 'room_joined')['room']['id'] == second
+        assert listed(first) is None
+        assert listed(second) == 2
+    finally:
+        for sio in clients.values():
+            sio.disconnect()
+
+
+def test_message_after_leave_is_dropped():
+    """ После leave_room сообщения игрока не доходят до комнаты и не попадают в историю """
+    import socketio
+
+    clients = {name: socketio.Client() for name in ('anna', 'boris')}
+    events = {name: [] for name in clients}
+    for name, sio in clients.items():
+        sio.on('*', lambda event, data, name=name: events[name].append((event, data)))
+        sio.connect(URL)
+    anna, boris = clients['anna'], clients['boris']
+
+    try:
+        anna.emit('create_room', {'name': 'leave', 'questions_count': 5, 'context': '', 'player_name': 'Аня'})
+        time.sleep(0.2)
+        room_id = next(data for event, data in events['anna'] if event == 'room_created')['room']['id']
+        boris.emit('join_room', {'room_id': room_id, 'player_name': 'Боря'})
+        time.sleep(0.2)
+        boris.emit('leave_room', {'room_id': room_id})
+        time.sleep(0.2)
+
+        boris.emit('send_message', {'text': 'уже не в комнате'})
+        time.sleep(0.2)
+        assert not any(
+            event == 'new_message' and data['text'] == 'уже не в комнате' for event, data in events['anna']
+        )
+
+        anna.emit('get_chat_history', {})
+        time.sleep(0.2)
+        page = next(data for event, data in reversed(events['anna']) if event == 'chat_history_page')
+        assert 'уже не в комнате' not in [message['text'] for message in page['messages']]
+    finally:
+        for sio in clients.values():
+            sio.disconnect()
@@ -0,0 +1,21 @@
+from src.all_riddles import riddles
+from src.answers import AnswerIndex, normalize
+
+
+def test_normalize_drops_case_punctuation_and_prepositions():
+    assert normalize("  На МОКРОЕ!! ") == "мокрое"
+    assert normalize("Во всём") == "всем"
+
+
+def test_exact_and_fuzzy_matches():
+    """ Ответ засчитывается с предлогом, в другом регистре и с одной опечаткой """
+    index = AnswerIndex.from_riddles(riddles)
+    assert index.check(4, "на мокрое")
+    assert index.check(5, "В каждом.")
+    assert index.check(1, "зарница") is False
+    assert index.check(1, "зорплата")
+    assert index.check(3, "яму") is False
+    assert index.check(2, "wrong answer") is False
+
+    strict = AnswerIndex.from_riddles(riddles, fuzzy=False)
+    assert strict.check(1, "зорплата") is False
@@ -0,0 +1,34 @@
+import asyncio
+
+from src.batching import RoomOutbox
+from src.scheduler import Scheduler
+
+
+def run_outbox(window, max_events, sends):
+    emitted = []
+
+    async def emit(event, data, room=None):
+        emitted.append((room, event, data))
+
+    async def main():
+        outbox = RoomOutbox(emit, Scheduler(), window=window, max_events=max_events)
+        for room_id, event, data in sends:
+            await outbox.send(room_id, event, data)
+        await asyncio.sleep(window + 0.02)
+
+    asyncio.run(main())
+    return emitted
+
+
+def test_events_within_window_go_out_as_one_batch():
+    emitted = run_outbox(0.02, 10, [("r1", "new_message", 1), ("r1", "update_players", 2), ("r2", "new_message", 3)])
+    assert ("r1", "batch", {"events": [["new_message", 1], ["update_players", 2]]}) in emitted
+    assert ("r2", "new_message", 3) in emitted
+    assert len(emitted) == 2
+
+
+def test_batch_flushes_early_at_size_threshold_and_passthrough_when_disabled():
+    emitted = run_outbox(0.5, 2, [("r1", "new_message", i) for i in range(3)])
+    assert emitted[0] == ("r1", "batch", {"events": [["new_message", 0], ["new_message", 1]]})
+
+    assert run_outbox(0, 2, [("r1", "new_message", 1)]) == [("r1", "new_message", 1)]
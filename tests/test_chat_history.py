@@ -0,0 +1,81 @@
+import os
+
+from src.chat_history import ChatHistory
+
+
+def fill(history, count):
+    for i in range(count):
+        history.append({"sender": "p", "text": f"message {i}", "timestamp": ""})
+
+
+def test_ring_buffer_bounds_memory():
+    """ В памяти остаются только последние сообщения в пределах лимитов """
+    history = ChatHistory(max_messages=3)
+    fill(history, 10)
+    assert len(history) == 3
+    assert [m["id"] for m in history.latest(10)] == [8, 9, 10]
+
+    history = ChatHistory(max_messages=100, max_bytes=200)
+    fill(history, 10)
+    assert 1 <= len(history) < 10
+
+
+def test_pages_read_from_spill_file(tmp_path):
+    """ Старые страницы дочитываются из файла по курсору """
+    history = ChatHistory("room_1", max_messages=3, spill_dir=str(tmp_path))
+    fill(history, 10)
+
+    messages, has_more = history.page(None, 2)
+    assert [m["id"] for m in messages] == [9, 10] and has_more
+
+    messages, has_more = history.page(9, 4)
+    assert [m["id"] for m in messages] == [5, 6, 7, 8] and has_more
+
+    messages, has_more = history.page(5, 10)
+    assert [m["id"] for m in messages] == [1, 2, 3, 4] and not has_more
+
+    history.close()
+    assert not list(tmp_path.iterdir())
+
+
+def test_expire_drops_old_messages_and_spill(tmp_path):
+    """ Сообщения старше срока уходят из памяти и с диска, последнее остаётся """
+    history = ChatHistory("room", max_messages=3, spill_dir=str(tmp_path))
+    fill(history, 10)
+    assert history.expire(3600) == 0
+
+    assert history.expire(0) == 9
+    assert [m["id"] for m in history.latest(10)] == [10]
+    assert history.page(None, 50) == (history.latest(10), False)
+    assert not list(tmp_path.iterdir())
+
+    fill(history, 5)
+    messages, has_more = history.page(None, 50)
+    assert [m["id"] for m in messages] == list(range(10, 16)) and not has_more
+
+
+def test_spill_does_not_keep_files_open(tmp_path):
+    """ Между записями файл закрыт: дескрипторы не копятся с числом комнат """
+    before = len(os.listdir("/proc/self/fd"))
+    histories = [ChatHistory(f"room_{i}", max_messages=2, spill_dir=str(tmp_path)) for i in range(50)]
+    for history in histories:
+        fill(history, 5)
+    assert len(os.listdir("/proc/self/fd")) <= before
+
+    messages, has_more = histories[0].page(None, 5)
+    assert [m["id"] for m in messages] == [1, 2, 3, 4, 5] and not has_more
+    for history in histories:
+        history.close()
+    assert not list(tmp_path.iterdir())
+
+
+def test_spill_errors_do_not_break_chat(tmp_path):
+    """ Если на диск писать нельзя, сообщения всё равно принимаются, а история — из памяти """
+    blocker = tmp_path / "blocked"
+    blocker.write_text("")
+    # Каталог для сброса — обычный файл: makedirs и open падают с OSError
+    history = ChatHistory("room", max_messages=2, spill_dir=str(blocker / "spill"))
+    fill(history, 5)
+    messages, has_more = history.page(None, 10)
+    assert [m["id"] for m in messages] == [4, 5] and not has_more
+    history.close()
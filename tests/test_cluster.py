@@ -0,0 +1,46 @@
+import asyncio
+
+from src.cluster import Broker, BrokerBackend
+from src.lobby import LobbyFeed
+
+
+def summary(room_id, worker):
+    return {"id": room_id, "name": room_id, "context": "", "player_count": 1, "worker": worker}
+
+
+def test_broker_backends_share_lobby(tmp_path):
+    """ Воркеры применяют изменения списка комнат в одном порядке и видят общее хранилище """
+    async def main():
+        path = str(tmp_path / "broker.sock")
+        server = await Broker().serve(path)
+        workers = [(BrokerBackend(path), LobbyFeed()) for _ in range(2)]
+        for backend, feed in workers:
+            async def on_message(change, feed=feed):
+                feed.apply(change)
+            await backend.start(on_message)
+
+        first, second = workers[0][0], workers[1][0]
+        await asyncio.gather(*(
+            backend.publish({"type": "room_added", "room": summary(f"room_{n}_{i}", n)})
+            for i in range(20)
+            for n, backend in enumerate((first, second))
+        ))
+        await first.publish({"type": "room_removed", "room_id": "room_0_0"})
+        await first.put_room({"id": "room_0_1", "worker": 0})
+        await second.put_room({"id": "room_1_1", "worker": 1})
+        await second.remove_room("room_1_1")
+
+        for _ in range(100):
+            if all(feed.version == 41 for _, feed in workers):
+                break
+            await asyncio.sleep(0.01)
+        snapshots = [feed.page(limit=100) for _, feed in workers]
+        assert snapshots[0]["version"] == snapshots[1]["version"] == 41
+        assert snapshots[0]["rooms"] == snapshots[1]["rooms"]
+        assert await second.rooms() == [{"id": "room_0_1", "worker": 0}]
+
+        for backend, _ in workers:
+            await backend.close()
+        server.close()
+
+    asyncio.run(main())
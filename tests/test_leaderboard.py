@@ -0,0 +1,64 @@
+import random
+
+from src.leaderboard import GLOBAL, Leaderboard, Leaderboards
+
+
+def test_ranks_match_full_sort():
+    """ Места и срезы совпадают с полной сортировкой при делении и исчезновении блоков """
+    rng = random.Random(7)
+    board = Leaderboard("b", load=4)
+    for _ in range(2000):
+        name = f"p{rng.randrange(150)}"
+        board.add(name, rng.randrange(1, 5))
+
+    expected = sorted(board._keys.values())
+    assert [entry["name"] for entry in board.top(len(board))] == [key[2] for key in expected]
+    for rank, key in enumerate(expected, 1):
+        assert board.rank(key[2]) == rank
+    assert [entry["rank"] for entry in board.top(5, start=37)] == [38, 39, 40, 41, 42]
+    assert board.top(10, start=len(board)) == []
+
+
+def test_equal_scores_keep_first_scorer_ahead():
+    board = Leaderboard("b")
+    board.add("Аня", 1)
+    board.add("Боря", 2)
+    board.add("Аня", 1)
+    assert [entry["name"] for entry in board.top(10)] == ["Боря", "Аня"]
+    assert board.rank("Вася") is None and board.score("Вася") == 0
+
+
+def test_delta_lists_only_changed_places():
+    """ Дельта содержит изменившиеся первые места и вытесненных из них игроков """
+    board = Leaderboard("b")
+    for name, score in [("a", 5), ("b", 4), ("c", 3)]:
+        board.set(name, score)
+    assert board.delta(3)["version"] == 1
+    assert board.delta(3) is None
+
+    board.add("d", 10)
+    board.add("c", 2)
+    delta = board.delta(3)
+    assert delta["version"] == 2
+    assert delta["changes"] == [
+        {"rank": 1, "name": "d", "score": 10},
+        {"rank": 2, "name": "a", "score": 5},
+        {"rank": 3, "name": "c", "score": 5},
+    ]
+    assert delta["removed"] == ["b"]
+
+    table = board.table("b")
+    assert table["version"] == 2 and [entry["name"] for entry in table["top"]] == ["d", "a", "c"]
+    assert table["me"] == {"rank": 4, "score": 4}
+
+
+def test_award_marks_pending_boards_once():
+    boards = Leaderboards()
+    assert boards.award("Аня", 1, "room_1") == [GLOBAL, "room_1"]
+    assert boards.award("Боря", 1, "room_1") == []
+    assert boards.award("Аня", 1) == []
+    assert boards.everyone.score("Аня") == 2 and boards.get("room_1").score("Аня") == 1
+
+    assert boards.rooms() == ["room_1"]
+    assert boards.drop("room_1") is not None and boards.drop(GLOBAL) is None
+    assert "room_1" not in boards.pending
@@ -0,0 +1,14 @@
+import asyncio
+
+from benchmarks.load_test import run
+
+
+def test_load_generator_smoke():
+    """ Короткий прогон нагрузочного сценария: без таймаутов, все комнаты удалены """
+    report = asyncio.run(run(rooms=2, players=3, rate=5, duration=0.3, churn=0.5))
+    latency = report["latency_ms"]
+
+    assert not [event for event in latency if event.endswith("_timeout")]
+    assert latency["create_room"]["count"] == 2
+    assert latency["send_message"]["count"] > 0
+    assert report["live_rooms_after"] == 0
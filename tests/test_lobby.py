@@ -0,0 +1,59 @@
+from src.lobby import LobbyFeed
+from src.registry import PlayerRecord, RoomRecord
+
+
+def make_room(room_id, players=()):
+    room = RoomRecord(room_id, room_id, 5, "", creator_sid="")
+    for sid in players:
+        room.members[sid] = PlayerRecord(sid, sid, room_id)
+    return room
+
+
+def test_page_cached_until_change():
+    """ Страница списка комнат пересобирается только после изменения """
+    feed = LobbyFeed()
+    feed.room_added(make_room("room_1"))
+    page = feed.page()
+    assert feed.page() is page
+    assert page["version"] == 1
+
+    feed.room_changed(make_room("room_1", ["p"]))
+    assert feed.page() is not page
+    assert feed.page()["rooms"][0]["player_count"] == 1
+
+
+def test_page_filters_and_cursor():
+    """ Страницы идут по названию; фильтры по тематике, началу названия и числу игроков """
+    feed = LobbyFeed()
+    for number, (name, context, players) in enumerate([
+        ("Бар", "кино", 1), ("альфа", "кино", 3), ("Бета", "спорт", 2), ("бар 2", "спорт", 0),
+    ]):
+        room = make_room(f"room_{number}", [f"p{i}" for i in range(players)])
+        room.name, room.context = name, context
+        feed.room_added(room)
+
+    first = feed.page(limit=2)
+    assert [r["name"] for r in first["rooms"]] == ["альфа", "Бар"]
+    second = feed.page(cursor=first["cursor"], limit=2)
+    assert [r["name"] for r in second["rooms"]] == ["бар 2", "Бета"] and second["cursor"] is None
+
+    assert [r["name"] for r in feed.page(prefix="БАР")["rooms"]] == ["Бар", "бар 2"]
+    assert [r["name"] for r in feed.page(context="спорт", min_players=1)["rooms"]] == ["Бета"]
+    assert [r["name"] for r in feed.page(max_players=1)["rooms"]] == ["Бар", "бар 2"]
+
+    feed.room_removed("room_1")
+    assert [r["name"] for r in feed.page(context="кино")["rooms"]] == ["Бар"]
+
+
+def test_since_returns_missed_deltas():
+    """ Клиент со старой версией получает только пропущенные дельты """
+    feed = LobbyFeed(max_deltas=2)
+    feed.room_added(make_room("room_1"))
+    feed.room_added(make_room("room_2"))
+    feed.room_removed("room_1")
+
+    assert [d["type"] for d in feed.since(1)] == ["room_added", "room_removed"]
+    assert feed.since(3) == []
+    # Журнал уже не покрывает версию 0 — нужен полный список
+    assert feed.since(0) is None
+    assert feed.room_removed("room_1") is None
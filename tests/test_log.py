@@ -0,0 +1,8 @@
+from src.log import EventSampler, parse_sample_rates
+
+
+def test_sampler_passes_every_nth_event():
+    sampled = EventSampler(parse_sample_rates("send_message=3, join_room=1"))
+    assert [sampled("send_message") for _ in range(6)] == [True, False, False, True, False, False]
+    assert all(sampled("join_room") for _ in range(3))
+    assert all(sampled("create_room") for _ in range(3))
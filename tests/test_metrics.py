@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+from socketio import packet
+
+from src.metrics import Histogram, Metrics
+
+
+def test_histogram_uses_preallocated_buckets():
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value)
+    assert histogram.counts == [1, 1, 1]
+    assert histogram.count == 3
+
+
+def test_instrumented_handler_and_emits_rendered():
+    metrics = Metrics()
+
+    @metrics.instrument("boom")
+    async def boom(sid):
+        raise ValueError(sid)
+
+    with pytest.raises(ValueError):
+        asyncio.run(boom("sid"))
+
+    packet_class = metrics.packet_class()
+    packet_class(packet.EVENT, data=["new_message", {"text": "привет"}]).encode()
+    metrics.gauge("rooms", "Открытые комнаты", lambda: 3)
+
+    text = metrics.render()
+    assert 'alko_handler_calls_total{event="boom"} 1' in text
+    assert 'alko_handler_errors_total{event="boom"} 1' in text
+    assert 'alko_handler_seconds_bucket{event="boom",le="+Inf"} 1' in text
+    assert 'alko_emits_total{event="new_message"} 1' in text
+    assert "alko_rooms 3" in text
@@ -0,0 +1,158 @@
+import asyncio
+import time
+
+import pytest
+
+from src.leaderboard import Leaderboards
+from src.persistence import FileStore, Journal, SqliteStore
+from src.registry import PlayerRegistry, RoomRegistry
+from src.scheduler import Scheduler
+
+
+def run_session(store, snapshot_every):
+    """ Создание комнат, вход, выход и чат, затем закрытие журнала """
+    async def main():
+        players, rooms = PlayerRegistry(), RoomRegistry()
+        journal = Journal(store, rooms, Scheduler(), commit_interval=0.001, snapshot_every=snapshot_every)
+        await journal.recover()
+
+        creator, guest = players.connect("sid_1"), players.connect("sid_2")
+        creator.name, guest.name = "Аня", "Боря"
+        room = rooms.create("a", 5, "", creator)
+        rooms.join(room, guest)
+        for number in range(10):
+            rooms.post(room, {"sender": "Аня", "text": f"привет {number}"})
+        gone = rooms.create("b", 5, "", players.connect("sid_3"))
+        rooms.remove(gone.id)
+        rooms.leave(creator)
+        await asyncio.sleep(0.01)
+        await journal.close()
+        return journal
+
+    return asyncio.run(main())
+
+
+def recover(store):
+    async def main():
+        rooms = RoomRegistry()
+        await Journal(store, rooms, Scheduler()).recover()
+        rooms.journal = None
+        return rooms
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("backend", ["file", "sqlite"])
+@pytest.mark.parametrize("snapshot_every", [3, 1000])
+def test_state_survives_restart(tmp_path, backend, snapshot_every):
+    """ Снимок плюс журнал восстанавливают комнаты, состав, создателя, чат и счётчик id """
+    make_store = {
+        "file": lambda: FileStore(str(tmp_path)),
+        "sqlite": lambda: SqliteStore(str(tmp_path / "state.db")),
+    }[backend]
+    journal = run_session(make_store(), snapshot_every)
+    assert (journal.snapshots > 0) == (snapshot_every == 3)
+
+    rooms = recover(make_store())
+    assert [room.id for room in rooms] == ["room_1"]
+    room = rooms.get("room_1")
+    assert list(room.members) == ["sid_2"] and room.creator_sid == "sid_2"
+    messages, _ = room.history.page(None, 50)
+    assert [m["text"] for m in messages] == [f"привет {n}" for n in range(10)]
+    assert rooms.post(room, {"text": "ещё"})["id"] == 11
+
+    creator = PlayerRegistry().connect("sid_4")
+    assert rooms.create("c", 5, "", creator).id == "room_3"
+
+
+@pytest.mark.parametrize("snapshot_every", [3, 1000])
+def test_returning_player_takes_stale_place(tmp_path, snapshot_every):
+    """ После восстановления старую запись занимает только игрок с её token, остальные истекают """
+    journal = run_session(FileStore(str(tmp_path)), snapshot_every)
+    # token, который Боря получил при входе в комнату
+    token = journal.rooms.get("room_1").members["sid_2"].token
+    rooms = recover(FileStore(str(tmp_path)))
+    room = rooms.get("room_1")
+
+    impostor = PlayerRegistry().connect("other_sid")
+    impostor.name = "Боря"
+    assert rooms.join(room, impostor, "чужой") is None
+    assert list(room.members) == ["sid_2", "other_sid"] and room.creator_sid == "sid_2"
+    assert impostor.token not in (None, token)
+
+    player = PlayerRegistry().connect("new_sid")
+    player.name = "Боря"
+    assert rooms.join(room, player, token) == "sid_2"
+    assert list(room.members) == ["other_sid", "new_sid"] and room.creator_sid == "new_sid"
+    assert player.token == token
+    assert rooms.expire_stale() == []
+
+
+def test_torn_tail_is_dropped(tmp_path):
+    run_session(FileStore(str(tmp_path)), 1000)
+    with open(tmp_path / "journal.log", "ab") as file:
+        file.write(b"999 msg room_1 {\"te")
+
+    rooms = recover(FileStore(str(tmp_path)))
+    assert len(rooms.get("room_1").history) == 10
+    assert not (tmp_path / "journal.log").read_bytes().endswith(b"\"te")
+
+
+@pytest.mark.parametrize("snapshot_every", [2, 1000])
+def test_leaderboards_survive_restart(tmp_path, snapshot_every):
+    """ Очки и порядок равных очков восстанавливаются; таблица удалённой комнаты — нет """
+    async def session():
+        players, rooms, boards = PlayerRegistry(), RoomRegistry(), Leaderboards()
+        journal = Journal(
+            FileStore(str(tmp_path)), rooms, Scheduler(),
+            commit_interval=0.001, snapshot_every=snapshot_every, leaderboards=boards,
+        )
+        await journal.recover()
+        room = rooms.create("a", 5, "", players.connect("sid_1"))
+        gone = rooms.create("b", 5, "", players.connect("sid_2"))
+        boards.award("Аня", 2, room.id)
+        boards.award("Боря", 1, gone.id)
+        boards.award("Вася", 2)
+        rooms.remove(gone.id)
+        await asyncio.sleep(0.01)
+        await journal.close()
+
+    async def restart():
+        rooms, boards = RoomRegistry(), Leaderboards()
+        await Journal(FileStore(str(tmp_path)), rooms, Scheduler(), leaderboards=boards).recover()
+        return boards
+
+    asyncio.run(session())
+    boards = asyncio.run(restart())
+    assert list(boards.everyone.entries()) == [("Аня", 2), ("Вася", 2), ("Боря", 1)]
+    assert list(boards.get("room_1").entries()) == [("Аня", 2)]
+    assert boards.rooms() == ["room_1"]
+
+
+def test_slow_store_does_not_delay_other_timers(tmp_path):
+    """ Пока журнал пишет пачку в медленное хранилище, остальные таймеры срабатывают вовремя """
+    class SlowStore(FileStore):
+        def append(self, lines):
+            time.sleep(0.3)
+            super().append(lines)
+
+    async def main():
+        rooms, scheduler = RoomRegistry(), Scheduler()
+        journal = Journal(SlowStore(str(tmp_path)), rooms, scheduler, commit_interval=0.001)
+        await journal.recover()
+        rooms.create("a", 5, "", PlayerRegistry().connect("sid_1"))
+        await asyncio.sleep(0.005)
+
+        loop = asyncio.get_running_loop()
+        fired = loop.create_future()
+        started = loop.time()
+
+        async def mark():
+            fired.set_result(loop.time() - started)
+
+        scheduler.call_later(0.01, mark)
+        delay = await fired
+        await journal.close()
+        return delay
+
+    assert asyncio.run(main()) < 0.1
@@ -0,0 +1,76 @@
+import asyncio
+
+from src.quiz import ASKING, REVEALED, QuizGame
+from src.scheduler import Scheduler
+
+RIDDLES = [
+    {"number": 10, "text": "first", "answer": ["мокрое"]},
+    {"number": 20, "text": "second", "answer": ["яма"]},
+]
+
+
+def test_round_is_scored_once():
+    """ Раунд закрывается первым верным ответом, повторные ответы игнорируются """
+    game = QuizGame("room_1", RIDDLES)
+    assert game.next_riddle() == {"number": 1, "text": "first", "total": 2}
+
+    outcome = game.answer("a", "на мокрое", players_count=3)
+    assert outcome["is_correct"] and outcome["winner"] == "a"
+    assert game.answer("b", "мокрое", players_count=3) is None
+    assert game.scores == {"a": 1} and game.state == REVEALED
+
+
+def test_round_closes_when_everyone_answered_or_by_timeout():
+    game = QuizGame("room_1", RIDDLES)
+    game.next_riddle()
+    assert game.answer("a", "нет", players_count=2) is None
+    assert game.answer("b", ["нет", "тоже нет"], players_count=2)["is_correct"] is False
+
+    game.next_riddle()
+    assert game.state == ASKING
+    assert game.timeout(round_number=1) is None
+    assert game.timeout(round_number=2)["winner"] is None
+    assert game.next_riddle() is None
+
+
+def test_scheduler_runs_timers_in_order_and_skips_cancelled():
+    fired = []
+
+    async def record(name):
+        fired.append(name)
+
+    async def main():
+        scheduler = Scheduler()
+        scheduler.call_later(0.03, record, "late")
+        cancelled = scheduler.call_later(0.01, record, "cancelled")
+        scheduler.call_later(0.02, record, "early")
+        cancelled.cancel()
+        await asyncio.sleep(0.06)
+        return len(scheduler)
+
+    assert asyncio.run(main()) == 0
+    assert fired == ["early", "late"]
+
+
+def test_oversized_or_malformed_answers_are_rejected():
+    """ Слишком длинный список, не строки и длинные строки не проверяются и не тратят попытку """
+    game = QuizGame("room_1", RIDDLES)
+    game.next_riddle()
+    assert game.answer("a", ["нет"] * 5 + ["мокрое"], players_count=1) is None
+    assert game.answer("a", [None, "мокрое"], players_count=1) is None
+    assert game.answer("a", "мокрое" + " " * 500, players_count=1) is None
+    assert game.answer("a", [], players_count=1) is None
+    assert game.state == ASKING and not game.answered
+    assert game.answer("a", ["нет", "мокрое"], players_count=1)["is_correct"]
+
+
+def test_riddles_with_equal_numbers_keep_their_answers():
+    """ Загадки из разных категорий с одинаковыми номерами не затирают ответы друг друга """
+    game = QuizGame("room_1", [
+        {"number": 1, "text": "first", "answer": ["мокрое"]},
+        {"number": 1, "text": "second", "answer": ["яма"]},
+    ])
+    game.next_riddle()
+    assert game.answer("a", "мокрое", players_count=1)["is_correct"]
+    game.next_riddle()
+    assert game.answer("a", "яма", players_count=1)["is_correct"]
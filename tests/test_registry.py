@@ -0,0 +1,44 @@
+from src.registry import PlayerRegistry, RoomRegistry
+
+
+def test_room_ids_are_not_reused():
+    """ После удаления комнаты новая комната получает новый идентификатор """
+    players, rooms = PlayerRegistry(), RoomRegistry()
+    first = rooms.create("a", 5, "", players.connect("sid_1"))
+    rooms.remove(first.id)
+    second = rooms.create("b", 5, "", players.connect("sid_2"))
+    assert second.id != first.id
+    assert rooms.get(first.id) is None
+
+
+def test_join_leave_keeps_index_and_creator():
+    """ Индекс sid -> комната и создатель обновляются при входе и выходе """
+    players, rooms = PlayerRegistry(), RoomRegistry()
+    creator, guest = players.connect("sid_1"), players.connect("sid_2")
+    room = rooms.create("a", 5, "", creator)
+    rooms.join(room, guest)
+
+    assert rooms.room_of("sid_2") is room
+    assert [p["sid"] for p in room.player_list()] == ["sid_1", "sid_2"]
+
+    assert rooms.leave(creator) is room
+    assert rooms.room_of("sid_1") is None and creator.room_id is None
+    assert room.creator_sid == "sid_2"
+
+
+def test_roster_version_counts_membership_changes():
+    """ Версия состава растёт при входе, замене и выходе, но не при повторном входе того же sid """
+    players, rooms = PlayerRegistry(), RoomRegistry()
+    creator, guest = players.connect("sid_1"), players.connect("sid_2")
+    room = rooms.create("a", 5, "", creator)
+    start = room.roster_version
+
+    assert rooms.join(room, guest) is None
+    rooms.join(room, guest)
+    assert room.roster_version == start + 1
+
+    rooms.leave(guest)
+    roster = room.roster()
+    assert roster["roster_version"] == start + 2
+    assert roster["players"] == [{"sid": "sid_1", "name": creator.name}]
+    assert roster["creator"] == "sid_1"
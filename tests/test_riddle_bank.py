@@ -0,0 +1,32 @@
+import random
+
+from src.all_riddles import riddles
+from src.riddle_bank import RiddleBank, write_bank
+
+
+def test_converted_bank_roundtrip(tmp_path):
+    """ Конвертированный банк читается через mmap без потери загадок """
+    path = tmp_path / "riddles.bank"
+    with open(path, "wb") as output:
+        write_bank(output, riddles)
+
+    bank = RiddleBank.open(str(path))
+    try:
+        assert len(bank) == len(riddles)
+        loaded = sorted(bank.get(i)["number"] for i in range(len(bank)))
+        assert loaded == [riddle["number"] for riddle in riddles]
+    finally:
+        bank.close()
+
+
+def test_sample_by_category():
+    """ Выборка берёт загадки только из категории комнаты и без повторов """
+    bank = RiddleBank.from_riddles(
+        [{"number": i, "text": "", "answer": [], "category": "Кино" if i % 2 else "спорт"} for i in range(100)]
+    )
+    sample = bank.sample("кино", 10, random.Random(0))
+    assert len({riddle["number"] for riddle in sample}) == 10
+    assert all(riddle["category"] == "Кино" for riddle in sample)
+
+    # Неизвестная категория — выборка из всего банка, не больше его размера
+    assert len(bank.sample("нет такой", 500)) == 100
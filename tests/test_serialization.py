@@ -0,0 +1,106 @@
+import json
+
+import pytest
+from socketio import packet
+
+from src.chat_history import ChatHistory
+from src.serialization import EncodeOnce, OrJson, StdlibJson, orjson, packet_class, raw_array, raw_object
+
+
+@pytest.mark.parametrize("codec", [StdlibJson] + ([OrJson] if orjson is not None else []))
+def test_raw_json_packet_matches_regular_encoding(codec):
+    """ Склеенный из готовых кусков пакет совпадает с обычным кодированием и пишет UTF-8 """
+    history = ChatHistory()
+    for text in ("привет", "ответ — «эхо»"):
+        history.append({"sender": "Игрок", "text": text})
+    messages, has_more = history.page(None, 10)
+    encoded, _ = history.page_encoded(None, 10)
+
+    fast = packet_class(codec)
+    raw = raw_object({"messages": raw_array(encoded), "has_more": has_more}, codec)
+    spliced = fast(packet.EVENT, data=["chat_history", raw], id=7).encode()
+    regular = fast(packet.EVENT, data=["chat_history", {"messages": messages, "has_more": has_more}], id=7).encode()
+
+    assert json.loads(spliced[2:]) == json.loads(regular[2:])
+    assert spliced.startswith("27[") and "привет" in spliced
+
+
+def test_encode_once_reuses_until_new_object():
+    encode = EncodeOnce()
+    snapshot = {"version": 1, "rooms": []}
+    first = encode(snapshot)
+    assert encode(snapshot) is first
+    assert encode({"version": 2, "rooms": []}) is not first
+
+
+def test_msgpack_packet_decodes():
+    """ Бинарный пакет от клиента с MessagePack читается тем же классом пакета """
+    msgpack = pytest.importorskip("msgpack")
+    incoming = msgpack.dumps({"type": packet.EVENT, "data": ["send_message", {"text": "привет"}], "nsp": "/"})
+    decoded = packet_class()(encoded_packet=incoming)
+    assert decoded.packet_type == packet.EVENT
+    assert decoded.data == ["send_message", {"text": "привет"}]
+
+
+def test_msgpack_broadcast_frame_has_namespace():
+    """ Эмит в "/" уходит клиенту с MessagePack со строковым nsp, иначе парсер клиента его отбросит """
+    msgpack = pytest.importorskip("msgpack")
+    import asyncio
+
+    import socketio
+    from engineio import packet as eio_packet
+
+    from src.serialization import MsgpackClients
+
+    server = socketio.AsyncServer(async_mode="asgi", serializer=packet_class())
+    clients = MsgpackClients(server)
+    clients._eio_sids.add("eio_1")
+    sent = []
+
+    async def capture(eio_sid, pkt):
+        sent.append(pkt)
+
+    clients._send_eio_packet = capture
+    frame = server.packet_class(packet.EVENT, data=["new_message", {"text": "привет"}]).encode()
+    asyncio.run(clients._guarded_send_eio_packet("eio_1", eio_packet.Packet(eio_packet.MESSAGE, frame)))
+
+    decoded = msgpack.loads(sent[0].data)
+    assert decoded["nsp"] == "/" and decoded["type"] == packet.EVENT
+    assert decoded["data"] == ["new_message", {"text": "привет"}]
+
+
+def test_msgpack_frame_built_from_packet_data():
+    """ Кадр MessagePack строится из данных пакета, без разбора JSON; RawJSON разбирается один раз """
+    msgpack = pytest.importorskip("msgpack")
+    import asyncio
+
+    import socketio
+    from engineio import packet as eio_packet
+
+    from src.serialization import MsgpackClients
+
+    codec = OrJson if orjson is not None else StdlibJson
+    server = socketio.AsyncServer(async_mode="asgi", serializer=packet_class(codec))
+    clients = MsgpackClients(server)
+    clients._eio_sids.add("eio_1")
+    server.packet_class.keep_packet = True
+    sent = []
+
+    async def capture(eio_sid, pkt):
+        sent.append(pkt)
+
+    def no_parsing(*args, **kwargs):
+        raise AssertionError("кадр разобран из JSON")
+
+    clients._send_eio_packet = capture
+    server.packet_class.decode = no_parsing
+    raw = raw_object({"rooms": [{"id": "room_1", "name": "комната"}]}, codec)
+    for data in (["new_message", {"text": "привет"}], ["rooms_list", raw], ["rooms_list", raw]):
+        frame = server.packet_class(packet.EVENT, namespace="/", data=data).encode()
+        assert frame == packet_class(codec)(packet.EVENT, namespace="/", data=data).encode()
+        asyncio.run(clients._guarded_send_eio_packet("eio_1", eio_packet.Packet(eio_packet.MESSAGE, frame)))
+
+    decoded = [msgpack.loads(pkt.data) for pkt in sent]
+    assert decoded[0] == {"type": packet.EVENT, "nsp": "/", "data": ["new_message", {"text": "привет"}]}
+    assert decoded[1]["data"] == decoded[2]["data"] == ["rooms_list", {"rooms": [{"id": "room_1", "name": "комната"}]}]
+    assert raw.plain == decoded[1]["data"][1]
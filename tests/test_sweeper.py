@@ -0,0 +1,40 @@
+import asyncio
+
+from src.scheduler import Scheduler
+from src.sweeper import Sweeper
+
+
+def test_sweeper_works_in_bounded_slices():
+    """ За вызов проверяется не больше budget ключей, следующий продолжает с того же места """
+    async def main():
+        players = {f"sid_{i}": i % 2 == 0 for i in range(5)}
+        rooms = {"room_1"}
+        checked = []
+
+        async def reclaim_player(sid):
+            checked.append(sid)
+            if not players[sid]:
+                return 0
+            del players[sid]
+            return 1
+
+        async def reclaim_room(room_id):
+            checked.append(room_id)
+            rooms.discard(room_id)
+            return 1
+
+        sweeper = Sweeper(Scheduler())
+        sweeper.add("players", lambda: list(players), reclaim_player)
+        sweeper.add("rooms", lambda: list(rooms), reclaim_room)
+
+        await sweeper.run(3)
+        assert checked == ["sid_0", "sid_1", "sid_2"]
+        await sweeper.run(3)
+        assert checked[3:] == ["sid_3", "sid_4", "room_1"]
+        assert sweeper.passes == 0
+        await sweeper.run(100)
+        assert sweeper.passes == 2, "закончен начатый проход и сделан ещё один полный"
+        assert sweeper.reclaimed() == {"players": 3, "rooms": 1}
+        assert sweeper.stats()["sweeps"]["players"]["checked"] == 5 + 2
+
+    asyncio.run(main())
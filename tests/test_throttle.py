@@ -0,0 +1,60 @@
+import asyncio
+from types import SimpleNamespace
+
+from src.scheduler import Scheduler
+from src.throttle import OutboundGuard, RateLimiter, parse_budgets
+
+
+def test_parse_budgets():
+    assert parse_budgets("send_message=5:10, get_rooms=2") == {
+        "send_message": (5.0, 10.0),
+        "get_rooms": (2.0, 2.0),
+    }
+
+
+def test_limiter_budget_per_sid_and_event():
+    """ Запас тратится отдельно по sid и событию, после forget корзина снова полна """
+    limiter = RateLimiter({"send_message": (0.0, 2.0), "get_rooms": (0.0, 1.0)})
+
+    assert [limiter.allow("a", "send_message") for _ in range(3)] == [True, True, False]
+    assert limiter.allow("a", "get_rooms")
+    assert limiter.allow("b", "send_message")
+    assert limiter.allow("a", "answer"), "событие без бюджета не ограничивается"
+    assert limiter.rejected == {"send_message": 1, "get_rooms": 0}
+
+    limiter.forget("a")
+    assert len(limiter) == 1
+    assert limiter.allow("a", "send_message")
+
+
+def test_guard_drops_then_resyncs():
+    """ Выше порога пакеты отбрасываются, после разгрузки очереди клиент получает состояние """
+    async def main():
+        queue = asyncio.Queue()
+        sent, resynced = [], []
+
+        async def send(eio_sid, packet):
+            sent.append(packet)
+            await queue.put(packet)
+
+        async def resync(sid):
+            resynced.append(sid)
+
+        server = SimpleNamespace(
+            _send_eio_packet=send,
+            eio=SimpleNamespace(sockets={"e1": SimpleNamespace(queue=queue)}),
+            manager=SimpleNamespace(sid_from_eio_sid=lambda eio_sid, namespace: "s1"),
+        )
+        guard = OutboundGuard(server, Scheduler(), high_water=2, on_resync=resync, check_interval=0.01)
+
+        for number in range(5):
+            await server._send_eio_packet("e1", number)
+        assert sent == [0, 1]
+        assert guard.dropped == 3 and guard.lagging == {"e1"}
+
+        while not queue.empty():
+            queue.get_nowait()
+        await asyncio.sleep(0.05)
+        assert resynced == ["s1"] and not guard.lagging
+
+    asyncio.run(main())
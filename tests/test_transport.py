@@ -0,0 +1,34 @@
+import pytest
+
+from src.transport import engineio_options, transport_settings, uvicorn_options
+
+
+def test_cli_overrides_env_overrides_profile():
+    env = {"TRANSPORT_PROFILE": "websocket", "SIO_PING_INTERVAL": "10", "PORT": "9000"}
+    settings = transport_settings(["--ping-interval", "5", "--transports", "polling,websocket"], env)
+    assert settings["profile"] == "websocket"
+    assert settings["ping_interval"] == 5.0 and settings["port"] == 9000
+    assert settings["transports"] == ["polling", "websocket"]
+    assert settings["ws_per_message_deflate"] is False
+
+    assert engineio_options(settings)["ping_interval"] == 5.0
+    assert uvicorn_options(settings)["ws_max_size"] == settings["max_payload"]
+
+
+def test_defaults_match_previous_behaviour():
+    settings = transport_settings(None, {})
+    assert settings["port"] == 8000 and settings["loop"] == "auto"
+    assert settings["transports"] == ["polling", "websocket"] and settings["ws_per_message_deflate"]
+
+
+def test_missing_packages_fall_back(monkeypatch):
+    monkeypatch.setattr("importlib.util.find_spec", lambda name: None)
+    settings = transport_settings(["--profile", "fast", "--ws", "websockets"], {})
+    assert (settings["loop"], settings["http"], settings["ws"]) == ("asyncio", "h11", "auto")
+
+
+def test_unknown_values_are_rejected():
+    with pytest.raises(ValueError):
+        transport_settings(None, {"TRANSPORT_PROFILE": "turbo"})
+    with pytest.raises(SystemExit):
+        transport_settings(["--transports", "carrier-pigeon"], {})
@@ -0,0 +1,64 @@
+import asyncio
+import gzip
+
+from src.web import SecurityHeaders, StaticAssets
+
+
+async def fallback(scope, receive, send):
+    await send({"type": "http.response.start", "status": 404, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def request(app, path, headers=(), method="GET"):
+    """ Один HTTP-запрос к ASGI-приложению: статус, заголовки ответа и тело """
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "headers": list(headers)}
+    asyncio.run(app(scope, receive, send))
+    start, body = messages
+    return start["status"], dict(start["headers"]), body["body"]
+
+
+def make_app(tmp_path):
+    (tmp_path / "index.html").write_text("<html>" + "загадка " * 100 + "</html>", encoding="utf-8")
+    (tmp_path / "tiny.css").write_text("a{}")
+    return StaticAssets(fallback, str(tmp_path))
+
+
+def test_compressed_variant_and_not_modified(tmp_path):
+    """ Клиент с gzip получает сжатый вариант; повтор с ETag — 304 без тела """
+    app = make_app(tmp_path)
+    status, headers, body = request(app, "/", [(b"accept-encoding", b"br;q=0, gzip")])
+    assert status == 200 and headers[b"content-encoding"] == b"gzip"
+    assert gzip.decompress(body).decode().startswith("<html>загадка")
+    assert headers[b"vary"] == b"accept-encoding" and headers[b"cache-control"] == b"no-cache"
+
+    status, again, body = request(app, "/", [(b"accept-encoding", b"gzip"), (b"if-none-match", headers[b"etag"])])
+    assert status == 304 and body == b"" and again[b"etag"] == headers[b"etag"]
+
+    # ETag сжатого варианта не подходит несжатому
+    status, plain, _ = request(app, "/static/index.html", [(b"if-none-match", headers[b"etag"])])
+    assert status == 200 and b"content-encoding" not in plain
+
+
+def test_fingerprinted_url_is_immutable(tmp_path):
+    app = make_app(tmp_path)
+    status, headers, body = request(app, app.url("tiny.css"))
+    assert status == 200 and body == b"a{}"
+    assert b"immutable" in headers[b"cache-control"]
+    assert b"content-encoding" not in headers, "мелкие файлы не сжимаются"
+
+    assert request(app, "/static/missing.css")[0] == 404
+    assert request(app, "/static/tiny.css", method="POST")[0] == 404
+
+
+def test_security_headers_are_added(tmp_path):
+    app = SecurityHeaders(make_app(tmp_path), {"Content-Security-Policy": "default-src 'self'"})
+    _, headers, _ = request(app, "/static/tiny.css")
+    assert headers[b"content-security-policy"] == b"default-src 'self'"